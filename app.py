@@ -1,9 +1,12 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timezone
+from werkzeug.datastructures import ContentRange
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
 import os
 import json
 import paramiko
@@ -12,12 +15,36 @@ import threading
 import time
 import logging
 import uuid
+import re
+import codecs
+import heapq
+import math
+import random
 from config import config
 import pymysql
+from pymysql.constants import CLIENT, ER, SERVER_STATUS
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
-from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager, ExitStack, closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict, deque, namedtuple
 import base64
+from urllib.parse import quote
+import hashlib
+import ipaddress
+import shlex
+import gzip
+import itertools
+import tempfile
+import io
+import csv
+import queue
+
+# MessagePack 已列入 requirements.txt；未安装时 SQL 结果仅以 JSON 返回，只接受 MessagePack 的请求返回 406
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # 获取配置
 config_name = os.environ.get('FLASK_ENV', 'default')
@@ -36,18 +63,49 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 db = SQLAlchemy(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'])
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# 终端输出清理用的预编译正则：CSI/OSC（含窗口标题 "\x1b]0;user@host:~\x07"）等转义序列
+ANSI_ESCAPE_RE = re.compile(r'\x1B\][^\x07\x1B]*(?:\x07|\x1B\\)|\x1B\[[0-?]*[ -/]*[@-~]|\x1B[@-Z\\-_]')
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+# 命令结束标记：printf 分段输出，回显的命令行本身不会匹配 "__OPMS_<token>_:<退出码>"
+SENTINEL_COMMAND = "printf '%s%s:%d\\n' '__OPMS_' '{token}_' \"$?\""
+SENTINEL_ECHO = "'__OPMS_'"
+
 # SSH会话管理器
 class SSHSessionManager:
     def __init__(self):
         self.sessions = {}  # {session_id: {'ssh': ssh, 'channel': channel, ...}}
         self.lock = threading.Lock()
     
-    def create_session(self, asset):
+    def _evict_locked(self, user_id):
+        """达到全局或单用户会话上限时，按最近活动时间移出最久未使用的会话（调用方须持有 self.lock）
+        
+        返回被移出的会话，由调用方在锁外关闭。
+        """
+        evicted = []
+        while self.sessions:
+            if len(self.sessions) >= app.config['TERMINAL_MAX_SESSIONS']:
+                candidates = list(self.sessions)
+            else:
+                candidates = [sid for sid, sess in self.sessions.items()
+                              if user_id is not None and sess.get('user_id') == user_id]
+                if len(candidates) < app.config['TERMINAL_MAX_SESSIONS_PER_USER']:
+                    break
+            session_id = min(candidates, key=lambda sid: self.sessions[sid]['last_activity'])
+            evicted.append((session_id, self.sessions.pop(session_id)))
+        return evicted
+    
+    def touch(self, session_id):
+        """记录会话最近活动时间"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session['last_activity'] = time.monotonic()
+    
+    def create_session(self, asset, width=1000, height=40, drain_banner=True, user_id=None):
         """创建SSH交互式会话"""
         session_id = str(uuid.uuid4())
         try:
@@ -62,23 +120,30 @@ class SSHSessionManager:
             )
             
             # 创建交互式shell通道
-            channel = ssh.invoke_shell(term='xterm', width=1000, height=40)
+            # 开启keepalive，及时发现失效连接并防止中间设备断开空闲连接
+            ssh.get_transport().set_keepalive(app.config['SSH_POOL_KEEPALIVE'])
+            channel = ssh.invoke_shell(term='xterm', width=width, height=height)
             channel.settimeout(1)
             
-            # 等待初始提示符就绪
-            time.sleep(0.5)
-            
-            # 清空初始输出
-            while channel.recv_ready():
-                channel.recv(4096)
+            if drain_banner:
+                # 读掉登录横幅，避免混入第一条命令的输出
+                self._drain_banner(channel)
             
+            # 上限检查与登记在同一把锁内完成，并发创建时不会超过上限
             with self.lock:
+                evicted = self._evict_locked(user_id)
                 self.sessions[session_id] = {
                     'ssh': ssh,
                     'channel': channel,
                     'asset_id': asset.id,
-                    'created_at': datetime.now(timezone.utc)
+                    'last_exit_status': None,
+                    'user_id': user_id,
+                    'created_at': datetime.now(timezone.utc),
+                    'last_activity': time.monotonic()
                 }
+            for evicted_id, evicted_session in evicted:
+                logger.info(f"SSH会话数达到上限，淘汰最久未使用的会话: {evicted_id}")
+                self._close(evicted_id, evicted_session)
             
             logger.info(f"SSH交互式会话创建成功: {session_id} for {asset.name}")
             return session_id, True, "SSH连接成功"
@@ -86,78 +151,98 @@ class SSHSessionManager:
             logger.error(f"SSH会话创建失败: {e}")
             return None, False, str(e)
     
+    @staticmethod
+    def _send_sentinel(channel):
+        """发送结束标记命令，返回匹配其输出的正则"""
+        token = uuid.uuid4().hex[:12]
+        channel.send(SENTINEL_COMMAND.format(token=token) + '\n')
+        return re.compile(rf'__OPMS_{token}_:(\d+)\r?\n')
+    
+    @staticmethod
+    def _read_until(channel, pattern, timeout):
+        """阻塞读取通道直到输出匹配 pattern 或超时，返回 (输出, match)"""
+        chunks = []
+        tail = ''
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                chunk = channel.recv(32768)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            text = decoder.decode(chunk)
+            chunks.append(text)
+            # 只在新到达的数据及上一块的末尾（标记可能跨块）中查找，不反复拼接和扫描整个缓冲区
+            window = tail + text
+            if pattern.search(window):
+                output = ''.join(chunks)
+                return output, pattern.search(output, len(output) - len(window))
+            tail = window[-64:]
+        return ''.join(chunks), None
+    
+    @staticmethod
+    def _drain(channel):
+        """丢弃上一条命令结束后残留的提示符等输出"""
+        while channel.recv_ready():
+            channel.recv(32768)
+    
+    def _drain_banner(self, channel):
+        """发送结束标记命令并读到其输出为止，丢弃之前的登录横幅和提示符"""
+        self._read_until(channel, self._send_sentinel(channel), app.config['SSH_TIMEOUT'])
+        self._drain(channel)
+    
     def execute_command(self, session_id, command):
-        """在交互式shell中执行命令"""
-        if session_id not in self.sessions:
+        """在交互式shell中执行命令，以结束标记判断命令完成"""
+        session = self.get_session(session_id)
+        if session is None:
             return None, False, "会话不存在"
         
         try:
-            import re
-            channel = self.sessions[session_id]['channel']
+            channel = session['channel']
+            self.touch(session_id)
+            self._drain(channel)
             
-            # 发送命令到交互式shell
+            # 发送命令，紧接着发送结束标记命令
             channel.send(command + '\n')
+            sentinel_re = self._send_sentinel(channel)
             
-            # 接收输出（带超时）
-            output = ""
-            start_time = time.time()
-            timeout = 5.0  # 5秒超时
-            last_output = ""
-            no_output_count = 0
-            
-            while time.time() - start_time < timeout:
-                if channel.recv_ready():
-                    chunk = channel.recv(4096).decode('utf-8', errors='ignore')
-                    output += chunk
-                    last_output = output
-                    no_output_count = 0
-                else:
-                    no_output_count += 1
-                    time.sleep(0.1)
-                    
-                    # 如果连续多次没有新输出，认为命令已完成
-                    if no_output_count > 10:
-                        break
-                
-                # 如果输出不再增加，可能命令已执行完成
-                if not channel.recv_ready():
-                    time.sleep(0.1)
-            
-            # 清除ANSI转义码和控制字符
-            ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-            output = ansi_escape.sub('', output)
-            
-            # 移除终端控制字符
-            output = output.replace('\r', '')
-            
-            # 移除命令回显（用户输入的命令） - 更严格的匹配
-            command_escaped = re.escape(command)
-            # 匹配命令后可能跟换行符的情况，包括多种格式
-            output = re.sub(rf'{command_escaped}[\r\n\s]*', '', output)
-            
-            # 移除所有可能的终端提示符格式
-            # 包括: 0;root@localhost:~, 0:root@localhost:~, root@localhost:~ 等
-            output = re.sub(r'\d+[;:]root@localhost:[^\n]*[\n]?', '', output)
-            output = re.sub(r'root@localhost:[^\n]*[\n]?', '', output)
-            
-            # 移除标准提示符（包括 [root@localhost ~]#）
-            output = re.sub(r'\[root@localhost ~\]#\s*[\n]*', '', output)
-            output = re.sub(r'\[root@localhost\s+~\]#\s*[\n]*', '', output)
-            
-            # 移除所有以数字开头、分号结尾的提示符（如 "0;"）
-            output = re.sub(r'\d+;\s*[\n]?', '', output)
-            
-            # 移除空行
-            output = re.sub(r'\n{3,}', '\n\n', output)
-            
-            # 移除开头的空行
-            output = output.lstrip('\n')
+            output, match = self._read_until(channel, sentinel_re, app.config['TERMINAL_COMMAND_TIMEOUT'])
+            error = ""
+            if match:
+                session['last_exit_status'] = int(match.group(1))
+                output = output[:match.start()]
+            else:
+                session['last_exit_status'] = None
+                error = f"命令在 {app.config['TERMINAL_COMMAND_TIMEOUT']} 秒内未结束，仅返回已有输出"
             
-            return output, True, ""
+            self.touch(session_id)
+            return self._clean_output(command, output), True, error
         except Exception as e:
             logger.error(f"命令执行失败: {e}")
             return None, False, str(e)
     
+    @staticmethod
+    def _clean_output(command, output):
+        """移除转义序列、命令回显和结束标记回显（提示符与结束标记命令回显在同一行）"""
+        output = ANSI_ESCAPE_RE.sub('', output).replace('\r', '')
+        command = command.strip()
+        
+        lines = []
+        echo_removed = False
+        for line in output.split('\n'):
+            stripped = line.strip()
+            if not echo_removed and command and stripped.endswith(command):
+                echo_removed = True
+                continue
+            if SENTINEL_ECHO in line:
+                continue
+            lines.append(line)
+        
+        output = BLANK_LINES_RE.sub('\n\n', '\n'.join(lines))
+        return output.strip('\n')
+    
     def send_raw_data(self, session_id, data):
         """发送原始数据到SSH通道（用于Tab补全等）"""
         if session_id not in self.sessions:
@@ -165,6 +250,7 @@ class SSHSessionManager:
         
         try:
             channel = self.sessions[session_id]['channel']
+            self.touch(session_id)
             channel.send(data)
             
             # 接收补全结果
@@ -182,9 +268,7 @@ class SSHSessionManager:
                     time.sleep(0.1)
             
             # 清除ANSI转义码
-            import re
-            ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-            output = ansi_escape.sub('', output)
+            output = ANSI_ESCAPE_RE.sub('', output)
             output = output.replace('\r', '')
             
             return output, True, ""
@@ -192,22 +276,251 @@ class SSHSessionManager:
             logger.error(f"原始数据发送失败: {e}")
             return None, False, str(e)
     
+    def get_session(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+    
+    def _close(self, session_id, session):
+        try:
+            if 'channel' in session:
+                session['channel'].close()
+            session['ssh'].close()
+        except:
+            pass
+        logger.info(f"SSH会话已关闭: {session_id}")
+    
     def close_session(self, session_id):
         """关闭SSH会话"""
-        if session_id in self.sessions:
-            try:
-                if 'channel' in self.sessions[session_id]:
-                    self.sessions[session_id]['channel'].close()
-                self.sessions[session_id]['ssh'].close()
-            except:
-                pass
-            with self.lock:
-                del self.sessions[session_id]
-            logger.info(f"SSH会话已关闭: {session_id}")
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self._close(session_id, session)
+    
+    def reap_idle(self):
+        """关闭空闲超过 TERMINAL_IDLE_TIMEOUT 或连接已断开的会话，返回关闭数量"""
+        deadline = time.monotonic() - app.config['TERMINAL_IDLE_TIMEOUT']
+        expired = []
+        with self.lock:
+            for session_id, session in list(self.sessions.items()):
+                transport = session['ssh'].get_transport()
+                alive = transport is not None and transport.is_active() and not session['channel'].closed
+                if session['last_activity'] < deadline or not alive:
+                    expired.append((session_id, self.sessions.pop(session_id)))
+        for session_id, session in expired:
+            logger.info(f"回收空闲或失效的SSH会话: {session_id}")
+            self._close(session_id, session)
+        return len(expired)
+    
+    def stats(self, user_id=None):
+        """会话数量与存活时长统计，指定 user_id 时只统计该用户的会话"""
+        now = time.monotonic()
+        wall_now = datetime.now(timezone.utc)
+        with self.lock:
+            sessions = [{
+                'session_id': session_id,
+                'asset_id': session['asset_id'],
+                'user_id': session.get('user_id'),
+                'age_seconds': int((wall_now - session['created_at']).total_seconds()),
+                'idle_seconds': int(now - session['last_activity'])
+            } for session_id, session in self.sessions.items()
+                if user_id is None or session.get('user_id') == user_id]
+        per_user = {}
+        for session in sessions:
+            per_user[session['user_id']] = per_user.get(session['user_id'], 0) + 1
+        return {
+            'total': len(sessions),
+            'per_user': per_user,
+            'max_age_seconds': max((session['age_seconds'] for session in sessions), default=0),
+            'max_idle_seconds': max((session['idle_seconds'] for session in sessions), default=0),
+            'sessions': sessions
+        }
 
 # 全局SSH会话管理器
 ssh_manager = SSHSessionManager()
 
+class SSHConnectError(Exception):
+    """SSH连接池无法建立或借出连接"""
+
+# SSH连接池：按 (ip, port, username) 复用已认证的SSH传输
+class SSHConnectionPool:
+    def __init__(self):
+        self.entries = {}  # {(host, port, username): {'client': ssh, 'password': ..., 'last_used': ..., 'in_use': n, ...}}
+        self.lock = threading.Lock()
+    
+    def _get_entry(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = {
+                    'client': None,
+                    'password': None,
+                    'created_at': None,
+                    'last_used': time.monotonic(),
+                    'in_use': 0,
+                    'slots': threading.BoundedSemaphore(app.config['SSH_POOL_MAX_CHANNELS']),
+                    'connect_lock': threading.Lock()
+                }
+                self.entries[key] = entry
+            entry['in_use'] += 1
+            return entry
+    
+    @staticmethod
+    def _is_alive(client):
+        """检查SSH传输是否仍然可用"""
+        transport = client.get_transport() if client else None
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _close_client(client):
+        try:
+            client.close()
+        except Exception:
+            pass
+    
+    def _connect(self, hostname, port, username, password, timeout):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(
+            hostname=hostname,
+            port=port,
+            username=username,
+            password=password,
+            timeout=timeout or app.config['SSH_TIMEOUT']
+        )
+        ssh.get_transport().set_keepalive(app.config['SSH_POOL_KEEPALIVE'])
+        return ssh
+    
+    @contextmanager
+    def client(self, hostname, port, username, password, timeout=None, touch=True):
+        """借出一个已认证的SSHClient，在其上打开SFTP/exec通道
+        
+        每个主机同时借出的数量受 SSH_POOL_MAX_CHANNELS 限制；
+        传输失效或凭据变化时自动重连。
+        touch=False 的借用（周期性后台采集）归还时不刷新空闲时间，
+        否则间隔短于 SSH_POOL_IDLE_TTL 的任务会让连接永不过期、完整检查永远复用旧认证。
+        """
+        key = (hostname, int(port), username)
+        entry = self._get_entry(key)
+        acquired = False
+        try:
+            if not entry['slots'].acquire(timeout=app.config['SSH_POOL_ACQUIRE_TIMEOUT']):
+                raise SSHConnectError(f"SSH通道数已达上限: {hostname}:{port}")
+            acquired = True
+            
+            with entry['connect_lock']:
+                client = entry['client']
+                if client is None or entry['password'] != password or not self._is_alive(client):
+                    if client is not None:
+                        self._close_client(client)
+                        entry['client'] = None
+                    try:
+                        client = self._connect(hostname, int(port), username, password, timeout)
+                    except Exception as e:
+                        raise SSHConnectError(str(e)) from e
+                    now = time.monotonic()
+                    entry.update(client=client, password=password, created_at=now, last_used=now)
+                    logger.info(f"SSH连接池新建连接: {username}@{hostname}:{port}")
+            
+            try:
+                yield client
+            except Exception:
+                # 传输已断开则丢弃，下次借用时重连
+                if not self._is_alive(client):
+                    with entry['connect_lock']:
+                        if entry['client'] is client:
+                            entry['client'] = None
+                    self._close_client(client)
+                raise
+        finally:
+            if acquired:
+                entry['slots'].release()
+            with self.lock:
+                entry['in_use'] -= 1
+                if touch:
+                    entry['last_used'] = time.monotonic()
+    
+    def check(self, hostname, port, username, password, timeout=None):
+        """验证SSH认证是否可用：SSH_POOL_IDLE_TTL 内用过的存活池化连接直接视为通过，否则做一次性连接（不放入池中）"""
+        with self.lock:
+            entry = self.entries.get((hostname, int(port), username))
+            fresh = entry is not None and time.monotonic() - entry['last_used'] <= app.config['SSH_POOL_IDLE_TTL']
+        if fresh and entry['password'] == password and self._is_alive(entry['client']):
+            return True
+        ssh = self._connect(hostname, int(port), username, password, timeout)
+        self._close_client(ssh)
+        return True
+    
+    def reap_idle(self):
+        """关闭空闲超过 SSH_POOL_IDLE_TTL 或已失效的连接"""
+        now = time.monotonic()
+        ttl = app.config['SSH_POOL_IDLE_TTL']
+        expired = []
+        idle = []
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry['in_use']:
+                    continue
+                client = entry['client']
+                if client is None or now - entry['last_used'] > ttl:
+                    expired.append((key, client))
+                    del self.entries[key]
+                else:
+                    idle.append((key, entry, client))
+        # 存活检测涉及网络I/O，在锁外进行；删除前确认期间没有被借出或重连
+        dead = [(key, entry, client) for key, entry, client in idle if not self._is_alive(client)]
+        with self.lock:
+            for key, entry, client in dead:
+                if self.entries.get(key) is entry and not entry['in_use'] and entry['client'] is client:
+                    expired.append((key, client))
+                    del self.entries[key]
+        for (hostname, port, username), client in expired:
+            if client is not None:
+                self._close_client(client)
+                logger.info(f"SSH连接池关闭空闲连接: {username}@{hostname}:{port}")
+        return len(expired)
+    
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                'connections': sum(1 for entry in self.entries.values() if entry['client'] is not None),
+                'in_use': sum(entry['in_use'] for entry in self.entries.values()),
+                'max_idle_seconds': max((now - entry['last_used'] for entry in self.entries.values()
+                                         if not entry['in_use']), default=0)
+            }
+
+# 全局SSH连接池
+ssh_pool = SSHConnectionPool()
+
+@contextmanager
+def pooled_sftp(asset, timeout=None):
+    """在资产的池化SSH连接上打开一个SFTP通道"""
+    with ssh_pool.client(asset.ip_address, asset.port, asset.username, asset.password, timeout) as ssh:
+        sftp = ssh.open_sftp()
+        try:
+            yield sftp
+        finally:
+            sftp.close()
+
+def resolve_remote_path(sftp, remote_path):
+    """把 ~ 开头或相对路径解析为远程绝对路径（SFTP会话的初始目录即用户主目录）"""
+    if remote_path.startswith('/'):
+        return remote_path
+    home = sftp.normalize('.')
+    if remote_path in ('~', '~/'):
+        return home
+    if remote_path.startswith('~/'):
+        return home.rstrip('/') + '/' + remote_path[2:]
+    if remote_path.startswith('~'):
+        return remote_path.replace('~', home, 1)
+    return home.rstrip('/') + '/' + remote_path
+
 # 数据库模型
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -233,6 +546,55 @@ class Asset(db.Model):
     description = db.Column(db.Text)
     last_update = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     category = db.Column(db.String(50), nullable=False, index=True)  # 'training' or 'physical'
+    check_level = db.Column(db.String(10))  # 最近一次连接检查级别: 'tcp' | 'banner' | 'ssh' | 'auth'（认证被拒绝）
+    last_full_check = db.Column(db.DateTime)  # 最近一次完整SSH认证检查时间
+    auth_failed = db.Column(db.Boolean, default=False)  # 最近一次完整检查认证被拒绝，完整检查间隔内不再重试
+
+# 资源使用率时序数据：时间统一存为 UTC epoch 秒，便于按桶对齐
+class AssetMetric(db.Model):
+    """原始采样（只追加，按保留期清理）"""
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, nullable=False)
+    ts = db.Column(db.Integer, nullable=False, index=True)
+    cpu = db.Column(db.SmallInteger)
+    memory = db.Column(db.SmallInteger)
+    disk = db.Column(db.SmallInteger)
+    __table_args__ = (db.Index('ix_asset_metric_asset_ts', 'asset_id', 'ts'),)
+
+class AssetMetricRollup(db.Model):
+    """按 1m/1h/1d 预聚合的时间桶，写入时增量更新"""
+    asset_id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.String(3), primary_key=True)  # '1m' | '1h' | '1d'
+    bucket = db.Column(db.Integer, primary_key=True)  # 桶起始时间
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    cpu_sum = db.Column(db.Integer, nullable=False, default=0)
+    cpu_max = db.Column(db.SmallInteger, nullable=False, default=0)
+    memory_sum = db.Column(db.Integer, nullable=False, default=0)
+    memory_max = db.Column(db.SmallInteger, nullable=False, default=0)
+    disk_sum = db.Column(db.Integer, nullable=False, default=0)
+    disk_max = db.Column(db.SmallInteger, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_asset_metric_rollup_resolution_bucket', 'resolution', 'bucket'),)
+
+class SlowQuery(db.Model):
+    """数据库管理中耗时超过 DB_SLOW_QUERY_MS 的SQL执行记录（按保留期清理）"""
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(16), nullable=False, index=True)
+    connection_id = db.Column(db.String(64), nullable=False)
+    connection_name = db.Column(db.String(200))  # user@host:port/database
+    db_type = db.Column(db.String(20), nullable=False)
+    sql = db.Column(db.Text, nullable=False)  # 字符串字面量已替换为 '?'
+    sql_truncated = db.Column(db.Boolean, default=False)  # 超过 DB_SLOW_QUERY_MAX_SQL 被截断
+    success = db.Column(db.Boolean, default=True)
+    total_ms = db.Column(db.Float, nullable=False)
+    connect_ms = db.Column(db.Float)
+    execute_ms = db.Column(db.Float)
+    fetch_ms = db.Column(db.Float)
+    rows = db.Column(db.Integer, default=0)
+    bytes = db.Column(db.Integer, default=0)
+    plan = db.Column(db.Text)  # 写入日志时用原始SQL捕获的执行计划（JSON，字面量已脱敏）
+    plan_analyzed = db.Column(db.Boolean)
+    plan_captured_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
 
 # 操作日志模型已移除
 
@@ -242,65 +604,91 @@ def load_user(user_id):
 
 # 操作日志记录函数已移除
 
-def test_asset_connection(asset):
-    """测试资产连接状态"""
+def _as_utc(value):
+    """SQLite 读回的时间不带时区，统一视为 UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def needs_full_check(asset):
+    """距上次完整SSH认证检查是否已超过 SSH_FULL_CHECK_INTERVAL"""
+    last_full_check = _as_utc(asset.last_full_check)
+    if last_full_check is None:
+        return True
+    elapsed = (datetime.now(timezone.utc) - last_full_check).total_seconds()
+    return elapsed >= app.config['SSH_FULL_CHECK_INTERVAL']
+
+def test_asset_connection(asset, full_check=False):
+    """测试资产连接状态，返回 (is_online, message, check_level)
+    
+    检查分级：
+    - tcp: 仅TCP连通（无SSH凭据的资产）
+    - banner: TCP连通并读到SSH协议标识，不做密钥交换和认证
+    - ssh: 完整的SSH握手与密码认证
+    - auth: 完整检查中密码认证被拒绝
+    完整认证只在 full_check=True、资产将由非在线转为在线、或未读到SSH标识时执行；
+    上次完整检查认证被拒绝的资产在 SSH_FULL_CHECK_INTERVAL 内不再重试，避免反复尝试错误密码导致账户被锁定。
+    """
     try:
         logger.info(f"开始测试资产连接: {asset.name} ({asset.ip_address}:{asset.port})")
         
         # 首先测试网络连通性
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(app.config['CONNECTION_TIMEOUT'])
-        result = sock.connect_ex((asset.ip_address, asset.port))
-        sock.close()
-        
-        if result != 0:
+        try:
+            sock = socket.create_connection((asset.ip_address, asset.port),
+                                            timeout=app.config['CONNECTION_TIMEOUT'])
+        except OSError:
             logger.warning(f"网络连接失败: {asset.name}")
-            return False, "网络连接失败"
+            return False, "网络连接失败", 'tcp'
+        
+        # 读取SSH协议标识（如 SSH-2.0-OpenSSH_8.7）
+        try:
+            banner = sock.recv(256)
+        except OSError:
+            banner = b''
+        finally:
+            sock.close()
+        has_banner = banner.startswith(b'SSH-')
         
         logger.info(f"网络连通性测试成功: {asset.name}")
         
-        # 如果配置了SSH凭据，进一步测试SSH连接
-        if asset.username and asset.password:
-            try:
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                ssh.connect(asset.ip_address, port=asset.port, username=asset.username, 
-                           password=asset.password, timeout=app.config['SSH_TIMEOUT'])
-                ssh.close()
-                logger.info(f"SSH连接测试成功: {asset.name}")
-                return True, "SSH连接正常"
-            except Exception as e:
-                logger.warning(f"SSH连接失败: {asset.name} - {e}")
-                return False, f"SSH连接失败：{str(e)}"
-        else:
+        if not (asset.username and asset.password):
             logger.info(f"网络连通但无SSH凭据: {asset.name}")
-            return True, "网络连接正常"
+            return True, "网络连接正常", 'banner' if has_banner else 'tcp'
+        
+        # 有SSH凭据：状态即将恢复为在线、被显式要求或没有读到SSH标识时才做完整认证
+        if has_banner and not full_check and asset.status == 'online':
+            return True, "SSH服务正常", 'banner'
+        if has_banner and not full_check and asset.auth_failed:
+            return False, "SSH认证失败，等待下次完整检查", 'banner'
+        
+        try:
+            # 已有存活的池化连接即视为认证通过，否则做一次性认证（不占用连接池）
+            ssh_pool.check(asset.ip_address, asset.port, asset.username, asset.password)
+            logger.info(f"SSH连接测试成功: {asset.name}")
+            return True, "SSH连接正常", 'ssh'
+        except paramiko.AuthenticationException as e:
+            logger.warning(f"SSH认证失败: {asset.name} - {e}")
+            return False, f"SSH认证失败：{str(e)}", 'auth'
+        except Exception as e:
+            logger.warning(f"SSH连接失败: {asset.name} - {e}")
+            return False, f"SSH连接失败：{str(e)}", 'ssh'
             
     except Exception as e:
         logger.error(f"连接测试异常: {asset.name} - {e}")
-        return False, f"连接测试失败：{str(e)}"
+        return False, f"连接测试失败：{str(e)}", 'tcp'
 
 def execute_ssh_command(hostname, port, username, password, command):
     """通过SSH执行远程命令"""
     try:
         logger.info(f"执行SSH命令: {hostname}:{port} - {command}")
         
-        # 创建SSH客户端
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # 连接SSH服务器
-        ssh.connect(hostname, port=port, username=username, password=password, timeout=app.config['SSH_TIMEOUT'])
-        
-        # 执行命令
-        stdin, stdout, stderr = ssh.exec_command(command)
-        
-        # 获取输出
-        output = stdout.read().decode('utf-8')
-        error = stderr.read().decode('utf-8')
-        
-        # 关闭连接
-        ssh.close()
+        # 在连接池中的SSH连接上打开exec通道
+        with ssh_pool.client(hostname, port, username, password) as ssh:
+            stdin, stdout, stderr = ssh.exec_command(command)
+            
+            # 获取输出
+            output = stdout.read().decode('utf-8')
+            error = stderr.read().decode('utf-8')
         
         if error:
             logger.warning(f"命令执行出错: {hostname} - {error}")
@@ -308,9 +696,15 @@ def execute_ssh_command(hostname, port, username, password, command):
             logger.info(f"命令执行成功: {hostname}")
         
         return True, output, error
-    except paramiko.AuthenticationException:
-        logger.error(f"SSH认证失败: {hostname}")
-        return False, "", "SSH认证失败：用户名或密码错误"
+    except SSHConnectError as e:
+        if isinstance(e.__cause__, paramiko.AuthenticationException):
+            logger.error(f"SSH认证失败: {hostname}")
+            return False, "", "SSH认证失败：用户名或密码错误"
+        if isinstance(e.__cause__, socket.timeout):
+            logger.error(f"连接超时: {hostname}")
+            return False, "", "连接超时：无法连接到目标主机"
+        logger.error(f"SSH连接错误: {hostname} - {e}")
+        return False, "", f"SSH连接错误：{str(e)}"
     except paramiko.SSHException as e:
         logger.error(f"SSH连接错误: {hostname} - {e}")
         return False, "", f"SSH连接错误：{str(e)}"
@@ -321,63 +715,611 @@ def execute_ssh_command(hostname, port, username, password, command):
         logger.error(f"执行命令异常: {hostname} - {e}")
         return False, "", f"执行命令时发生错误：{str(e)}"
 
+# 探测在工作线程中进行，传入资产的只读快照，不跨线程访问会话中的ORM对象
+ProbeTarget = namedtuple('ProbeTarget', 'id name ip_address port username password status auth_failed')
+
+def probe_target(asset):
+    return ProbeTarget(asset.id, asset.name, asset.ip_address, asset.port, asset.username,
+                       asset.password, asset.status, bool(asset.auth_failed))
+
+def submit_probe(executor, target, full_check, results):
+    """提交单个资产的探测，完成时把 (asset_id, (is_online, message, check_level)) 放入 results 队列
+    并唤醒调度循环；各资产独立完成，不等待同批的其他资产"""
+    def done(future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"连接测试异常: {target.name} - {e}")
+            result = (False, f"连接测试失败：{str(e)}", 'tcp')
+        results.put((target.id, result))
+        probe_scheduler.wakeup.set()
+    executor.submit(test_asset_connection, target, full_check).add_done_callback(done)
+
+def apply_probe_result(asset, is_online, message, check_level):
+    """根据探测结果更新资产状态，返回 (old_status, new_status, changed)
+    
+    changed 表示列表中展示的状态或检查级别有变化；last_update 每次探测都会刷新，不计入。
+    """
+    old_status = asset.status
+    old_check_level = asset.check_level
+    asset.check_level = check_level
+    if check_level in ('ssh', 'auth'):
+        asset.last_full_check = datetime.now(timezone.utc)
+        asset.auth_failed = check_level == 'auth'
+    if is_online:
+        # 如果设备能连接，设置为online（包括从maintenance恢复的情况）
+        asset.status = 'online'
+        if old_status == 'maintenance':
+            logger.info(f"资产从维护中恢复: {asset.name} ({asset.ip_address})")
+    elif old_status != 'maintenance':
+        # 设备离线；如果之前是maintenance且现在不能连接，保持maintenance（可能是重启中）
+        asset.status = 'offline'
+    
+    # 无论状态是否变化，都更新最后测试时间
+    asset.last_update = datetime.now(timezone.utc)
+    if old_status != asset.status:
+        logger.info(f"资产状态变更: {asset.name} ({asset.ip_address}) 从 {old_status} 变更为 {asset.status} - {message}")
+    return old_status, asset.status, old_status != asset.status or old_check_level != check_level
+
+# 探测调度器：按下次到期时间排序的小顶堆
+class ProbeScheduler:
+    def __init__(self):
+        self.heap = []  # [(due_at, asset_id)]
+        self.due = {}  # {asset_id: due_at}，堆中与此不一致的条目视为过期
+        self.states = {}  # {asset_id: {'interval': 秒, 'streak': 连续相同结果次数}}
+        self.full_requested = set()  # 被显式要求做完整SSH认证检查的资产
+        self.running = set()  # 已取出、探测尚未完成的资产
+        self.rerun = set()  # 探测进行中又被要求探测的资产，完成后立即再探测一次
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+    
+    def _push(self, asset_id, due_at):
+        """登记下次到期时间；已有更早的到期时间（如 request_probe）时保留较早的"""
+        if self.due.get(asset_id, due_at) < due_at:
+            return
+        self.due[asset_id] = due_at
+        heapq.heappush(self.heap, (due_at, asset_id))
+    
+    def sync(self, asset_ids):
+        """与数据库中的资产集合同步：新增资产立即到期，已删除资产移出调度"""
+        now = time.monotonic()
+        with self.lock:
+            asset_ids = set(asset_ids)
+            for asset_id in asset_ids - self.due.keys() - self.running:
+                self._push(asset_id, now)
+            for asset_id in self.due.keys() - asset_ids:
+                del self.due[asset_id]
+                self.states.pop(asset_id, None)
+                self.full_requested.discard(asset_id)
+    
+    def request_probe(self, asset_id, full_check=False):
+        """要求尽快探测某个资产（例如资产新增或修改后），可要求做完整SSH认证检查"""
+        with self.lock:
+            self._push(asset_id, time.monotonic())
+            if full_check:
+                self.full_requested.add(asset_id)
+        self.wakeup.set()
+    
+    def take_full_requests(self, asset_ids):
+        """取出并清除这批资产中被要求完整检查的ID"""
+        with self.lock:
+            requested = self.full_requested.intersection(asset_ids)
+            self.full_requested -= requested
+        return requested
+    
+    def pop_due(self):
+        """取出所有已到期的资产ID，标记为探测中；正在探测的资产推迟到本次探测完成后"""
+        now = time.monotonic()
+        due_ids = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due_at, asset_id = heapq.heappop(self.heap)
+                if self.due.get(asset_id) == due_at:
+                    del self.due[asset_id]
+                    if asset_id in self.running:
+                        self.rerun.add(asset_id)
+                    else:
+                        self.running.add(asset_id)
+                        due_ids.append(asset_id)
+        return due_ids
+    
+    def cancel(self, asset_id):
+        """探测未能完成（资产已删除或结果写入失败）：移出探测中集合，下次同步时按新资产重新调度"""
+        with self.lock:
+            self.running.discard(asset_id)
+            self.rerun.discard(asset_id)
+    
+    def next_due_in(self):
+        """距离下一个到期资产的秒数，无资产时返回 None"""
+        with self.lock:
+            while self.heap and self.due.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                return None
+            return max(0.0, self.heap[0][0] - time.monotonic())
+    
+    def reschedule(self, asset_id, old_status, new_status, is_online):
+        """根据探测结果计算下次探测时间
+        
+        - 状态刚发生变化：以 PROBE_MIN_INTERVAL 密集复查
+        - 持续在线：间隔逐步放大到 PROBE_STABLE_MAX_INTERVAL
+        - 持续离线/维护中：指数退避到 PROBE_OFFLINE_MAX_INTERVAL
+        探测期间被 request_probe 要求的探测不会被推迟
+        """
+        base = app.config['CONNECTION_TEST_INTERVAL']
+        with self.lock:
+            self.running.discard(asset_id)
+            state = self.states.setdefault(asset_id, {'interval': base, 'streak': 0})
+            if old_status != new_status:
+                state['streak'] = 0
+                interval = app.config['PROBE_MIN_INTERVAL']
+            else:
+                state['streak'] += 1
+                if is_online:
+                    interval = min(max(state['interval'], base) * 1.5, app.config['PROBE_STABLE_MAX_INTERVAL'])
+                else:
+                    # 维护中（如重启中）的资产从最短间隔开始退避，尽快发现其恢复
+                    start = app.config['PROBE_MIN_INTERVAL'] if new_status == 'maintenance' else base
+                    interval = min(start * (2 ** min(state['streak'], 16)), app.config['PROBE_OFFLINE_MAX_INTERVAL'])
+            state['interval'] = interval
+            if asset_id in self.rerun:
+                self.rerun.discard(asset_id)
+                self._push(asset_id, time.monotonic())
+            else:
+                # 加入±10%抖动，避免大量资产在同一时刻集中到期
+                self._push(asset_id, time.monotonic() + interval * random.uniform(0.9, 1.1))
+    
+    def stats(self):
+        with self.lock:
+            return {'scheduled': len(self.due), 'running': len(self.running)}
+
+# 全局探测调度器
+probe_scheduler = ProbeScheduler()
+
+# 资产状态变更推送：按类别收集状态变化，在 ASSET_EVENT_WINDOW 窗口内合并后
+# 一次推送到 /assets 命名空间中该类别的房间，客户端据此就地更新，不必轮询整个列表
+class AssetEventBroadcaster:
+    def __init__(self):
+        self.pending = {}  # {category: {asset_id: event}}，同一资产窗口内多次变化合并为一条
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+    
+    @staticmethod
+    def room(category):
+        return f'assets:{category}'
+    
+    def publish(self, category, asset_id, old_status, new_status):
+        if old_status == new_status:
+            return
+        with self.lock:
+            events = self.pending.setdefault(category, {})
+            event = events.get(asset_id)
+            if event is None:
+                events[asset_id] = {'asset_id': asset_id, 'old': old_status, 'new': new_status, 'ts': time.time()}
+            else:
+                # 保留窗口开始前的旧状态，新状态取最后一次
+                event.update(new=new_status, ts=time.time())
+        self.wakeup.set()
+    
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        sent = 0
+        for category, events in pending.items():
+            # 窗口内变回原状态的资产不推送
+            events = [event for event in events.values() if event['old'] != event['new']]
+            if events:
+                socketio.emit('asset_status', {'category': category, 'events': events},
+                              to=self.room(category), namespace='/assets')
+                sent += len(events)
+        return sent
+    
+    def run(self):
+        """后台推送循环：有事件时等待一个合并窗口再推送"""
+        while True:
+            self.wakeup.wait()
+            time.sleep(app.config['ASSET_EVENT_WINDOW'])
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"资产状态推送出错: {str(e)}")
+
+# 全局资产状态推送器
+asset_events = AssetEventBroadcaster()
+
+@socketio.on('connect', namespace='/assets')
+def assets_socket_connect():
+    if not current_user.is_authenticated:
+        return False
+
+@socketio.on('subscribe', namespace='/assets')
+def assets_socket_subscribe(data):
+    """订阅某个类别的资产状态变更: {category}"""
+    category = (data or {}).get('category')
+    if not category:
+        return {'success': False, 'error': '缺少category'}
+    join_room(asset_events.room(category))
+    return {'success': True}
+
+@socketio.on('unsubscribe', namespace='/assets')
+def assets_socket_unsubscribe(data):
+    category = (data or {}).get('category')
+    if category:
+        leave_room(asset_events.room(category))
+    return {'success': True}
+
 def background_connection_test():
-    """后台连接测试任务 - 自动检测资产在线/离线状态"""
+    """后台连接测试任务 - 按资产各自的到期时间自动检测在线/离线状态"""
     logger.info("后台连接测试任务启动 - 自动检测资产状态")
+    # 线程池在各轮之间复用，并发上限由 PROBE_CONCURRENCY 控制
+    executor = ThreadPoolExecutor(max_workers=app.config['PROBE_CONCURRENCY'],
+                                  thread_name_prefix='asset-probe')
+    # 各探测完成时放入结果，本循环逐次取出写回并重新调度；慢主机或超时不会推迟其他资产的探测
+    results = queue.Queue()
+    next_sync = 0.0
     while True:
+        completed = {}
+        unsubmitted = set()
         try:
             with app.app_context():
-                assets = Asset.query.all()
-                if assets:
-                    logger.info(f"开始自动测试 {len(assets)} 个资产的连接状态")
-                    
-                    online_count = 0
-                    offline_count = 0
-                    maintenance_count = 0
-                    
+                # 定期与数据库同步资产集合，发现新增/删除的资产
+                if time.monotonic() >= next_sync:
+                    probe_scheduler.sync(asset_id for (asset_id,) in db.session.query(Asset.id).all())
+                    next_sync = time.monotonic() + app.config['CONNECTION_TEST_INTERVAL']
+                
+                while True:
+                    try:
+                        asset_id, result = results.get_nowait()
+                    except queue.Empty:
+                        break
+                    completed[asset_id] = result
+                if completed:
+                    changes = []
+                    # 只有状态或检查级别变化的类别才使列表缓存失效，仅刷新 last_update 时客户端继续用 304
+                    categories = set()
+                    assets = Asset.query.filter(Asset.id.in_(completed)).all()
                     for asset in assets:
-                        # 测试连接（包括维护状态的资产）
-                        is_online, message = test_asset_connection(asset)
-                        
-                        # 更新状态
-                        old_status = asset.status
-                        if is_online:
-                            # 如果设备能连接，设置为online（包括从maintenance恢复的情况）
-                            asset.status = 'online'
-                            online_count += 1
-                            if old_status == 'maintenance':
-                                logger.info(f"资产从维护中恢复: {asset.name} ({asset.ip_address})")
-                        else:
-                            # 设备离线
-                            if old_status == 'maintenance':
-                                # 如果之前是maintenance且现在不能连接，保持maintenance（可能是重启中）
-                                maintenance_count += 1
-                            else:
-                                # 其他情况设置为offline
-                                asset.status = 'offline'
-                                offline_count += 1
-                        
-                        # 如果状态发生变化，更新最后更新时间
-                        if old_status != asset.status:
-                            asset.last_update = datetime.now(timezone.utc)
-                            logger.info(f"资产状态变更: {asset.name} ({asset.ip_address}) 从 {old_status} 变更为 {asset.status} - {message}")
-                        else:
-                            # 即使状态没变，也更新最后测试时间
-                            asset.last_update = datetime.now(timezone.utc)
+                        is_online, message, check_level = completed[asset.id]
+                        old_status, new_status, changed = apply_probe_result(asset, is_online, message, check_level)
+                        if changed:
+                            categories.add(asset.category)
+                        if old_status != new_status:
+                            changes.append((asset.category, asset.id, old_status, new_status))
+                        probe_scheduler.reschedule(asset.id, old_status, new_status, is_online)
+                    # 探测期间被删除的资产
+                    for asset_id in completed.keys() - {asset.id for asset in assets}:
+                        probe_scheduler.cancel(asset_id)
                     
-                    # 提交所有更改
                     db.session.commit()
+                    if categories:
+                        asset_list_cache.bump(*categories)
+                    # 提交之后再推送，客户端据此重新拉取时能读到新状态
+                    for change in changes:
+                        asset_events.publish(*change)
                     
-                    # 记录测试结果统计
-                    logger.info(f"自动测试完成 - 在线: {online_count}, 离线: {offline_count}, 维护: {maintenance_count}")
-                else:
-                    logger.info("没有资产需要测试")
+                    stats = probe_scheduler.stats()
+                    logger.info(f"自动测试完成 - 本次: {len(completed)}, 状态变更: {len(changes)}, "
+                                f"探测中: {stats['running']}, 调度中: {stats['scheduled']}")
+                completed = {}
+                
+                due_ids = probe_scheduler.pop_due()
+                if due_ids:
+                    unsubmitted = set(due_ids)
+                    # 逐个提交探测（包括维护状态的资产），不等待本批完成
+                    full_check_ids = probe_scheduler.take_full_requests(due_ids)
+                    for asset in Asset.query.filter(Asset.id.in_(due_ids)).all():
+                        submit_probe(executor, probe_target(asset),
+                                     asset.id in full_check_ids or needs_full_check(asset), results)
+                        unsubmitted.discard(asset.id)
+                    # 已被删除的资产
+                    for asset_id in unsubmitted:
+                        probe_scheduler.cancel(asset_id)
+                    unsubmitted = set()
                     
         except Exception as e:
             logger.error(f"后台连接测试出错: {str(e)}")
+            # 未能写回的结果和未能提交的探测，这些资产在下次同步时重新调度
+            for asset_id in completed.keys() | unsubmitted:
+                probe_scheduler.cancel(asset_id)
+        
+        # 睡眠到下一个资产到期、下次同步或有探测完成为止，可被 request_probe 提前唤醒
+        wait = max(0.0, next_sync - time.monotonic())
+        next_due = probe_scheduler.next_due_in()
+        if next_due is not None:
+            wait = min(wait, next_due)
+        probe_scheduler.wakeup.wait(max(wait, 0.05))
+        probe_scheduler.wakeup.clear()
+
+def background_ssh_pool_reaper():
+    """后台任务 - 定期关闭SSH连接池中空闲或失效的连接、空闲的交互式会话，清理过期的分块上传、数据库游标、查询任务和慢查询日志"""
+    next_slow_query_purge = 0.0
+    while True:
+        time.sleep(app.config['SSH_POOL_KEEPALIVE'])
+        try:
+            closed = ssh_pool.reap_idle()
+            if closed:
+                logger.info(f"SSH连接池回收 {closed} 个连接, 当前: {ssh_pool.stats()}")
+        except Exception as e:
+            logger.error(f"SSH连接池回收出错: {str(e)}")
+        try:
+            closed = ssh_manager.reap_idle()
+            if closed:
+                stats = ssh_manager.stats()
+                logger.info(f"回收 {closed} 个SSH交互式会话, 剩余: {stats['total']}, 最长存活: {stats['max_age_seconds']}s")
+        except Exception as e:
+            logger.error(f"SSH会话回收出错: {str(e)}")
+        try:
+            expired = sftp_upload_manager.expire_stale()
+            if expired:
+                with app.app_context():
+                    for upload in expired:
+                        asset = db.session.get(Asset, upload['asset_id'])
+                        if asset is None:
+                            continue
+                        try:
+                            with pooled_sftp(asset) as sftp:
+                                sftp.remove(upload['temp_path'])
+                        except Exception:
+                            pass
+                logger.info(f"清理过期分块上传 {len(expired)} 个")
+        except Exception as e:
+            logger.error(f"清理过期分块上传出错: {str(e)}")
+        try:
+            closed = db_connection_manager.reap_cursors()
+            if closed:
+                logger.info(f"关闭 {closed} 个超时未续读的数据库游标")
+            expired = query_job_manager.expire()
+            if expired:
+                logger.info(f"清理 {expired} 个已结束的查询任务")
+        except Exception as e:
+            logger.error(f"数据库游标回收出错: {str(e)}")
+        if time.monotonic() >= next_slow_query_purge:
+            next_slow_query_purge = time.monotonic() + 3600
+            try:
+                with app.app_context():
+                    purged = query_profiler.purge()
+                if purged:
+                    logger.info(f"清理过期慢查询日志 {purged} 条")
+            except Exception as e:
+                logger.error(f"清理慢查询日志出错: {str(e)}")
+
+# 一次远程调用采集CPU、内存、磁盘：/proc/stat 首行、MemTotal/MemAvailable、根分区使用率
+METRICS_COMMAND = "head -n1 /proc/stat; grep -E '^(MemTotal|MemAvailable):' /proc/meminfo; df -P / | tail -n1"
+
+# 资源使用率采集器
+class MetricsCollector:
+    def __init__(self):
+        self.cpu_samples = {}  # {asset_id: (total, idle)}，用于计算两次采集之间的CPU使用率
+        self.lock = threading.Lock()
+    
+    def parse(self, asset_id, output):
+        """解析 METRICS_COMMAND 输出，返回 (cpu, memory, disk) 百分比整数"""
+        cpu = memory = disk = None
+        mem_total = mem_available = None
+        for line in output.splitlines():
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == 'cpu':
+                values = [int(v) for v in fields[1:]]
+                # idle + iowait 视为空闲
+                total, idle = sum(values), values[3] + (values[4] if len(values) > 4 else 0)
+                with self.lock:
+                    previous = self.cpu_samples.get(asset_id)
+                    self.cpu_samples[asset_id] = (total, idle)
+                # 首次采集没有上一次样本，用开机以来的平均值
+                prev_total, prev_idle = previous if previous and total > previous[0] else (0, 0)
+                delta_total = total - prev_total
+                if delta_total > 0:
+                    cpu = round(100 * (1 - (idle - prev_idle) / delta_total))
+            elif fields[0] == 'MemTotal:':
+                mem_total = int(fields[1])
+            elif fields[0] == 'MemAvailable:':
+                mem_available = int(fields[1])
+            elif len(fields) >= 6 and fields[4].endswith('%'):
+                disk = int(fields[4].rstrip('%'))
+        if mem_total:
+            memory = round(100 * (mem_total - (mem_available or 0)) / mem_total)
+        return cpu, memory, disk
+    
+    def collect_one(self, asset_id, hostname, port, username, password):
+        """借用池化连接执行采集命令；不刷新空闲时间，空闲连接仍按 SSH_POOL_IDLE_TTL 回收"""
+        with ssh_pool.client(hostname, port, username, password, touch=False) as ssh:
+            stdin, stdout, stderr = ssh.exec_command(METRICS_COMMAND, timeout=app.config['SSH_TIMEOUT'])
+            output = stdout.read().decode('utf-8', errors='ignore')
+        return self.parse(asset_id, output)
+    
+    def forget(self, asset_ids):
+        """移除已不存在资产的CPU样本"""
+        with self.lock:
+            for asset_id in set(self.cpu_samples) - set(asset_ids):
+                del self.cpu_samples[asset_id]
+
+# 全局资源采集器
+metrics_collector = MetricsCollector()
+
+# 时序数据的聚合粒度（秒）
+METRIC_RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# 时序存储：原始采样 + 增量维护的多级聚合
+class MetricsStore:
+    def record(self, ts, samples):
+        """写入一批采样 [(asset_id, cpu, memory, disk)] 并增量更新各级聚合桶"""
+        if not samples:
+            return
+        db.session.bulk_insert_mappings(AssetMetric, [
+            {'asset_id': asset_id, 'ts': ts, 'cpu': cpu, 'memory': memory, 'disk': disk}
+            for asset_id, cpu, memory, disk in samples
+        ])
+        asset_ids = [sample[0] for sample in samples]
+        for resolution, seconds in METRIC_RESOLUTIONS.items():
+            bucket = ts - ts % seconds
+            # 同一批采样落在同一个桶内，每个粒度只需一次查询
+            existing = {
+                rollup.asset_id: rollup
+                for rollup in AssetMetricRollup.query.filter(
+                    AssetMetricRollup.resolution == resolution,
+                    AssetMetricRollup.bucket == bucket,
+                    AssetMetricRollup.asset_id.in_(asset_ids)
+                )
+            }
+            for asset_id, cpu, memory, disk in samples:
+                rollup = existing.get(asset_id)
+                if rollup is None:
+                    db.session.add(AssetMetricRollup(
+                        asset_id=asset_id, resolution=resolution, bucket=bucket, samples=1,
+                        cpu_sum=cpu, cpu_max=cpu, memory_sum=memory, memory_max=memory,
+                        disk_sum=disk, disk_max=disk
+                    ))
+                    continue
+                rollup.samples += 1
+                rollup.cpu_sum += cpu
+                rollup.cpu_max = max(rollup.cpu_max, cpu)
+                rollup.memory_sum += memory
+                rollup.memory_max = max(rollup.memory_max, memory)
+                rollup.disk_sum += disk
+                rollup.disk_max = max(rollup.disk_max, disk)
+        db.session.commit()
+    
+    def purge(self, now=None):
+        """按保留期删除过期的原始采样和聚合桶"""
+        now = int(now or time.time())
+        deleted = AssetMetric.query.filter(
+            AssetMetric.ts < now - app.config['METRICS_RAW_RETENTION']
+        ).delete(synchronize_session=False)
+        for resolution, retention in app.config['METRICS_ROLLUP_RETENTION'].items():
+            deleted += AssetMetricRollup.query.filter(
+                AssetMetricRollup.resolution == resolution,
+                AssetMetricRollup.bucket < now - retention
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    def delete_asset(self, asset_id):
+        AssetMetric.query.filter_by(asset_id=asset_id).delete(synchronize_session=False)
+        AssetMetricRollup.query.filter_by(asset_id=asset_id).delete(synchronize_session=False)
+    
+    @staticmethod
+    def pick_resolution(start, end):
+        """选择点数不超过 METRICS_MAX_POINTS 的最细聚合粒度"""
+        for resolution, seconds in METRIC_RESOLUTIONS.items():
+            if (end - start) / seconds <= app.config['METRICS_MAX_POINTS']:
+                return resolution
+        return '1d'
+    
+    def query(self, asset_ids, start, end, resolution):
+        """查询时间范围内的序列，返回 {asset_id: {'t': [...], 'cpu_avg': [...], ...}}（列式）"""
+        series = {asset_id: {'t': [], 'cpu_avg': [], 'cpu_max': [], 'memory_avg': [], 'memory_max': [],
+                             'disk_avg': [], 'disk_max': []} for asset_id in asset_ids}
+        if resolution == 'raw':
+            rows = db.session.query(
+                AssetMetric.asset_id, AssetMetric.ts, AssetMetric.cpu, AssetMetric.memory, AssetMetric.disk
+            ).filter(
+                AssetMetric.asset_id.in_(asset_ids), AssetMetric.ts >= start, AssetMetric.ts < end
+            ).order_by(AssetMetric.asset_id, AssetMetric.ts)
+            for asset_id, ts, cpu, memory, disk in rows:
+                column = series[asset_id]
+                column['t'].append(ts)
+                for name, value in (('cpu', cpu), ('memory', memory), ('disk', disk)):
+                    column[f'{name}_avg'].append(value)
+                    column[f'{name}_max'].append(value)
+            return series
+        
+        seconds = METRIC_RESOLUTIONS[resolution]
+        rows = db.session.query(
+            AssetMetricRollup.asset_id, AssetMetricRollup.bucket, AssetMetricRollup.samples,
+            AssetMetricRollup.cpu_sum, AssetMetricRollup.cpu_max,
+            AssetMetricRollup.memory_sum, AssetMetricRollup.memory_max,
+            AssetMetricRollup.disk_sum, AssetMetricRollup.disk_max
+        ).filter(
+            AssetMetricRollup.asset_id.in_(asset_ids),
+            AssetMetricRollup.resolution == resolution,
+            AssetMetricRollup.bucket >= start - start % seconds,
+            AssetMetricRollup.bucket < end
+        ).order_by(AssetMetricRollup.asset_id, AssetMetricRollup.bucket)
+        for asset_id, bucket, samples, cpu_sum, cpu_max, memory_sum, memory_max, disk_sum, disk_max in rows:
+            column = series[asset_id]
+            column['t'].append(bucket)
+            column['cpu_avg'].append(round(cpu_sum / samples, 1))
+            column['cpu_max'].append(cpu_max)
+            column['memory_avg'].append(round(memory_sum / samples, 1))
+            column['memory_max'].append(memory_max)
+            column['disk_avg'].append(round(disk_sum / samples, 1))
+            column['disk_max'].append(disk_max)
+        return series
+
+# 全局时序存储
+metrics_store = MetricsStore()
+
+def background_metrics_collection():
+    """后台资源采集任务 - 并发采集在线资产的CPU/内存/磁盘使用率并批量写回"""
+    logger.info("后台资源采集任务启动")
+    # 与连接探测使用独立的线程池和间隔
+    executor = ThreadPoolExecutor(max_workers=app.config['METRICS_CONCURRENCY'],
+                                  thread_name_prefix='asset-metrics')
+    next_purge = 0.0
+    while True:
+        cycle_start = time.monotonic()
+        try:
+            with app.app_context():
+                targets = db.session.query(
+                    Asset.id, Asset.ip_address, Asset.port, Asset.username, Asset.password,
+                    Asset.category, Asset.cpu_usage, Asset.memory_usage, Asset.disk_usage
+                ).filter(Asset.status == 'online', Asset.username != '', Asset.password != '').all()
+                metrics_collector.forget(target.id for target in targets)
+                
+                futures = {
+                    executor.submit(metrics_collector.collect_one, target.id, target.ip_address, target.port,
+                                    target.username, target.password): target
+                    for target in targets
+                }
+                mappings = []
+                categories = set()
+                samples = []
+                failed = 0
+                for future in as_completed(futures):
+                    target = futures[future]
+                    try:
+                        cpu, memory, disk = future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.debug(f"资源采集失败: {target.ip_address} - {e}")
+                        continue
+                    # 只写回与当前值不同的字段，未变化的资产不写库也不使列表缓存失效
+                    mapping = {'id': target.id}
+                    if cpu is not None and cpu != target.cpu_usage:
+                        mapping['cpu_usage'] = cpu
+                    if memory is not None and memory != target.memory_usage:
+                        mapping['memory_usage'] = memory
+                    if disk is not None and disk != target.disk_usage:
+                        mapping['disk_usage'] = disk
+                    if len(mapping) > 1:
+                        mappings.append(mapping)
+                        categories.add(target.category)
+                    if None not in (cpu, memory, disk):
+                        samples.append((target.id, cpu, memory, disk))
+                
+                # 一次性批量写回最新值，并追加到时序存储
+                if mappings:
+                    db.session.bulk_update_mappings(Asset, mappings)
+                    db.session.commit()
+                    asset_list_cache.bump(*categories)
+                metrics_store.record(int(time.time()), samples)
+                
+                if time.monotonic() >= next_purge:
+                    purged = metrics_store.purge()
+                    next_purge = time.monotonic() + 3600
+                    if purged:
+                        logger.info(f"清理过期时序数据 {purged} 行")
+                
+                if targets:
+                    logger.info(f"资源采集完成 - 目标: {len(targets)}, 成功: {len(mappings)}, 失败: {failed}, "
+                                f"耗时: {time.monotonic() - cycle_start:.2f}s")
+        except Exception as e:
+            logger.error(f"后台资源采集出错: {str(e)}")
         
-        # 使用配置的测试间隔
-        time.sleep(app.config['CONNECTION_TEST_INTERVAL'])
+        time.sleep(max(0.0, app.config['METRICS_INTERVAL'] - (time.monotonic() - cycle_start)))
 
 # 启动后台任务
 def start_background_tasks():
@@ -385,6 +1327,12 @@ def start_background_tasks():
     thread = threading.Thread(target=background_connection_test, daemon=True)
     thread.start()
     logger.info("后台连接测试任务已启动")
+    threading.Thread(target=background_ssh_pool_reaper, daemon=True).start()
+    logger.info("SSH连接池与会话回收任务已启动")
+    threading.Thread(target=background_metrics_collection, daemon=True).start()
+    logger.info("后台资源采集任务已启动")
+    threading.Thread(target=asset_events.run, daemon=True).start()
+    logger.info("资产状态推送任务已启动")
 
 # 路由
 @app.route('/')
@@ -606,58 +1554,400 @@ def physical_servers():
     return render_template('physical_servers.html', assets=assets)
 
 
-@app.route('/api/assets', methods=['GET', 'POST'])
-@login_required
-def api_assets():
+# 资产类别，由 asset_category() 根据资产类型分配
+ASSET_CATEGORIES = ('training', 'physical')
+
+# 资产列表响应缓存：每个类别一个版本号，资产列表字段的每条写入路径提交后递增；
+# ETag 由版本号和查询参数组成，未变化时直接返回 304，不查询数据库。
+# 版本号只在本进程内有效，多进程部署时各进程分别计数（写入发生在其他进程时无法感知）
+class AssetListCache:
+    def __init__(self, categories):
+        self.epoch = uuid.uuid4().hex[:8]  # 进程重启后旧 ETag 全部失效
+        # {category: version}，只登记已知类别；请求参数中的其他类别没有资产，版本恒为0且不缓存
+        self.versions = {category: 0 for category in categories}
+        self.bodies = {}  # {category: (version, 序列化后的默认列表)}
+        self.lock = threading.Lock()
+    
+    def bump(self, *categories):
+        """资产写入提交后调用，使给定类别的列表失效"""
+        with self.lock:
+            for category in categories:
+                self.versions[category] = self.versions.get(category, 0) + 1
+                self.bodies.pop(category, None)
+    
+    def version(self, category):
+        with self.lock:
+            return self.versions.get(category, 0)
+    
+    def etag(self, category, version, query_string):
+        digest = hashlib.sha1(category.encode('utf-8') + b'?' + query_string).hexdigest()[:12]
+        return f'{self.epoch}-{version}-{digest}'
+    
+    def get_body(self, category, version):
+        with self.lock:
+            cached = self.bodies.get(category)
+        return cached[1] if cached and cached[0] == version else None
+    
+    def put_body(self, category, version, body):
+        with self.lock:
+            # 查询期间发生了写入，结果可能已过期，不缓存
+            if category in self.versions and self.versions[category] == version:
+                self.bodies[category] = (version, body)
+    
+asset_list_cache = AssetListCache(ASSET_CATEGORIES)
+
+# 资产列表接口的字段投影：返回字段名 -> 模型列（密码只在 fields 中显式请求时返回）
+ASSET_LIST_FIELDS = {
+    'id': Asset.id,
+    'name': Asset.name,
+    'type': Asset.asset_type,
+    'status': Asset.status,
+    'ip': Asset.ip_address,
+    'port': Asset.port,
+    'username': Asset.username,
+    'password': Asset.password,
+    'cpu': Asset.cpu_usage,
+    'memory': Asset.memory_usage,
+    'disk': Asset.disk_usage,
+    'description': Asset.description,
+    'category': Asset.category,
+    'check_level': Asset.check_level,
+    'last_update': Asset.last_update
+}
+ASSET_LIST_DEFAULT_FIELDS = [name for name in ASSET_LIST_FIELDS if name not in ('password', 'category')]
+# 只允许按有索引的列排序，id 作为键集分页的次排序键
+ASSET_LIST_SORT_COLUMNS = {
+    'id': Asset.id,
+    'name': Asset.name,
+    'type': Asset.asset_type,
+    'status': Asset.status,
+    'ip': Asset.ip_address,
+    'last_update': Asset.last_update
+}
+
+def parse_asset_time(value):
+    """解析时间过滤参数：UTC epoch 秒或 ISO 8601，返回与库中一致的 naive UTC 时间
+
+    格式错误、非有限值（inf、nan）或超出可表示范围时抛出 ValueError，由调用方返回 400。
+    """
     try:
-        if request.method == 'GET':
-            category = request.args.get('category', 'training')
-            logger.info(f"获取资产列表: {category}")
-            
-            assets = Asset.query.filter_by(category=category).all()
-            
-            assets_data = []
-            for asset in assets:
-                assets_data.append({
-                    'id': asset.id,
-                    'name': asset.name,
-                    'type': asset.asset_type,
-                    'status': asset.status,
-                    'ip': asset.ip_address,
-                    'port': asset.port,
-                    'username': asset.username,
-                    'password': asset.password,
-                    'cpu': asset.cpu_usage,
-                    'memory': asset.memory_usage,
-                    'disk': asset.disk_usage,
-                    'description': asset.description,
-                    'last_update': asset.last_update.strftime('%Y-%m-%d %H:%M:%S')
-                })
-            
-            logger.info(f"返回 {len(assets_data)} 个资产")
-            return jsonify(assets_data)
-        
-        elif request.method == 'POST':
-            data = request.get_json()
-            
-            # 检查IP地址是否已存在
-            existing_asset = Asset.query.filter_by(ip_address=data['ip']).first()
-            if existing_asset:
-                return jsonify({'success': False, 'message': f'IP地址 {data["ip"]} 已存在，请使用其他IP地址！'})
-            
-            # 根据资产类型自动分配类别
-            asset_type = data['type']
-            if asset_type == '虚拟资产':
-                category = 'training'  # 虚拟资产显示在训练系统资产列表
-            elif asset_type == '物理资产':
-                category = 'physical'  # 物理资产显示在主控物理服务器列表
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    try:
+        if seconds is not None:
+            if not math.isfinite(seconds):
+                raise ValueError
+            moment = datetime.fromtimestamp(seconds, timezone.utc)
+        else:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if moment.tzinfo is None:
+                return moment
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f'无效的时间: {value}')
+
+def encode_asset_cursor(sort, value, asset_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, asset_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_asset_cursor(cursor, sort):
+    """解码续页游标，返回 (排序列的值, id)；游标与当前排序不符时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, asset_id = json.loads(raw)
+    except Exception:
+        raise ValueError('无效的cursor')
+    if cursor_sort != sort:
+        raise ValueError('cursor与排序方式不一致')
+    if sort.lstrip('-') == 'last_update':
+        value = datetime.fromisoformat(value)
+    return value, int(asset_id)
+
+def query_assets(args):
+    """按请求参数构造资产列表查询，返回 (查询, 读取的列, 返回的字段, 排序方式, 每页条数或 None)
+
+    过滤：category、status/type（逗号分隔多个值）、name/ip（前缀匹配）、updated_after/updated_before；
+    排序：sort=列名，前缀 - 表示降序；分页：limit + cursor（键集分页，按 排序列, id 续读）；
+    投影：fields=逗号分隔的字段名，只从数据库读取这些列
+    """
+    fields = [name.strip() for name in args.get('fields', '').split(',') if name.strip()] or ASSET_LIST_DEFAULT_FIELDS
+    unknown = [name for name in fields if name not in ASSET_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}")
+    sort = args.get('sort', 'id')
+    column = ASSET_LIST_SORT_COLUMNS.get(sort.lstrip('-'))
+    if column is None:
+        raise ValueError(f'不支持的排序字段: {sort}')
+    descending = sort.startswith('-')
+    
+    # 续页游标需要排序列和 id，未请求时也一并读取
+    columns = list(dict.fromkeys(['id', sort.lstrip('-')] + fields))
+    query = Asset.query.with_entities(*[ASSET_LIST_FIELDS[name] for name in columns])\
+        .filter(Asset.category == args.get('category', 'training'))
+    for name, column_filter in (('status', Asset.status), ('type', Asset.asset_type)):
+        values = [v.strip() for v in args.get(name, '').split(',') if v.strip()]
+        if values:
+            query = query.filter(column_filter.in_(values))
+    # 前缀匹配可以使用 name、ip_address 上的索引
+    if args.get('name'):
+        query = query.filter(Asset.name.startswith(args['name'], autoescape=True))
+    if args.get('ip'):
+        query = query.filter(Asset.ip_address.startswith(args['ip'], autoescape=True))
+    if args.get('updated_after'):
+        query = query.filter(Asset.last_update >= parse_asset_time(args['updated_after']))
+    if args.get('updated_before'):
+        query = query.filter(Asset.last_update < parse_asset_time(args['updated_before']))
+    
+    limit = args.get('limit')
+    if limit is not None or args.get('cursor'):
+        limit = max(1, min(int(limit or app.config['ASSET_PAGE_DEFAULT_LIMIT']), app.config['ASSET_PAGE_MAX_LIMIT']))
+        if column is not Asset.id:
+            # 应用写入时 status、last_update 总有值，为 NULL 的行无法参与键集比较
+            query = query.filter(column.isnot(None))
+        if args.get('cursor'):
+            value, last_id = decode_asset_cursor(args['cursor'], sort)
+            if descending:
+                query = query.filter(db.or_(column < value, db.and_(column == value, Asset.id < last_id)))
             else:
-                category = 'training'  # 默认分配到训练系统资产
-            
-            asset = Asset(
-                name=data['name'],
-                asset_type=asset_type,
-                ip_address=data['ip'],
+                query = query.filter(db.or_(column > value, db.and_(column == value, Asset.id > last_id)))
+    if descending:
+        query = query.order_by(column.desc(), Asset.id.desc())
+    else:
+        query = query.order_by(column, Asset.id)
+    return query, columns, fields, sort, limit
+
+def asset_category(asset_type):
+    """根据资产类型分配类别"""
+    if asset_type == '物理资产':
+        return 'physical'  # 物理资产显示在主控物理服务器列表
+    return 'training'  # 虚拟资产及其他类型显示在训练系统资产列表
+
+# 批量导入的字段及长度上限（与 Asset 模型的列定义一致）
+ASSET_IMPORT_FIELDS = {
+    'name': 100,
+    'type': 50,
+    'ip': 15,
+    'port': None,
+    'username': 50,
+    'password': 100,
+    'description': None
+}
+
+def validate_asset_import(records):
+    """一次遍历校验导入数据，返回 (通过校验的行, 失败行报告)；通过的行为 (行号, 字段字典)，行号从 1 开始"""
+    valid = []
+    failed = []
+    seen = {}  # {ip: 行号}，文件内IP重复也算错误
+    for number, record in enumerate(records, 1):
+        if not isinstance(record, dict):
+            failed.append({'row': number, 'status': 'failed', 'error': '格式错误，每行应为对象'})
+            continue
+        values = {}
+        for field in ASSET_IMPORT_FIELDS:
+            value = record.get(field)
+            values[field] = '' if value is None else str(value).strip()
+        errors = []
+        for field in ('name', 'type', 'ip'):
+            if not values[field]:
+                errors.append(f'缺少{field}')
+        for field, max_length in ASSET_IMPORT_FIELDS.items():
+            if max_length and len(values[field]) > max_length:
+                errors.append(f'{field}超过{max_length}个字符')
+        if values['ip']:
+            try:
+                values['ip'] = str(ipaddress.IPv4Address(values['ip']))
+            except ValueError:
+                errors.append(f"无效的IP地址: {values['ip']}")
+            else:
+                if values['ip'] in seen:
+                    errors.append(f"与第 {seen[values['ip']]} 行的IP重复")
+                else:
+                    seen[values['ip']] = number
+        try:
+            values['port'] = int(values['port'] or 22)
+            if not 0 < values['port'] < 65536:
+                raise ValueError
+        except ValueError:
+            errors.append(f"无效的端口: {values['port']}")
+        if errors:
+            failed.append({'row': number, 'ip': values['ip'] or None, 'status': 'failed', 'error': '；'.join(errors)})
+        else:
+            valid.append((number, values))
+    return valid, failed
+
+def existing_asset_ips(ips):
+    """集合查询已存在的IP，返回 {ip: (id, category)}；按块组装 IN 列表，避免超出绑定参数个数限制"""
+    existing = {}
+    ips = list(ips)
+    for start in range(0, len(ips), 900):
+        rows = db.session.query(Asset.ip_address, Asset.id, Asset.category)\
+            .filter(Asset.ip_address.in_(ips[start:start + 900]))
+        for ip, asset_id, category in rows:
+            existing[ip] = (asset_id, category)
+    return existing
+
+def import_assets(rows, mode='insert', dry_run=False):
+    """写入校验通过的行，返回每行的结果
+
+    mode=insert 时已存在的IP跳过；mode=upsert 时按IP更新已有资产，用户名、密码、描述为空表示不修改。
+    新增和更新分别按 ASSET_IMPORT_BATCH_SIZE 分批提交，一批失败时逐行重试以定位出错的行
+    """
+    existing = existing_asset_ips(values['ip'] for _, values in rows)
+    report = []
+    inserts = []
+    updates = []
+    categories = set()
+    now = datetime.now(timezone.utc)
+    for number, values in rows:
+        category = asset_category(values['type'])
+        current = existing.get(values['ip'])
+        if current is None:
+            inserts.append((number, values['ip'], {
+                'name': values['name'],
+                'asset_type': values['type'],
+                'ip_address': values['ip'],
+                'port': values['port'],
+                'username': values['username'],
+                'password': values['password'],
+                'description': values['description'],
+                'category': category
+            }))
+        elif mode == 'upsert':
+            mapping = {
+                'id': current[0],
+                'name': values['name'],
+                'asset_type': values['type'],
+                'port': values['port'],
+                'category': category,
+                'last_update': now
+            }
+            for field in ('username', 'password', 'description'):
+                if values[field]:
+                    mapping[field] = values[field]
+            updates.append((number, values['ip'], mapping))
+            categories.add(current[1])
+        else:
+            report.append({'row': number, 'ip': values['ip'], 'status': 'skipped', 'id': current[0], 'error': 'IP地址已存在'})
+            continue
+        categories.add(category)
+    
+    if dry_run:
+        report += [{'row': number, 'ip': ip, 'status': 'created'} for number, ip, _ in inserts]
+        report += [{'row': number, 'ip': ip, 'status': 'updated', 'id': mapping['id']} for number, ip, mapping in updates]
+        return report
+    
+    def write(items, apply):
+        batch_size = app.config['ASSET_IMPORT_BATCH_SIZE']
+        written = []
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            try:
+                apply([mapping for _, _, mapping in batch])
+                db.session.commit()
+                written += batch
+                continue
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"批量导入资产第 {start // batch_size + 1} 批失败，逐行重试: {e}")
+            for item in batch:
+                try:
+                    apply([item[2]])
+                    db.session.commit()
+                    written.append(item)
+                except Exception as e:
+                    db.session.rollback()
+                    report.append({'row': item[0], 'ip': item[1], 'status': 'failed', 'error': str(e)})
+        return written
+    
+    created = write(inserts, lambda mappings: db.session.bulk_insert_mappings(Asset, mappings))
+    updated = write(updates, lambda mappings: db.session.bulk_update_mappings(Asset, mappings))
+    if created or updated:
+        asset_list_cache.bump(*categories)
+    
+    created_ids = existing_asset_ips(ip for _, ip, _ in created)
+    for number, ip, _ in created:
+        asset_id = created_ids.get(ip, (None,))[0]
+        report.append({'row': number, 'ip': ip, 'status': 'created', 'id': asset_id})
+        if asset_id is not None:
+            probe_scheduler.request_probe(asset_id, full_check=True)
+    for number, ip, mapping in updated:
+        report.append({'row': number, 'ip': ip, 'status': 'updated', 'id': mapping['id']})
+        # 凭据可能已变更，下一次探测做完整认证
+        probe_scheduler.request_probe(mapping['id'], full_check=True)
+    return report
+
+@app.route('/api/assets', methods=['GET', 'POST'])
+@login_required
+def api_assets():
+    try:
+        if request.method == 'GET':
+            category = request.args.get('category', 'training')
+            version = asset_list_cache.version(category)
+            etag = asset_list_cache.etag(category, version, request.query_string)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            
+            # 页面轮询的默认请求（只带 category）复用缓存的序列化结果
+            default_request = set(request.args) <= {'category'}
+            body = asset_list_cache.get_body(category, version) if default_request else None
+            if body is None:
+                try:
+                    query, columns, fields, sort, limit = query_assets(request.args)
+                except ValueError as e:
+                    return jsonify({'success': False, 'message': str(e)}), 400
+                
+                rows = query.limit(limit + 1).all() if limit else query.all()
+                has_more = bool(limit) and len(rows) > limit
+                rows = rows[:limit] if limit else rows
+                
+                assets_data = []
+                for row in rows:
+                    values = dict(zip(columns, row))
+                    if values.get('last_update') is not None:
+                        values['last_update'] = values['last_update'].strftime('%Y-%m-%d %H:%M:%S')
+                    assets_data.append({name: values[name] for name in fields})
+                logger.debug(f"返回 {len(assets_data)} 个资产")
+                
+                if limit is None:
+                    # 未分页的请求保持原有的数组格式
+                    payload = assets_data
+                else:
+                    next_cursor = None
+                    if has_more:
+                        last = dict(zip(columns, rows[-1]))
+                        next_cursor = encode_asset_cursor(sort, last[sort.lstrip('-')], last['id'])
+                    payload = {'success': True, 'assets': assets_data, 'has_more': has_more, 'next_cursor': next_cursor}
+                body = app.json.dumps(payload)
+                if default_request:
+                    asset_list_cache.put_body(category, version, body)
+            
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            # 浏览器每次都带 If-None-Match 重新验证
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        elif request.method == 'POST':
+            data = request.get_json()
+            
+            # 检查IP地址是否已存在
+            existing_asset = Asset.query.filter_by(ip_address=data['ip']).first()
+            if existing_asset:
+                return jsonify({'success': False, 'message': f'IP地址 {data["ip"]} 已存在，请使用其他IP地址！'})
+            
+            # 根据资产类型自动分配类别
+            asset_type = data['type']
+            category = asset_category(asset_type)
+            
+            asset = Asset(
+                name=data['name'],
+                asset_type=asset_type,
+                ip_address=data['ip'],
                 port=data['port'],
                 username=data.get('username', ''),
                 password=data.get('password', ''),
@@ -667,6 +1957,8 @@ def api_assets():
             
             db.session.add(asset)
             db.session.commit()
+            asset_list_cache.bump(category)
+            probe_scheduler.request_probe(asset.id, full_check=True)
             
             logger.info(f"资产添加成功: {data['name']} (类型: {asset_type}, 类别: {category})")
             return jsonify({'success': True, 'message': f'资产添加成功！已分配到{"训练系统资产" if category == "training" else "主控物理服务器"}列表'})
@@ -675,6 +1967,139 @@ def api_assets():
         logger.error(f"API错误: {e}")
         return jsonify({'success': False, 'message': f'操作失败: {str(e)}'}), 500
 
+@app.route('/api/assets/import', methods=['POST'])
+@login_required
+def api_assets_import():
+    """批量导入资产
+    
+    请求: multipart 上传 file（CSV 带表头，或 JSON 数组），或 JSON 请求体 {assets: [...], mode, dry_run}
+    字段: name, type, ip, port, username, password, description
+    参数: mode=insert（默认，已存在的IP跳过）| upsert（按IP更新已有资产）；dry_run=true 只校验不写入
+    返回每行的结果（行号从 1 开始，不含CSV表头）
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            options = request.form
+            # 文件名决定按 JSON 还是 CSV 解析，部分客户端上传时不带文件名
+            filename = (upload.filename or '').lower()
+            if not filename:
+                return jsonify({'success': False, 'message': '上传的文件缺少文件名（.csv 或 .json）'}), 400
+            try:
+                content = upload.read().decode('utf-8-sig')
+                if filename.endswith('.json'):
+                    records = json.loads(content)
+                else:
+                    records = list(csv.DictReader(io.StringIO(content)))
+            except (ValueError, csv.Error) as e:
+                return jsonify({'success': False, 'message': f'文件解析失败: {str(e)}'}), 400
+        else:
+            data = request.get_json(silent=True)
+            options = data if isinstance(data, dict) else request.args
+            records = data.get('assets') if isinstance(data, dict) else data
+        if isinstance(records, dict):
+            records = records.get('assets')
+        if not isinstance(records, list):
+            return jsonify({'success': False, 'message': '缺少资产数据'}), 400
+        if len(records) > app.config['ASSET_IMPORT_MAX_ROWS']:
+            return jsonify({'success': False, 'message': f"单次最多导入 {app.config['ASSET_IMPORT_MAX_ROWS']} 条"}), 400
+        
+        mode = options.get('mode', 'insert')
+        if mode not in ('insert', 'upsert'):
+            return jsonify({'success': False, 'message': f'不支持的导入模式: {mode}'}), 400
+        dry_run = str(options.get('dry_run', '')).lower() in ('1', 'true', 'yes', 'on')
+        
+        started = time.monotonic()
+        valid, report = validate_asset_import(records)
+        report += import_assets(valid, mode, dry_run)
+        report.sort(key=lambda entry: entry['row'])
+        summary = {status: 0 for status in ('created', 'updated', 'skipped', 'failed')}
+        for entry in report:
+            summary[entry['status']] += 1
+        elapsed = round(time.monotonic() - started, 3)
+        logger.info(f"批量导入资产: {len(records)} 行, 模式: {mode}{'（试运行）' if dry_run else ''}, "
+                    f"结果: {summary}, 耗时: {elapsed}s")
+        return jsonify({
+            'success': True,
+            'dry_run': dry_run,
+            'mode': mode,
+            'total': len(records),
+            'summary': summary,
+            'elapsed': elapsed,
+            'rows': report
+        })
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"批量导入资产失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'导入失败: {str(e)}'}), 500
+
+@app.route('/api/assets/metrics', methods=['GET'])
+@login_required
+def api_asset_metrics():
+    """资源使用率时序查询
+    
+    参数: asset_ids=1,2,3  start/end=UTC epoch 秒（默认最近24小时）
+          resolution=auto|raw|1m|1h|1d（auto 按范围选择预聚合粒度）
+    """
+    try:
+        asset_ids = [int(v) for v in request.args.get('asset_ids', '').split(',') if v.strip()]
+        if not asset_ids:
+            return jsonify({'success': False, 'message': '缺少asset_ids'}), 400
+        if len(asset_ids) > app.config['METRICS_MAX_ASSETS_PER_QUERY']:
+            return jsonify({'success': False, 'message': '单次查询的资产数量过多'}), 400
+        
+        end = int(request.args.get('end') or time.time())
+        start = int(request.args.get('start') or end - 86400)
+        if start >= end:
+            return jsonify({'success': False, 'message': '时间范围无效'}), 400
+        
+        resolution = request.args.get('resolution', 'auto')
+        if resolution == 'auto':
+            resolution = metrics_store.pick_resolution(start, end)
+        elif resolution != 'raw' and resolution not in METRIC_RESOLUTIONS:
+            return jsonify({'success': False, 'message': f'不支持的粒度: {resolution}'}), 400
+        if resolution == 'raw' and end - start > app.config['METRICS_RAW_RETENTION']:
+            return jsonify({'success': False, 'message': '原始数据查询范围超过保留期'}), 400
+        
+        series = metrics_store.query(asset_ids, start, end, resolution)
+        return jsonify({
+            'success': True,
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'series': {str(asset_id): values for asset_id, values in series.items()}
+        })
+    except ValueError:
+        return jsonify({'success': False, 'message': '参数格式错误'}), 400
+    except Exception as e:
+        logger.error(f"时序查询错误: {e}")
+        return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
+
+@app.route('/api/assets/<int:asset_id>/check', methods=['POST'])
+@login_required
+def api_asset_check(asset_id):
+    """立即对资产做一次完整的SSH认证检查"""
+    try:
+        asset = Asset.query.get_or_404(asset_id)
+        is_online, message, check_level = test_asset_connection(asset, full_check=True)
+        old_status, new_status, changed = apply_probe_result(asset, is_online, message, check_level)
+        category = asset.category
+        db.session.commit()
+        if changed:
+            asset_list_cache.bump(category)
+        asset_events.publish(category, asset_id, old_status, new_status)
+        probe_scheduler.reschedule(asset_id, old_status, new_status, is_online)
+        return jsonify({
+            'success': True,
+            'online': is_online,
+            'status': new_status,
+            'check_level': check_level,
+            'message': message
+        })
+    except Exception as e:
+        logger.error(f"资产连接检查错误: {e}")
+        return jsonify({'success': False, 'message': f'检查失败: {str(e)}'}), 500
+
 @app.route('/api/assets/<int:asset_id>/terminal/connect', methods=['POST'])
 @login_required
 def ssh_terminal_connect(asset_id):
@@ -686,7 +2111,7 @@ def ssh_terminal_connect(asset_id):
         if not asset.username or not asset.password:
             return jsonify({'success': False, 'error': '缺少SSH凭据'}), 400
         
-        session_id, success, message = ssh_manager.create_session(asset)
+        session_id, success, message = ssh_manager.create_session(asset, user_id=current_user.id)
         
         if success:
             return jsonify({'success': True, 'session_id': session_id, 'message': message})
@@ -712,7 +2137,13 @@ def ssh_terminal_execute(asset_id):
         output, success, error = ssh_manager.execute_command(session_id, command)
         
         if success:
-            return jsonify({'success': True, 'output': output or '', 'error': error or ''})
+            session = ssh_manager.get_session(session_id) or {}
+            return jsonify({
+                'success': True,
+                'output': output or '',
+                'error': error or '',
+                'exit_status': session.get('last_exit_status')
+            })
         else:
             return jsonify({'success': False, 'error': error}), 500
             
@@ -737,6 +2168,16 @@ def ssh_terminal_disconnect(asset_id):
         logger.error(f"SSH会话断开错误: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/terminal/sessions', methods=['GET'])
+@login_required
+def api_terminal_sessions():
+    """当前用户的交互式SSH会话与SSH连接池的统计信息"""
+    try:
+        return jsonify({'success': True, 'sessions': ssh_manager.stats(current_user.id), 'pool': ssh_pool.stats()})
+    except Exception as e:
+        logger.error(f"获取会话统计失败: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/assets/<int:asset_id>/terminal/tab', methods=['POST'])
 @login_required
 def ssh_terminal_tab(asset_id):
@@ -760,6 +2201,173 @@ def ssh_terminal_tab(asset_id):
         logger.error(f"Tab补全错误: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ========== WebSocket 终端（SocketIO /terminal 命名空间） ==========
+
+# 终端输出流控：每个会话记录已推送但客户端尚未确认的字节数
+class TerminalStream:
+    def __init__(self, session_id, sid):
+        self.session_id = session_id
+        self.sid = sid
+        self.inflight = 0
+        self.closed = False
+        self.last_ack = time.monotonic()
+        self.cond = threading.Condition()
+    
+    def wait_for_credit(self):
+        """未确认字节超过 TERMINAL_MAX_INFLIGHT 时暂停读取，让SSH窗口反压到远端进程；
+        超过 TERMINAL_ACK_TIMEOUT 仍未收到任何确认时返回 False，由调用方关闭终端"""
+        with self.cond:
+            blocked_at = time.monotonic()
+            while not self.closed and self.inflight >= app.config['TERMINAL_MAX_INFLIGHT']:
+                if time.monotonic() - max(blocked_at, self.last_ack) > app.config['TERMINAL_ACK_TIMEOUT']:
+                    return False
+                self.cond.wait(timeout=1)
+            return True
+    
+    def sent(self, nbytes):
+        with self.cond:
+            self.inflight += nbytes
+    
+    def ack(self, nbytes):
+        with self.cond:
+            self.inflight = max(0, self.inflight - nbytes)
+            self.last_ack = time.monotonic()
+            self.cond.notify_all()
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+terminal_streams = {}  # {session_id: TerminalStream}
+terminal_streams_lock = threading.Lock()
+
+def _terminal_reader(stream):
+    """后台读取SSH通道，数据一到达就以原始字节推送给客户端"""
+    session = ssh_manager.get_session(stream.session_id)
+    channel = session['channel'] if session else None
+    try:
+        while channel is not None and not stream.closed:
+            if not stream.wait_for_credit():
+                logger.warning(f"终端客户端长时间未确认输出，关闭会话: {stream.session_id}")
+                break
+            try:
+                data = channel.recv(32768)
+            except socket.timeout:
+                continue
+            if not data:
+                break
+            stream.sent(len(data))
+            ssh_manager.touch(stream.session_id)
+            socketio.emit('output', {'session_id': stream.session_id, 'data': data},
+                          to=stream.sid, namespace='/terminal')
+    except Exception as e:
+        logger.error(f"终端读取出错: {stream.session_id} - {e}")
+    finally:
+        exit_status = channel.recv_exit_status() if channel is not None and channel.exit_status_ready() else None
+        _close_terminal_stream(stream.session_id)
+        socketio.emit('closed', {'session_id': stream.session_id, 'exit_status': exit_status},
+                      to=stream.sid, namespace='/terminal')
+
+def _close_terminal_stream(session_id):
+    with terminal_streams_lock:
+        stream = terminal_streams.pop(session_id, None)
+    if stream is not None:
+        stream.close()
+    ssh_manager.close_session(session_id)
+
+def _terminal_size(data):
+    """解析客户端提交的终端列数和行数，非法值取默认值，并限制在合理范围内"""
+    def clamp(value, default, low, high):
+        try:
+            return max(low, min(int(value), high))
+        except (TypeError, ValueError):
+            return default
+    return clamp(data.get('cols'), 80, 20, 500), clamp(data.get('rows'), 24, 5, 200)
+
+def _get_terminal_stream(data):
+    """取出属于当前Socket连接的终端流，不属于本连接时返回 None"""
+    session_id = (data or {}).get('session_id')
+    with terminal_streams_lock:
+        stream = terminal_streams.get(session_id)
+    if stream is None or stream.sid != request.sid:
+        return None
+    return stream
+
+@socketio.on('connect', namespace='/terminal')
+def terminal_socket_connect():
+    if not current_user.is_authenticated:
+        return False
+
+@socketio.on('open', namespace='/terminal')
+def terminal_socket_open(data):
+    """打开交互式终端: {asset_id, cols, rows}"""
+    data = data or {}
+    asset = db.session.get(Asset, data.get('asset_id'))
+    if asset is None:
+        return {'success': False, 'error': '资产不存在'}
+    if not asset.username or not asset.password:
+        return {'success': False, 'error': '缺少SSH凭据'}
+    
+    cols, rows = _terminal_size(data)
+    session_id, success, message = ssh_manager.create_session(
+        asset, width=cols, height=rows, drain_banner=False, user_id=current_user.id
+    )
+    if not success:
+        return {'success': False, 'error': message}
+    
+    stream = TerminalStream(session_id, request.sid)
+    with terminal_streams_lock:
+        terminal_streams[session_id] = stream
+    socketio.start_background_task(_terminal_reader, stream)
+    return {'success': True, 'session_id': session_id}
+
+@socketio.on('input', namespace='/terminal')
+def terminal_socket_input(data):
+    """原始按键输入: {session_id, data}"""
+    stream = _get_terminal_stream(data)
+    session = ssh_manager.get_session(stream.session_id) if stream else None
+    if session is None:
+        return {'success': False, 'error': '会话不存在'}
+    ssh_manager.touch(stream.session_id)
+    session['channel'].sendall(data.get('data', ''))
+
+@socketio.on('resize', namespace='/terminal')
+def terminal_socket_resize(data):
+    """终端窗口大小变化: {session_id, cols, rows}"""
+    stream = _get_terminal_stream(data)
+    session = ssh_manager.get_session(stream.session_id) if stream else None
+    if session is None:
+        return {'success': False, 'error': '会话不存在'}
+    cols, rows = _terminal_size(data)
+    session['channel'].resize_pty(width=cols, height=rows)
+
+@socketio.on('ack', namespace='/terminal')
+def terminal_socket_ack(data):
+    """客户端确认已处理的输出字节数: {session_id, bytes}"""
+    stream = _get_terminal_stream(data)
+    if stream is None:
+        return
+    try:
+        nbytes = int(data.get('bytes', 0))
+    except (TypeError, ValueError):
+        return
+    stream.ack(nbytes)
+
+@socketio.on('close', namespace='/terminal')
+def terminal_socket_close(data):
+    stream = _get_terminal_stream(data)
+    if stream is not None:
+        _close_terminal_stream(stream.session_id)
+
+@socketio.on('disconnect', namespace='/terminal')
+def terminal_socket_disconnect():
+    """浏览器断开时关闭该连接打开的所有终端"""
+    with terminal_streams_lock:
+        session_ids = [sid for sid, stream in terminal_streams.items() if stream.sid == request.sid]
+    for session_id in session_ids:
+        _close_terminal_stream(session_id)
+
 # SFTP 文件上传下载相关路由
 @app.route('/api/assets/<int:asset_id>/sftp/list', methods=['POST'])
 @login_required
@@ -773,72 +2381,48 @@ def sftp_list(asset_id):
         if not asset.username or not asset.password:
             return jsonify({'success': False, 'error': '缺少SSH凭据'}), 400
         
-        # 创建SSH连接
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        try:
-            ssh.connect(
-                hostname=asset.ip_address,
-                port=asset.port,
-                username=asset.username,
-                password=asset.password,
-                timeout=5  # 缩短超时时间
-            )
-        except Exception as e:
-            logger.error(f"SSH连接失败: {e}")
-            return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
-        
-        sftp = ssh.open_sftp()
-        
-        try:
-            # 如果是 ~ 开头的路径，需要解析为绝对路径
-            if remote_path.startswith('~'):
-                stdin, stdout, stderr = ssh.exec_command('pwd')
-                stdout.channel.recv_exit_status()
-                pwd = stdout.read().decode().strip()
-                # 移除末尾的换行符
-                pwd = pwd.rstrip()
-                if remote_path == '~':
-                    remote_path = pwd
-                else:
-                    remote_path = remote_path.replace('~', pwd)
-            
-            files = []
-            attrs = sftp.listdir_attr(remote_path)
-            for attr in attrs:
-                file_info = {
-                    'name': attr.filename,
-                    'is_dir': attr.st_mode & 0o40000 != 0,
-                    'size': attr.st_size,
-                    'mode': oct(attr.st_mode),
-                    'uid': attr.st_uid,
-                    'gid': attr.st_gid,
-                    'mtime': attr.st_mtime
+        # 使用连接池中的SSH连接
+        with pooled_sftp(asset, timeout=5) as sftp:
+            try:
+                # 如果是 ~ 开头的路径，需要解析为绝对路径
+                if remote_path.startswith('~'):
+                    remote_path = resolve_remote_path(sftp, remote_path)
+                
+                files = []
+                attrs = sftp.listdir_attr(remote_path)
+                for attr in attrs:
+                    file_info = {
+                        'name': attr.filename,
+                        'is_dir': attr.st_mode & 0o40000 != 0,
+                        'size': attr.st_size,
+                        'mode': oct(attr.st_mode),
+                        'uid': attr.st_uid,
+                        'gid': attr.st_gid,
+                        'mtime': attr.st_mtime
+                    }
+                    files.append(file_info)
+                
+                result = {
+                    'success': True,
+                    'files': files,
+                    'current_path': remote_path
+                }
+            except PermissionError:
+                result = {
+                    'success': False,
+                    'error': f'权限不足，无法访问目录: {remote_path}'
+                }
+            except FileNotFoundError:
+                result = {
+                    'success': False,
+                    'error': f'目录不存在: {remote_path}'
                 }
-                files.append(file_info)
-            
-            result = {
-                'success': True,
-                'files': files,
-                'current_path': remote_path
-            }
-        except PermissionError:
-            result = {
-                'success': False,
-                'error': f'权限不足，无法访问目录: {remote_path}'
-            }
-        except FileNotFoundError:
-            result = {
-                'success': False,
-                'error': f'目录不存在: {remote_path}'
-            }
-        finally:
-            sftp.close()
-            ssh.close()
         
         return jsonify(result)
         
+    except SSHConnectError as e:
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
     except Exception as e:
         logger.error(f"SFTP列表错误: {e}")
         return jsonify({'success': False, 'error': f'操作失败: {str(e)}'}), 500
@@ -858,104 +2442,168 @@ def sftp_download(asset_id):
         if not asset.username or not asset.password:
             return jsonify({'success': False, 'error': '缺少SSH凭据'}), 400
         
-        # 创建SFTP连接
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        try:
-            ssh.connect(
-                hostname=asset.ip_address,
-                port=asset.port,
-                username=asset.username,
-                password=asset.password,
-                timeout=5  # 缩短超时时间
-            )
-        except Exception as e:
-            logger.error(f"SSH连接失败: {e}")
-            return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
-        
-        sftp = ssh.open_sftp()
+        # 如果路径是 ~，这不是一个有效的文件路径
+        if remote_path == '~':
+            return jsonify({'success': False, 'error': '无效的文件路径'}), 400
         
-        try:
-            # 处理路径：如果是 ~ 开头的路径，需要解析为绝对路径
-            if remote_path.startswith('~'):
-                stdin, stdout, stderr = ssh.exec_command('pwd')
-                stdout.channel.recv_exit_status()
-                pwd = stdout.read().decode().strip()
-                pwd = pwd.rstrip()
-                if remote_path == '~':
-                    # 如果路径是 ~，这不是一个有效的文件路径
-                    return jsonify({'success': False, 'error': '无效的文件路径'}), 400
-                elif remote_path.startswith('~/'):
-                    # ~/filename -> /home/user/filename (确保没有双斜杠)
-                    filename_part = remote_path[2:]  # 去掉 '~/'
-                    if filename_part:
-                        remote_path = pwd + '/' + filename_part
-                    else:
-                        remote_path = pwd
-                else:
-                    # 其他情况，直接替换 ~
-                    remote_path = remote_path.replace('~', pwd)
-            elif remote_path.startswith('/'):
-                # 绝对路径，直接使用
-                pass
-            else:
-                # 相对路径，需要结合当前目录
-                stdin, stdout, stderr = ssh.exec_command('pwd')
-                stdout.channel.recv_exit_status()
-                pwd = stdout.read().decode().strip()
-                remote_path = pwd + '/' + remote_path
-            
-            logger.info(f"解析后的文件路径: {remote_path}")
-            
-            # 检查文件是否存在且是文件（不是目录）
+        # 使用连接池中的SSH连接
+        with pooled_sftp(asset, timeout=5) as sftp:
             try:
-                file_stat = sftp.stat(remote_path)
-                import stat
-                logger.info(f"文件状态: mode={oct(file_stat.st_mode)}, size={file_stat.st_size}")
-                if stat.S_ISDIR(file_stat.st_mode):
-                    logger.error(f"路径是目录: {remote_path}")
-                    return jsonify({'success': False, 'error': '指定的路径是一个目录，不是文件'}), 400
-            except FileNotFoundError as e:
-                logger.error(f"文件不存在: {remote_path} - {e}")
-                return jsonify({'success': False, 'error': f'文件不存在: {remote_path}'}), 404
-            except PermissionError as e:
-                logger.error(f"权限不足: {remote_path} - {e}")
-                return jsonify({'success': False, 'error': '没有权限访问该文件'}), 403
-            
-            # 读取远程文件内容
-            logger.info(f"开始读取文件内容...")
-            file_obj = sftp.open(remote_path, 'rb')
-            file_content = file_obj.read()
-            file_obj.close()
-            
-            # 将文件内容转换为base64
-            import base64
-            file_b64 = base64.b64encode(file_content).decode('utf-8')
-            
-            import os
-            filename = os.path.basename(remote_path)
-            
-            logger.info(f"文件下载成功: {filename}, 大小: {len(file_content)} 字节")
-            
-            result = {
-                'success': True,
-                'filename': filename,
-                'data': file_b64
-            }
-        except Exception as e:
-            logger.error(f"SFTP下载文件错误: {e}")
-            return jsonify({'success': False, 'error': f'下载失败: {str(e)}'}), 500
-        finally:
-            sftp.close()
-            ssh.close()
+                # 处理路径：~ 开头或相对路径解析为绝对路径
+                remote_path = resolve_remote_path(sftp, remote_path)
+                logger.info(f"解析后的文件路径: {remote_path}")
+                
+                # 检查文件是否存在且是文件（不是目录）
+                try:
+                    file_stat = sftp.stat(remote_path)
+                    import stat
+                    logger.info(f"文件状态: mode={oct(file_stat.st_mode)}, size={file_stat.st_size}")
+                    if stat.S_ISDIR(file_stat.st_mode):
+                        logger.error(f"路径是目录: {remote_path}")
+                        return jsonify({'success': False, 'error': '指定的路径是一个目录，不是文件'}), 400
+                except FileNotFoundError as e:
+                    logger.error(f"文件不存在: {remote_path} - {e}")
+                    return jsonify({'success': False, 'error': f'文件不存在: {remote_path}'}), 404
+                except PermissionError as e:
+                    logger.error(f"权限不足: {remote_path} - {e}")
+                    return jsonify({'success': False, 'error': '没有权限访问该文件'}), 403
+                
+                # 大文件整体读入内存并base64编码代价过高，改用流式下载接口（GET）
+                if file_stat.st_size > app.config['SFTP_INLINE_DOWNLOAD_MAX']:
+                    return jsonify({'success': False, 'error': '文件过大，请使用流式下载'}), 413
+                
+                # 读取远程文件内容
+                logger.info(f"开始读取文件内容...")
+                file_obj = sftp.open(remote_path, 'rb')
+                file_content = file_obj.read()
+                file_obj.close()
+                
+                # 将文件内容转换为base64
+                import base64
+                file_b64 = base64.b64encode(file_content).decode('utf-8')
+                
+                import os
+                filename = os.path.basename(remote_path)
+                
+                logger.info(f"文件下载成功: {filename}, 大小: {len(file_content)} 字节")
+                
+                result = {
+                    'success': True,
+                    'filename': filename,
+                    'data': file_b64
+                }
+            except Exception as e:
+                logger.error(f"SFTP下载文件错误: {e}")
+                return jsonify({'success': False, 'error': f'下载失败: {str(e)}'}), 500
         
         return jsonify(result)
         
+    except SSHConnectError as e:
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
     except Exception as e:
         logger.error(f"SFTP下载错误: {e}")
         return jsonify({'success': False, 'error': f'下载失败: {str(e)}'}), 500
 
+def _iter_remote_file(stack, file_obj, start, length):
+    """按窗口流水线读取远程文件，内存占用上限为一个窗口"""
+    chunk_size = app.config['SFTP_STREAM_CHUNK_SIZE']
+    window = chunk_size * app.config['SFTP_STREAM_WINDOW']
+    with stack:
+        offset = start
+        end = start + length
+        while offset < end:
+            window_end = min(offset + window, end)
+            chunks = [(pos, min(chunk_size, window_end - pos)) for pos in range(offset, window_end, chunk_size)]
+            # readv 会一次性发出整个窗口的读请求，避免逐块等待往返
+            for data in file_obj.readv(chunks):
+                yield data
+            offset = window_end
+
+@app.route('/api/assets/<int:asset_id>/sftp/download', methods=['GET'])
+@login_required
+def sftp_download_stream(asset_id):
+    """流式下载远程文件（原始字节），支持 Range 断点续传"""
+    stack = ExitStack()
+    try:
+        asset = Asset.query.get_or_404(asset_id)
+        remote_path = request.args.get('path')
+        
+        if not remote_path or remote_path == '~':
+            return jsonify({'success': False, 'error': '缺少文件路径'}), 400
+        
+        if not asset.username or not asset.password:
+            return jsonify({'success': False, 'error': '缺少SSH凭据'}), 400
+        
+        sftp = stack.enter_context(pooled_sftp(asset))
+        remote_path = resolve_remote_path(sftp, remote_path)
+        
+        try:
+            file_stat = sftp.stat(remote_path)
+        except FileNotFoundError:
+            stack.close()
+            return jsonify({'success': False, 'error': f'文件不存在: {remote_path}'}), 404
+        except PermissionError:
+            stack.close()
+            return jsonify({'success': False, 'error': '没有权限访问该文件'}), 403
+        
+        import stat
+        if stat.S_ISDIR(file_stat.st_mode):
+            stack.close()
+            return jsonify({'success': False, 'error': '指定的路径是一个目录，不是文件'}), 400
+        
+        size = file_stat.st_size
+        etag = f'{int(file_stat.st_mtime):x}-{size:x}'
+        
+        # 解析 Range；If-Range 与当前文件版本不一致时返回完整文件
+        if_range = request.if_range
+        range_applies = (
+            (if_range.etag is None and if_range.date is None)
+            or if_range.etag == etag
+            or (if_range.date is not None and if_range.date.timestamp() >= int(file_stat.st_mtime))
+        )
+        # 多段 Range（bytes=0-1,5-6）不支持 multipart/byteranges，按规范忽略并返回完整文件
+        byte_range = None
+        if request.range is not None and range_applies and len(request.range.ranges) == 1:
+            byte_range = request.range.range_for_length(size)
+            if byte_range is None:
+                stack.close()
+                response = Response(status=416)
+                response.headers['Content-Range'] = f'bytes */{size}'
+                return response
+        
+        start, stop = byte_range if byte_range else (0, size)
+        file_obj = stack.enter_context(sftp.open(remote_path, 'rb'))
+        
+        filename = os.path.basename(remote_path)
+        response = Response(
+            _iter_remote_file(stack, file_obj, start, stop - start),
+            status=206 if byte_range else 200,
+            mimetype='application/octet-stream',
+            direct_passthrough=True
+        )
+        response.content_length = stop - start
+        response.accept_ranges = 'bytes'
+        response.set_etag(etag)
+        response.last_modified = datetime.fromtimestamp(file_stat.st_mtime, timezone.utc)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        if byte_range:
+            response.content_range = ContentRange('bytes', start, stop, size)
+        # 客户端中途断开时也要归还SFTP通道
+        response.call_on_close(stack.close)
+        
+        logger.info(f"开始流式下载: {remote_path}, 范围: {start}-{stop - 1}/{size}")
+        return response
+        
+    except SSHConnectError as e:
+        stack.close()
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
+    except Exception as e:
+        stack.close()
+        logger.error(f"SFTP流式下载错误: {e}")
+        return jsonify({'success': False, 'error': f'下载失败: {str(e)}'}), 500
+
 @app.route('/api/assets/<int:asset_id>/sftp/upload', methods=['POST'])
 @login_required
 def sftp_upload(asset_id):
@@ -973,39 +2621,15 @@ def sftp_upload(asset_id):
         if not asset.username or not asset.password:
             return jsonify({'success': False, 'error': '缺少SSH凭据'}), 400
         
-        # 创建SFTP连接
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        try:
-            ssh.connect(
-                hostname=asset.ip_address,
-                port=asset.port,
-                username=asset.username,
-                password=asset.password,
-                timeout=5  # 缩短超时时间
-            )
-        except Exception as e:
-            logger.error(f"SSH连接失败: {e}")
-            return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
-        
-        sftp = ssh.open_sftp()
-        
-        try:
+        # 使用连接池中的SSH连接
+        with pooled_sftp(asset, timeout=5) as sftp:
             import base64
             # 解码base64文件内容
             file_content = base64.b64decode(file_data)
             
             # 处理路径：如果是 ~ 开头的路径，需要解析为绝对路径
             if remote_path.startswith('~'):
-                stdin, stdout, stderr = ssh.exec_command('pwd')
-                stdout.channel.recv_exit_status()
-                pwd = stdout.read().decode().strip()
-                pwd = pwd.rstrip()
-                if remote_path == '~':
-                    remote_path = pwd
-                else:
-                    remote_path = remote_path.replace('~', pwd)
+                remote_path = resolve_remote_path(sftp, remote_path)
             
             # 如果是目录，添加文件名
             if remote_path.endswith('/'):
@@ -1025,31 +2649,317 @@ def sftp_upload(asset_id):
                 'message': f'文件 {filename} 上传成功',
                 'path': full_path
             }
-        finally:
-            sftp.close()
-            ssh.close()
         
         return jsonify(result)
         
+    except SSHConnectError as e:
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
     except Exception as e:
         logger.error(f"SFTP上传错误: {e}")
         return jsonify({'success': False, 'error': f'上传失败: {str(e)}'}), 500
 
-@app.route('/api/assets/<int:asset_id>', methods=['PUT', 'DELETE'])
-@login_required
-def api_asset_detail(asset_id):
-    try:
-        asset = Asset.query.get_or_404(asset_id)
-        logger.info(f"处理资产操作: {asset.name} (ID: {asset_id})")
-        
-        if request.method == 'PUT':
-            data = request.get_json()
-            action = data.get('action')
-        
-            if action == 'restart':
-                # 检查是否有SSH凭据
-                if not asset.username or not asset.password:
-                    return jsonify({'success': False, 'message': '缺少SSH凭据，无法执行重启操作'})
+# SFTP分块上传管理器
+class SFTPUploadManager:
+    def __init__(self):
+        self.uploads = {}  # {upload_id: {'asset_id': ..., 'path': 目标路径, 'temp_path': 临时文件, 'received': set(), ...}}
+        self.lock = threading.Lock()
+    
+    def create(self, asset_id, full_path, size, chunk_size, user_id):
+        upload_id = uuid.uuid4().hex
+        upload = {
+            'id': upload_id,
+            'asset_id': asset_id,
+            'path': full_path,
+            'temp_path': f'{full_path}.part-{upload_id[:12]}',
+            'size': size,
+            'chunk_size': chunk_size,
+            'total_chunks': max(1, -(-size // chunk_size)),
+            'received': set(),
+            'user_id': user_id,
+            'last_activity': time.monotonic()
+        }
+        with self.lock:
+            self.uploads[upload_id] = upload
+        return upload
+    
+    def get(self, upload_id, asset_id, user_id):
+        """取出上传任务，只有发起上传的用户可以继续操作"""
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is None or upload['asset_id'] != asset_id or upload['user_id'] != user_id:
+                return None
+            upload['last_activity'] = time.monotonic()
+            return upload
+    
+    def chunk_length(self, upload, index):
+        """第 index 块应有的字节数（最后一块可能不足 chunk_size）"""
+        return min(upload['chunk_size'], upload['size'] - index * upload['chunk_size'])
+    
+    def mark_received(self, upload, index):
+        with self.lock:
+            upload['received'].add(index)
+    
+    def remove(self, upload_id):
+        with self.lock:
+            return self.uploads.pop(upload_id, None)
+    
+    def status(self, upload):
+        """已写入的块及对应的字节区间，用于断点续传"""
+        with self.lock:
+            received = sorted(upload['received'])
+        written_ranges = []
+        for index in received:
+            start = index * upload['chunk_size']
+            end = start + self.chunk_length(upload, index)
+            if written_ranges and written_ranges[-1][1] == start:
+                written_ranges[-1][1] = end
+            else:
+                written_ranges.append([start, end])
+        return {
+            'upload_id': upload['id'],
+            'path': upload['path'],
+            'size': upload['size'],
+            'chunk_size': upload['chunk_size'],
+            'total_chunks': upload['total_chunks'],
+            'received_chunks': received,
+            'missing_chunks': [i for i in range(upload['total_chunks']) if i not in upload['received']],
+            'written_ranges': written_ranges
+        }
+    
+    def expire_stale(self):
+        """移除超过 SFTP_UPLOAD_TTL 未活动的上传任务，返回被移除的任务"""
+        deadline = time.monotonic() - app.config['SFTP_UPLOAD_TTL']
+        with self.lock:
+            stale = [upload_id for upload_id, upload in self.uploads.items() if upload['last_activity'] < deadline]
+            return [self.uploads.pop(upload_id) for upload_id in stale]
+
+# 全局上传管理器
+sftp_upload_manager = SFTPUploadManager()
+
+def remote_sha256(ssh, sftp, remote_path):
+    """计算远程文件的SHA-256：优先在远端执行 sha256sum，不可用时通过SFTP流式回读计算"""
+    stdin, stdout, stderr = ssh.exec_command(f'sha256sum -- {shlex.quote(remote_path)}')
+    output = stdout.read().decode('utf-8', errors='ignore')
+    digest = output.split()[0] if stdout.channel.recv_exit_status() == 0 and output.strip() else ''
+    if len(digest) == 64:
+        return digest
+    
+    hasher = hashlib.sha256()
+    size = sftp.stat(remote_path).st_size
+    with sftp.open(remote_path, 'rb') as file_obj:
+        for data in _iter_remote_file(ExitStack(), file_obj, 0, size):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+def replace_remote_file(sftp, source, target, backup_suffix):
+    """不支持 posix-rename 时用普通重命名替换目标文件：
+    已有目标先移到旁边，重命名失败时还原，成功后再删除旧文件"""
+    backup = f'{target}.old-{backup_suffix}'
+    try:
+        sftp.rename(target, backup)
+    except IOError:
+        # 目标不存在（或无法移动，此时下面的重命名也会失败，目标保持不变）
+        backup = None
+    try:
+        sftp.rename(source, target)
+    except IOError:
+        if backup is not None:
+            sftp.rename(backup, target)
+        raise
+    if backup is not None:
+        try:
+            sftp.remove(backup)
+        except IOError:
+            logger.warning(f"删除被替换的旧文件失败: {backup}")
+
+@app.route('/api/assets/<int:asset_id>/sftp/uploads', methods=['POST'])
+@login_required
+def sftp_upload_init(asset_id):
+    """发起分块上传：在远端创建临时文件并返回 upload_id"""
+    try:
+        asset = Asset.query.get_or_404(asset_id)
+        data = request.get_json() or {}
+        remote_path = data.get('path')
+        filename = data.get('filename')
+        size = data.get('size')
+        
+        if not remote_path or not filename or not isinstance(size, int) or size < 0:
+            return jsonify({'success': False, 'error': '缺少必要参数'}), 400
+        
+        if '/' in filename:
+            return jsonify({'success': False, 'error': '无效的文件名'}), 400
+        
+        if not asset.username or not asset.password:
+            return jsonify({'success': False, 'error': '缺少SSH凭据'}), 400
+        
+        max_chunk_size = app.config['SFTP_UPLOAD_MAX_CHUNK_SIZE']
+        chunk_size = min(int(data.get('chunk_size') or max_chunk_size), max_chunk_size)
+        if chunk_size <= 0:
+            return jsonify({'success': False, 'error': '无效的分块大小'}), 400
+        
+        with pooled_sftp(asset) as sftp:
+            remote_path = resolve_remote_path(sftp, remote_path)
+            full_path = remote_path.rstrip('/') + '/' + filename
+            upload = sftp_upload_manager.create(asset.id, full_path, size, chunk_size, current_user.id)
+            # 预先创建临时文件，各分块按偏移写入
+            sftp.open(upload['temp_path'], 'wb').close()
+        
+        logger.info(f"分块上传开始: {full_path}, 大小: {size}, 分块: {chunk_size}")
+        return jsonify({'success': True, **sftp_upload_manager.status(upload)})
+        
+    except SSHConnectError as e:
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
+    except Exception as e:
+        logger.error(f"分块上传初始化错误: {e}")
+        return jsonify({'success': False, 'error': f'上传失败: {str(e)}'}), 500
+
+@app.route('/api/assets/<int:asset_id>/sftp/uploads/<upload_id>', methods=['GET'])
+@login_required
+def sftp_upload_status(asset_id, upload_id):
+    """查询已写入的分块，用于断点续传"""
+    upload = sftp_upload_manager.get(upload_id, asset_id, current_user.id)
+    if upload is None:
+        return jsonify({'success': False, 'error': '上传任务不存在'}), 404
+    return jsonify({'success': True, **sftp_upload_manager.status(upload)})
+
+@app.route('/api/assets/<int:asset_id>/sftp/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def sftp_upload_chunk(asset_id, upload_id, index):
+    """写入一个分块：请求体为原始字节，按偏移写入远端临时文件"""
+    try:
+        upload = sftp_upload_manager.get(upload_id, asset_id, current_user.id)
+        if upload is None:
+            return jsonify({'success': False, 'error': '上传任务不存在'}), 404
+        
+        if index < 0 or index >= upload['total_chunks']:
+            return jsonify({'success': False, 'error': '分块序号超出范围'}), 400
+        
+        expected_length = sftp_upload_manager.chunk_length(upload, index)
+        if request.content_length != expected_length:
+            return jsonify({'success': False, 'error': f'分块大小应为 {expected_length} 字节'}), 400
+        
+        asset = Asset.query.get_or_404(asset_id)
+        hasher = hashlib.sha256()
+        written = 0
+        with pooled_sftp(asset) as sftp:
+            with sftp.open(upload['temp_path'], 'r+b') as file_obj:
+                # 流水线写入：不逐个等待服务器确认，关闭文件时统一校验
+                file_obj.set_pipelined(True)
+                file_obj.seek(index * upload['chunk_size'])
+                while True:
+                    piece = request.stream.read(app.config['SFTP_STREAM_CHUNK_SIZE'])
+                    if not piece:
+                        break
+                    file_obj.write(piece)
+                    hasher.update(piece)
+                    written += len(piece)
+        
+        if written != expected_length:
+            return jsonify({'success': False, 'error': '分块数据不完整'}), 400
+        
+        expected_sha256 = request.headers.get('X-Chunk-SHA256')
+        if expected_sha256 and expected_sha256.lower() != hasher.hexdigest():
+            return jsonify({'success': False, 'error': '分块校验失败'}), 422
+        
+        sftp_upload_manager.mark_received(upload, index)
+        return jsonify({'success': True, 'index': index, 'sha256': hasher.hexdigest()})
+        
+    except SSHConnectError as e:
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
+    except Exception as e:
+        logger.error(f"分块上传错误: {e}")
+        return jsonify({'success': False, 'error': f'上传失败: {str(e)}'}), 500
+
+@app.route('/api/assets/<int:asset_id>/sftp/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def sftp_upload_complete(asset_id, upload_id):
+    """完成分块上传：校验完整性与SHA-256后把临时文件重命名为目标文件"""
+    try:
+        upload = sftp_upload_manager.get(upload_id, asset_id, current_user.id)
+        if upload is None:
+            return jsonify({'success': False, 'error': '上传任务不存在'}), 404
+        
+        status = sftp_upload_manager.status(upload)
+        if status['missing_chunks']:
+            return jsonify({'success': False, 'error': '仍有分块未上传', **status}), 409
+        
+        data = request.get_json(silent=True) or {}
+        asset = Asset.query.get_or_404(asset_id)
+        with ssh_pool.client(asset.ip_address, asset.port, asset.username, asset.password) as ssh, \
+                closing(ssh.open_sftp()) as sftp:
+            if sftp.stat(upload['temp_path']).st_size != upload['size']:
+                return jsonify({'success': False, 'error': '文件大小与声明不一致'}), 409
+            
+            digest = remote_sha256(ssh, sftp, upload['temp_path'])
+            expected_sha256 = data.get('sha256')
+            if expected_sha256 and expected_sha256.lower() != digest:
+                return jsonify({'success': False, 'error': '文件校验失败', 'sha256': digest}), 422
+            
+            try:
+                sftp.posix_rename(upload['temp_path'], upload['path'])
+            except IOError:
+                # 服务器不支持 posix-rename 扩展时退回普通重命名，失败时保留原目标文件
+                replace_remote_file(sftp, upload['temp_path'], upload['path'], upload_id[:12])
+        
+        sftp_upload_manager.remove(upload_id)
+        filename = os.path.basename(upload['path'])
+        logger.info(f"分块上传完成: {upload['path']}, 大小: {upload['size']}, sha256: {digest}")
+        return jsonify({
+            'success': True,
+            'message': f'文件 {filename} 上传成功',
+            'path': upload['path'],
+            'sha256': digest
+        })
+        
+    except SSHConnectError as e:
+        logger.error(f"SSH连接失败: {e}")
+        return jsonify({'success': False, 'error': f'SSH连接失败: {str(e)}'}), 500
+    except Exception as e:
+        logger.error(f"分块上传完成错误: {e}")
+        return jsonify({'success': False, 'error': f'上传失败: {str(e)}'}), 500
+
+@app.route('/api/assets/<int:asset_id>/sftp/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def sftp_upload_abort(asset_id, upload_id):
+    """取消分块上传并删除远端临时文件"""
+    try:
+        upload = sftp_upload_manager.get(upload_id, asset_id, current_user.id)
+        if upload is None:
+            return jsonify({'success': False, 'error': '上传任务不存在'}), 404
+        
+        sftp_upload_manager.remove(upload_id)
+        asset = Asset.query.get_or_404(asset_id)
+        with pooled_sftp(asset) as sftp:
+            try:
+                sftp.remove(upload['temp_path'])
+            except IOError:
+                pass
+        
+        return jsonify({'success': True, 'message': '上传已取消'})
+        
+    except Exception as e:
+        logger.error(f"取消分块上传错误: {e}")
+        return jsonify({'success': False, 'error': f'操作失败: {str(e)}'}), 500
+
+@app.route('/api/assets/<int:asset_id>', methods=['PUT', 'DELETE'])
+@login_required
+def api_asset_detail(asset_id):
+    try:
+        asset = Asset.query.get_or_404(asset_id)
+        category = asset.category
+        logger.info(f"处理资产操作: {asset.name} (ID: {asset_id})")
+        
+        if request.method == 'PUT':
+            data = request.get_json()
+            action = data.get('action')
+        
+            if action == 'restart':
+                # 检查是否有SSH凭据
+                if not asset.username or not asset.password:
+                    return jsonify({'success': False, 'message': '缺少SSH凭据，无法执行重启操作'})
                 
                 # 通过SSH执行重启命令
                 success, output, error = execute_ssh_command(
@@ -1061,12 +2971,16 @@ def api_asset_detail(asset_id):
                 )
                 
                 if success:
+                    old_status = asset.status
                     asset.status = 'maintenance'
                     asset.cpu_usage = 0
                     asset.memory_usage = 0
                     asset.disk_usage = 0
                     asset.last_update = datetime.now(timezone.utc)
                     db.session.commit()
+                    asset_list_cache.bump(category)
+                    asset_events.publish(category, asset_id, old_status, 'maintenance')
+                    probe_scheduler.request_probe(asset.id)
                     return jsonify({'success': True, 'message': f'{asset.name} 重启指令已发送，正在重启...'})
                 else:
                     return jsonify({'success': False, 'message': f'重启失败：{error}'})
@@ -1086,12 +3000,15 @@ def api_asset_detail(asset_id):
                 )
                 
                 if success:
+                    old_status = asset.status
                     asset.status = 'offline'
                     asset.cpu_usage = 0
                     asset.memory_usage = 0
                     asset.disk_usage = 0
                     asset.last_update = datetime.now(timezone.utc)
                     db.session.commit()
+                    asset_list_cache.bump(category)
+                    asset_events.publish(category, asset_id, old_status, 'offline')
                     return jsonify({'success': True, 'message': f'{asset.name} 关机指令已发送，正在关机...'})
                 else:
                     return jsonify({'success': False, 'message': f'关机失败：{error}'})
@@ -1110,25 +3027,51 @@ def api_asset_detail(asset_id):
                 asset.ip_address = new_ip
                 asset.port = data.get('port', asset.port)
                 asset.username = data.get('username', asset.username)
-                asset.password = data.get('password', asset.password)
+                # 列表接口不再返回密码，编辑时留空表示不修改
+                if data.get('password'):
+                    asset.password = data['password']
                 asset.description = data.get('description', asset.description)
                 asset.last_update = datetime.now(timezone.utc)
                 db.session.commit()
+                asset_list_cache.bump(category)
+                # 地址或凭据可能已变更，下一次探测做完整认证
+                probe_scheduler.request_probe(asset.id, full_check=True)
                 return jsonify({'success': True, 'message': '资产更新成功！'})
         
         elif request.method == 'DELETE':
             logger.info(f"删除资产: {asset.name}")
+            metrics_store.delete_asset(asset.id)
             db.session.delete(asset)
             db.session.commit()
+            asset_list_cache.bump(category)
             return jsonify({'success': True, 'message': '资产删除成功！'})
     
     except Exception as e:
         logger.error(f"资产操作错误: {e}")
         return jsonify({'success': False, 'message': f'操作失败: {str(e)}'}), 500
 
+def upgrade_schema():
+    """为已有数据库补充模型中新增的列（db.create_all 不会修改已存在的表）"""
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(
+                f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+            ))
+            logger.info(f"数据库升级: {table.name} 新增列 {column.name}")
+    db.session.commit()
+
 # 初始化数据库
 def create_tables():
     db.create_all()
+    upgrade_schema()
     
     # 创建默认管理员用户
     if not User.query.filter_by(username='admin').first():
@@ -1170,6 +3113,409 @@ def create_tables():
 
 # ========== 数据库管理功能 ==========
 
+class PoolTimeoutError(Exception):
+    """等待连接池空闲连接超时"""
+
+# MySQL连接池：接口与 psycopg2 的连接池保持一致（getconn/putconn/closeall）
+class MySQLConnectionPool:
+    def __init__(self, minconn, maxconn, recycle, wait_timeout, validate_idle, **connect_kwargs):
+        self.maxconn = maxconn
+        self.recycle = recycle
+        self.wait_timeout = wait_timeout
+        self.validate_idle = validate_idle
+        self.connect_kwargs = connect_kwargs
+        self.idle = []  # [(conn, last_used)]，后进先出，让常用连接保持热度
+        self.created = {}  # {id(conn): created_at}
+        self.size = 0  # 已打开的连接数（空闲 + 借出）
+        self.closed = False
+        self.cond = threading.Condition()
+        for _ in range(minconn):
+            self.size += 1
+            self.idle.append((self._connect(), time.monotonic()))
+    
+    def _connect(self):
+        conn = pymysql.connect(**self.connect_kwargs)
+        self.created[id(conn)] = time.monotonic()
+        return conn
+    
+    def _discard(self, conn):
+        self.created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def _release_slot(self):
+        with self.cond:
+            self.size -= 1
+            self.cond.notify()
+    
+    def getconn(self):
+        """借出连接：池满时最多等待 wait_timeout 秒；超过回收年龄或空闲较久的连接先校验"""
+        deadline = time.monotonic() + self.wait_timeout
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise PoolTimeoutError("连接池已关闭")
+                if self.idle:
+                    conn, last_used = self.idle.pop()
+                    break
+                if self.size < self.maxconn:
+                    self.size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"等待数据库连接超时（{self.wait_timeout}秒）")
+                self.cond.wait(remaining)
+        
+        try:
+            now = time.monotonic()
+            if conn is not None and now - self.created.get(id(conn), now) > self.recycle:
+                self._discard(conn)
+                conn = None
+            if conn is not None and now - last_used > self.validate_idle:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            self._release_slot()
+            raise
+    
+    def putconn(self, conn, close=False):
+        """归还连接；close=True（如会话状态已被修改或连接出错）时直接关闭"""
+        expired = time.monotonic() - self.created.get(id(conn), 0) > self.recycle
+        if not (close or self.closed or expired or not conn.open) and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            # 留有未结束的事务（如 BEGIN 之后没有 COMMIT），回滚后再放回池中，回滚失败则关闭
+            try:
+                conn.rollback()
+            except Exception:
+                close = True
+        if close or self.closed or expired or not conn.open:
+            self._discard(conn)
+            self._release_slot()
+            return
+        with self.cond:
+            self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+    
+    def closeall(self):
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+    
+    def stats(self):
+        with self.cond:
+            return {'size': self.size, 'idle': len(self.idle), 'in_use': self.size - len(self.idle)}
+
+# PostgreSQL连接池：psycopg2 的线程安全连接池在池满时直接抛出 PoolError，
+# 这里用信号量限制同时借出的连接数，池满时最多等待 wait_timeout 秒，超时抛出 PoolTimeoutError（与 MySQLConnectionPool 一致）
+class PostgreSQLConnectionPool(ThreadedConnectionPool):
+    def __init__(self, minconn, maxconn, wait_timeout, **connect_kwargs):
+        super().__init__(minconn, maxconn, **connect_kwargs)
+        self.wait_timeout = wait_timeout
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.borrowed = set()  # 借出连接的 id，重复或无效的归还不释放名额
+        self.borrowed_lock = threading.Lock()
+    
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.wait_timeout):
+            raise PoolTimeoutError(f"等待数据库连接超时（{self.wait_timeout}秒）")
+        try:
+            conn = super().getconn(key)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.borrowed_lock:
+            self.borrowed.add(id(conn))
+        return conn
+    
+    def putconn(self, conn=None, key=None, close=False):
+        with self.borrowed_lock:
+            owned = id(conn) in self.borrowed
+            self.borrowed.discard(id(conn))
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            if owned:
+                self.slots.release()
+
+# SQL脚本拆分：跳过字符串、引用标识符、注释以及 PostgreSQL 的美元引用，支持 MySQL 客户端的 DELIMITER 命令
+SQL_LEADING_COMMENTS_RE = re.compile(r'(?:\s+|--[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*.*?\*/)*', re.DOTALL)
+SQL_DOLLAR_QUOTE_RE = re.compile(r'\$([A-Za-z_][A-Za-z0-9_]*)?\$')
+SQL_DML_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+# 可以 EXPLAIN 的语句（不带 ANALYZE 时不实际执行）；数据库不支持的组合由 EXPLAIN 自行报错
+SQL_EXPLAIN_KEYWORDS = ('SELECT', 'WITH', 'VALUES', 'TABLE') + SQL_DML_KEYWORDS
+
+def sql_keyword(statement):
+    """返回语句的首个关键字（大写），跳过开头的空白和注释"""
+    start = SQL_LEADING_COMMENTS_RE.match(statement).end()
+    match = re.match(r'[A-Za-z]+', statement[start:])
+    return match.group(0).upper() if match else ''
+
+# 会在 MySQL 连接上留下会话状态的语句：当前库、会话变量、事务、表锁、临时表、预处理语句、用户变量
+MYSQL_SESSION_STATE_RE = re.compile(
+    r'(?:USE|SET|BEGIN|START\s+TRANSACTION|XA|LOCK|CREATE\s+TEMPORARY|PREPARE|HANDLER)\b', re.IGNORECASE
+)
+MYSQL_USER_VARIABLE_RE = re.compile(r'@[A-Za-z0-9_$.]+\s*:=|\bINTO\s+@', re.IGNORECASE)
+
+def mysql_changes_session(statement):
+    """语句执行后连接是否带有会话状态；这类连接归还时关闭，避免状态泄漏给下一个使用者"""
+    start = SQL_LEADING_COMMENTS_RE.match(statement).end()
+    if MYSQL_SESSION_STATE_RE.match(statement, start):
+        return True
+    # 字符串中的 := 不算
+    return bool(MYSQL_USER_VARIABLE_RE.search(SQL_LITERAL_OR_SPACE_RE.sub(lambda m: "''" if m.group(1) else ' ', statement)))
+
+def split_sql(sql, db_type='mysql'):
+    """把SQL脚本拆分为语句列表，只在字符串、注释之外的分隔符处拆分，并丢弃只有注释的片段"""
+    mysql = db_type == 'mysql'
+    statements = []
+    delimiter = ';'
+    start = 0
+    has_code = False
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if mysql and (i == 0 or sql[i - 1] == '\n') and sql[i:i + 10].upper() == 'DELIMITER ':
+            if has_code:
+                statements.append(sql[start:i])
+            end = sql.find('\n', i)
+            end = n if end == -1 else end
+            delimiter = sql[i + 10:end].strip() or ';'
+            i = start = end
+            has_code = False
+            continue
+        if c in ("'", '"', '`'):
+            # MySQL 字符串支持反斜杠转义；PostgreSQL 只有 E'...' 支持
+            backslash = mysql or (c == "'" and i > 0 and sql[i - 1] in 'eE')
+            j = i + 1
+            while j < n:
+                if backslash and sql[j] == '\\':
+                    j += 2
+                    continue
+                if sql[j] == c:
+                    if sql[j + 1:j + 2] == c:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            i = j + 1
+            has_code = True
+            continue
+        if sql.startswith('--', i) or (mysql and c == '#'):
+            end = sql.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if c == '$' and not mysql:
+            match = SQL_DOLLAR_QUOTE_RE.match(sql, i)
+            if match:
+                end = sql.find(match.group(0), match.end())
+                i = n if end == -1 else end + len(match.group(0))
+                has_code = True
+                continue
+        if sql.startswith(delimiter, i):
+            if has_code:
+                statements.append(sql[start:i])
+            i = start = i + len(delimiter)
+            has_code = False
+            continue
+        if not c.isspace():
+            has_code = True
+        i += 1
+    if has_code:
+        statements.append(sql[start:])
+    return [statement.strip() for statement in statements]
+
+# SQL结果格式：rows 为逐行字典（默认）；compact 列信息只给一次、行为数组；columnar 按列给出数组
+SQL_RESULT_FORMATS = ('rows', 'compact', 'columnar')
+
+# 列类型标签：MySQL 字段类型码 / PostgreSQL 类型 OID -> 标签，未列出的按 str 处理
+MYSQL_TYPE_TAGS = {
+    1: 'int', 2: 'int', 3: 'int', 8: 'int', 9: 'int', 13: 'int',
+    4: 'float', 5: 'float', 0: 'decimal', 246: 'decimal',
+    7: 'datetime', 12: 'datetime', 10: 'date', 14: 'date', 11: 'time',
+    16: 'bytes', 245: 'json', 255: 'bytes'
+}
+MYSQL_BLOB_TYPES = (249, 250, 251, 252, 253, 254)  # 二进制字符集时为 bytes，否则为 str
+MYSQL_BINARY_CHARSET = 63
+PG_TYPE_TAGS = {
+    16: 'bool', 17: 'bytes', 20: 'int', 21: 'int', 23: 'int', 26: 'int',
+    700: 'float', 701: 'float', 1700: 'decimal',
+    1082: 'date', 1083: 'time', 1114: 'datetime', 1184: 'datetime', 1186: 'interval',
+    114: 'json', 3802: 'json'
+}
+
+def sql_column_types(db_type, cursor):
+    """根据游标的结果描述给出每列的类型标签"""
+    if db_type == 'postgresql':
+        return [PG_TYPE_TAGS.get(desc[1], 'str') for desc in cursor.description]
+    result = getattr(cursor, '_result', None)
+    fields = getattr(result, 'fields', None) or [None] * len(cursor.description)
+    tags = []
+    for desc, field in zip(cursor.description, fields):
+        if desc[1] in MYSQL_BLOB_TYPES:
+            binary = field is not None and field.charsetnr == MYSQL_BINARY_CHARSET
+            tags.append('bytes' if binary else 'str')
+        else:
+            tags.append(MYSQL_TYPE_TAGS.get(desc[1], 'str'))
+    return tags
+
+def sql_wire_default(value):
+    """紧凑格式中非原生类型的编码：二进制为 base64，时间为 ISO 8601，Decimal 保留精度转为字符串"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)) or hasattr(value, 'total_seconds'):
+        return str(value)
+    raise TypeError(f"无法编码的类型: {type(value).__name__}")
+
+# 只读查询判定：所有语句均为查询类，且不含加锁、写入或有副作用的函数
+SQL_READ_ONLY_KEYWORDS = ('SELECT', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN')
+SQL_SIDE_EFFECT_RE = re.compile(
+    r'\b(FOR\s+UPDATE|FOR\s+SHARE|LOCK\s+IN\s+SHARE\s+MODE|INTO|NEXTVAL|SETVAL|GET_LOCK|RELEASE_LOCK|SLEEP|PG_SLEEP|ANALYZE)\b',
+    re.IGNORECASE
+)
+SQL_LITERAL_OR_SPACE_RE = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)|\s+""")
+
+# 可导出的查询语句；其中 PostgreSQL 只有前四种能放进 COPY (...) 或 DECLARE CURSOR
+SQL_EXPORT_KEYWORDS = ('SELECT', 'WITH', 'VALUES', 'TABLE', 'SHOW')
+SQL_PG_QUERY_KEYWORDS = ('SELECT', 'WITH', 'VALUES', 'TABLE')
+
+def normalize_sql(sql):
+    """规范化SQL文本作为缓存键：折叠字符串之外的空白，去掉末尾分号"""
+    return SQL_LITERAL_OR_SPACE_RE.sub(lambda m: m.group(1) or ' ', sql).strip().rstrip(';').strip()
+
+def is_read_only_sql(statements):
+    if not statements:
+        return False
+    for statement in statements:
+        if sql_keyword(statement) not in SQL_READ_ONLY_KEYWORDS:
+            return False
+        # 字符串中的关键字不影响判定
+        if SQL_SIDE_EFFECT_RE.search(SQL_LITERAL_OR_SPACE_RE.sub(lambda m: "''" if m.group(1) else ' ', statement)):
+            return False
+    return True
+
+SQL_FINGERPRINT_RE = re.compile(
+    r"""('(?:[^'\\]|\\.|'')*')|("(?:[^"\\]|\\.|"")*")|(`[^`]*`)|(--[^\n]*|#[^\n]*|/\*.*?\*/)"""
+    r"""|\b(?:0x[0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\b""",
+    re.DOTALL
+)
+SQL_FINGERPRINT_SPACE_RE = re.compile(r'\s*([,=<>!])\s*|(\()\s+|\s+(\))|\s+')
+SQL_FINGERPRINT_LIST_RE = re.compile(r'\(\?(?:,\?)*\)')
+SQL_FINGERPRINT_ROWS_RE = re.compile(r'\(\?\+\)(?:,\(\?\+\))+')
+
+def sql_fingerprint(sql, db_type=None):
+    """SQL 指纹：字面量替换为 ?，去掉注释、折叠空白、IN/VALUES 列表并转小写，
+    只是参数不同的语句归为同一指纹。返回 (指纹哈希, 规范化文本)
+
+    MySQL 中双引号括起的是字符串，其他数据库中是标识符
+    """
+    def replace(match):
+        if match.group(3) or (match.group(2) and db_type != 'mysql'):
+            return match.group(3) or match.group(2)
+        if match.group(4):
+            return ' '
+        return '?'
+    text = SQL_FINGERPRINT_RE.sub(replace, sql).strip().rstrip(';').lower()
+    text = SQL_FINGERPRINT_SPACE_RE.sub(lambda m: m.group(1) or m.group(2) or m.group(3) or ' ', text).strip()
+    text = SQL_FINGERPRINT_ROWS_RE.sub('(?+),...', SQL_FINGERPRINT_LIST_RE.sub('(?+)', text))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16], text
+
+def redact_sql_literals(sql, db_type=None):
+    """把字符串字面量替换为 '?'，避免密码等敏感值写入日志；语句结构不变，仍可用于 EXPLAIN"""
+    def replace(match):
+        if match.group(1) or (match.group(2) and db_type == 'mysql'):
+            return "'?'"
+        return match.group(0)
+    return SQL_FINGERPRINT_RE.sub(replace, sql)
+
+def sql_payload_bytes(rows):
+    """估算结果行的数据量：字符串和二进制按长度计，其余非空值按 8 字节计"""
+    total = 0
+    for row in rows:
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, (str, bytes, bytearray, memoryview)):
+                total += len(value)
+            else:
+                total += 8
+    return total
+
+def percentile(sorted_values, fraction):
+    """已排序序列的分位数（最近秩法）"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+# 只读查询结果缓存：按连接和规范化SQL缓存完整结果，条目有各自的TTL，总大小超出预算时淘汰最久未用的条目
+class QueryResultCache:
+    def __init__(self):
+        self.entries = OrderedDict()  # {(connection_id, sql, page_size, format): (expires_at, size, stored_at, result)}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            expires_at, size, stored_at, result = entry
+        hit = dict(result)
+        hit.update(cache_hit=True, cache_age=round(time.monotonic() - stored_at, 3))
+        return hit
+    
+    def put(self, key, result, ttl):
+        size = len(json.dumps(result, separators=(',', ':'), default=sql_wire_default))
+        budget = app.config['DB_RESULT_CACHE_BYTES']
+        if size > budget // 4:
+            # 单个过大的结果不缓存，避免挤掉大量常用条目
+            return False
+        now = time.monotonic()
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (now + ttl, size, now, result)
+            self.size += size
+            while self.size > budget:
+                self._remove(next(iter(self.entries)))
+        return True
+    
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[1]
+    
+    def invalidate(self, connection_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == connection_id]:
+                self._remove(key)
+    
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
 # 数据库连接管理器
 class DatabaseConnectionManager:
     def __init__(self):
@@ -1177,6 +3523,9 @@ class DatabaseConnectionManager:
         self.connections = {}  # {connection_id: {'type': 'mysql'|'postgresql', 'host': ..., 'user': ...}}
         self.saved_connections = {}  # 保存的连接信息（不含密码）
         self.connection_names = {}  # {connection_id: name}
+        self.cursors = {}  # {token: 未读完的服务端游标及其占用的连接}
+        self.active = {}  # {exec_id: 正在执行的语句所在连接}，用于取消和超时终止
+        self.result_cache = QueryResultCache()
         self.lock = threading.Lock()
         self.connections_file = 'database_connections.json'
         self._load_connections()
@@ -1216,7 +3565,7 @@ class DatabaseConnectionManager:
         """获取所有保存的连接信息"""
         return list(self.saved_connections.values())
     
-    def add_saved_connection(self, connection_id, name, db_type, host, port, username, database=None):
+    def add_saved_connection(self, connection_id, name, db_type, host, port, username, database=None, statement_timeout=None):
         """保存连接信息"""
         self.saved_connections[connection_id] = {
             'id': connection_id,
@@ -1225,7 +3574,8 @@ class DatabaseConnectionManager:
             'host': host,
             'port': int(port),
             'username': username,
-            'database': database
+            'database': database,
+            'statement_timeout': statement_timeout
         }
         self.connection_names[connection_id] = name
         self._save_connections()
@@ -1238,112 +3588,344 @@ class DatabaseConnectionManager:
             del self.connection_names[connection_id]
         self._save_connections()
     
-    def create_connection(self, db_type, host, port, username, password, database=None):
-        """创建数据库连接池"""
+    def create_connection(self, db_type, host, port, username, password, database=None, statement_timeout=None):
+        """创建数据库连接池；statement_timeout 为该连接上语句的默认超时（秒，0 表示不限制）"""
         connection_id = str(uuid.uuid4())
+        if statement_timeout is None:
+            statement_timeout = app.config['DB_STATEMENT_TIMEOUT']
         
         try:
-            with self.lock:
-                if db_type == 'mysql':
-                    # 测试连接
-                    test_conn = pymysql.connect(
-                        host=host,
-                        port=int(port),
-                        user=username,
-                        password=password,
-                        connect_timeout=10,
-                        cursorclass=pymysql.cursors.DictCursor
-                    )
-                    test_conn.close()
-                    
-                    # 创建连接池
-                    # MySQL 使用简单的连接池管理
-                    self.connections[connection_id] = {
-                        'type': 'mysql',
-                        'host': host,
-                        'port': int(port),
-                        'database': database,
-                        'username': username,
-                        'password': password
-                    }
-                    
-                elif db_type == 'postgresql':
-                    # PostgreSQL 默认连接到 postgres 数据库
-                    target_db = database if database else 'postgres'
-                    # 测试连接
-                    test_conn = psycopg2.connect(
-                        host=host,
-                        port=int(port),
-                        database=target_db,
-                        user=username,
-                        password=password,
-                        connect_timeout=10
-                    )
-                    test_conn.close()
-                    
-                    # 创建连接池
-                    minconn = 1
-                    maxconn = 5
-                    pool = SimpleConnectionPool(
-                        minconn, maxconn,
-                        host=host,
-                        port=int(port),
-                        database=target_db,
-                        user=username,
-                        password=password
-                    )
-                    self.pools[connection_id] = pool
-                    self.connections[connection_id] = {
-                        'type': 'postgresql',
-                        'host': host,
-                        'port': int(port),
-                        'database': target_db,
-                        'username': username
-                    }
-                else:
-                    raise ValueError(f"不支持的数据库类型: {db_type}")
+            # 建立连接涉及网络I/O，在锁外进行，只在登记时持锁
+            if db_type == 'mysql':
+                # 创建连接池（预建的最小连接同时用于测试连接）
+                # 连接MySQL时不指定数据库（允许跨库查询）；自动提交，避免池化连接残留事务快照
+                pool = MySQLConnectionPool(
+                    app.config['MYSQL_POOL_MIN'], app.config['MYSQL_POOL_MAX'],
+                    recycle=app.config['MYSQL_POOL_RECYCLE'],
+                    wait_timeout=app.config['MYSQL_POOL_WAIT_TIMEOUT'],
+                    validate_idle=app.config['MYSQL_POOL_VALIDATE_IDLE'],
+                    host=host,
+                    port=int(port),
+                    user=username,
+                    password=password,
+                    connect_timeout=10,
+                    autocommit=True,
+                    cursorclass=pymysql.cursors.DictCursor
+                )
+                connection = {
+                    'type': 'mysql',
+                    'host': host,
+                    'port': int(port),
+                    'database': database,
+                    'username': username,
+                    'statement_timeout': int(statement_timeout)
+                }
                 
-                logger.info(f"数据库连接创建成功: {connection_id} ({db_type}://{host}:{port}/{database})")
-                return connection_id, True, "连接成功"
+            elif db_type == 'postgresql':
+                # PostgreSQL 默认连接到 postgres 数据库
+                target_db = database if database else 'postgres'
+                # 创建连接池（预建的最小连接同时用于测试连接）
+                pool = PostgreSQLConnectionPool(
+                    app.config['PG_POOL_MIN'], app.config['PG_POOL_MAX'],
+                    wait_timeout=app.config['PG_POOL_WAIT_TIMEOUT'],
+                    host=host,
+                    port=int(port),
+                    database=target_db,
+                    user=username,
+                    password=password,
+                    connect_timeout=10
+                )
+                connection = {
+                    'type': 'postgresql',
+                    'host': host,
+                    'port': int(port),
+                    'database': target_db,
+                    'username': username,
+                    'statement_timeout': int(statement_timeout)
+                }
+            else:
+                raise ValueError(f"不支持的数据库类型: {db_type}")
+            
+            with self.lock:
+                self.pools[connection_id] = pool
+                self.connections[connection_id] = connection
+            
+            logger.info(f"数据库连接创建成功: {connection_id} ({db_type}://{host}:{port}/{database})")
+            return connection_id, True, "连接成功"
                 
         except Exception as e:
             logger.error(f"数据库连接创建失败: {e}")
             return None, False, str(e)
     
-    def execute_sql(self, connection_id, sql):
-        """执行SQL语句"""
+    def _page_size(self, page_size):
+        """规范化单页行数：缺省取配置默认值，并限制在 [1, DB_MAX_PAGE_SIZE]"""
+        try:
+            page_size = int(page_size or app.config['DB_DEFAULT_PAGE_SIZE'])
+        except (TypeError, ValueError):
+            page_size = app.config['DB_DEFAULT_PAGE_SIZE']
+        return max(1, min(page_size, app.config['DB_MAX_PAGE_SIZE']))
+    
+    def _fetch_page(self, state, page_size):
+        """从服务端游标读取一页，多读一行判断是否还有后续数据"""
+        rows = state['pending']
+        if len(rows) <= page_size:
+            rows = rows + list(state['cursor'].fetchmany(page_size + 1 - len(rows)))
+        state['pending'] = rows[page_size:]
+        rows = rows[:page_size]
+        state['fetched'] += len(rows)
+        return rows, bool(state['pending'])
+    
+    def _encode_rows(self, state, rows):
+        """按结果格式组装行数据；游标返回的是元组，紧凑格式直接使用，不再逐行构造字典"""
+        columns = state['columns']
+        if state['format'] == 'rows':
+            return {'rows': [dict(zip(columns, row)) for row in rows], 'columns': columns}
+        result = {
+            'format': state['format'],
+            'columns': [{'name': name, 'type': tag} for name, tag in zip(columns, state['types'])]
+        }
+        if state['format'] == 'columnar':
+            result['data'] = list(zip(*rows)) if rows else [[] for _ in columns]
+        else:
+            result['rows'] = rows
+        return result
+    
+    def _release_cursor(self, state, exhausted):
+        """关闭游标并归还连接"""
+        if state['type'] == 'mysql':
+            if exhausted:
+                try:
+                    state['cursor'].close()
+                except Exception:
+                    pass
+                state['pool'].putconn(state['conn'], close=state['discard'])
+            else:
+                # 未读完的流式游标在 close() 时会把剩余结果全部读完，直接关闭连接更快
+                state['pool'].putconn(state['conn'], close=True)
+        else:
+            try:
+                state['cursor'].close()
+                state['conn'].rollback()
+            except Exception:
+                pass
+            try:
+                state['pool'].putconn(state['conn'])
+            except Exception:
+                pass
+    
+    def _page_result(self, state, page_size):
+        """读取一页并组装返回结果；还有数据时登记游标并返回续读令牌"""
+        fetch_started = time.monotonic()
+        rows, has_more = self._fetch_page(state, page_size)
+        profile = state.get('profile')
+        if profile is not None:
+            profile['fetch'] += time.monotonic() - fetch_started
+            profile['rows'] += len(rows)
+            profile['bytes'] += sql_payload_bytes(rows)
+        # 首页读完即结束超时计时，再转交或归还连接
+        self._end_statement(state.pop('exec_id', None))
+        result = self._encode_rows(state, rows)
+        result.update({
+            'row_count': len(rows),
+            'fetched': state['fetched'],
+            'has_more': has_more
+        })
+        if has_more:
+            result['next_token'] = self._register_cursor(state)
+        else:
+            self._release_cursor(state, exhausted=True)
+        return result
+    
+    def _register_cursor(self, state):
+        token = state.get('token') or uuid.uuid4().hex
+        state['token'] = token
+        state['last_used'] = time.monotonic()
+        evicted = []
+        with self.lock:
+            # 每个打开的游标独占一个池连接，按连接限制数量，超出时关闭最久未用的
+            owned = sorted((s['last_used'], t) for t, s in self.cursors.items()
+                           if s['connection_id'] == state['connection_id'])
+            while len(owned) >= app.config['DB_MAX_OPEN_CURSORS']:
+                evicted.append(self.cursors.pop(owned.pop(0)[1]))
+            self.cursors[token] = state
+        for old in evicted:
+            self._release_cursor(old, exhausted=False)
+        return token
+    
+    def _close_cursors(self, predicate):
+        with self.lock:
+            tokens = [t for t, s in self.cursors.items() if predicate(s)]
+            states = [self.cursors.pop(t) for t in tokens]
+        for state in states:
+            self._release_cursor(state, exhausted=False)
+        return len(states)
+    
+    def reap_cursors(self):
+        """关闭超过 DB_CURSOR_TTL 未续读的游标"""
+        deadline = time.monotonic() - app.config['DB_CURSOR_TTL']
+        return self._close_cursors(lambda s: s['last_used'] < deadline)
+    
+    def fetch_more(self, token, page_size=None):
+        """按续读令牌读取下一页"""
+        with self.lock:
+            state = self.cursors.pop(token, None)
+        if state is None:
+            return None, False, "游标不存在或已过期"
+        try:
+            state['profile'] = {'fetch': 0.0, 'rows': 0, 'bytes': 0}
+            result = self._page_result(state, self._page_size(page_size))
+            result['profile'] = {
+                'fetch_ms': round(state['profile']['fetch'] * 1000, 2),
+                'rows': state['profile']['rows'],
+                'bytes': state['profile']['bytes']
+            }
+            return result, True, "读取成功"
+        except Exception as e:
+            logger.error(f"游标续读失败: {e}", exc_info=True)
+            state['discard'] = True
+            self._release_cursor(state, exhausted=False)
+            return None, False, f"读取失败: {str(e)}"
+    
+    def close_cursor(self, token):
+        """放弃未读完的结果集"""
+        closed = self._close_cursors(lambda s: s['token'] == token)
+        return bool(closed), "游标已关闭" if closed else "游标不存在或已过期"
+    
+    def _begin_statement(self, exec_id, connection_id, db_type, pool, conn):
+        """登记正在执行的语句；连接设置了语句超时时，超时后自动取消"""
+        entry = {
+            'type': db_type, 'pool': pool, 'conn': conn,
+            'thread_id': conn.thread_id() if db_type == 'mysql' else None,
+            'lock': threading.Lock(), 'reason': None, 'done': False, 'timer': None
+        }
+        timeout = self.connections.get(connection_id, {}).get('statement_timeout', 0)
+        if timeout > 0:
+            entry['timer'] = threading.Timer(timeout, self.cancel_query, (exec_id, 'timeout'))
+            entry['timer'].daemon = True
+        with self.lock:
+            self.active[exec_id] = entry
+        if entry['timer']:
+            entry['timer'].start()
+        return entry
+    
+    def _end_statement(self, exec_id):
+        """注销语句；须在连接归还连接池之前调用，避免取消操作落到复用该连接的下一条语句上"""
+        with self.lock:
+            entry = self.active.pop(exec_id, None)
+        if entry is None:
+            return None
+        if entry['timer']:
+            entry['timer'].cancel()
+        with entry['lock']:
+            entry['done'] = True
+        return entry['reason']
+    
+    def cancel_query(self, exec_id, reason='cancelled'):
+        """取消正在执行的语句：MySQL 通过另一条连接发送 KILL QUERY，PostgreSQL 发送协议级取消请求（同 pg_cancel_backend）"""
+        with self.lock:
+            entry = self.active.get(exec_id)
+        if entry is None:
+            return False
+        with entry['lock']:
+            if entry['done']:
+                return False
+            entry['reason'] = reason
+            try:
+                if entry['type'] == 'mysql':
+                    # 不占用连接池名额，避免池满时无法取消
+                    with closing(pymysql.connect(**entry['pool'].connect_kwargs)) as killer:
+                        with killer.cursor() as cursor:
+                            cursor.execute('KILL QUERY %s', (entry['thread_id'],))
+                else:
+                    entry['conn'].cancel()
+            except Exception as e:
+                logger.error(f"取消SQL执行失败: {exec_id} - {e}")
+                return False
+        logger.info(f"已取消SQL执行: {exec_id} ({reason})")
+        return True
+    
+    def _interrupted_message(self, reason, error):
+        if reason == 'timeout':
+            return "SQL执行超时，已被终止"
+        if reason == 'cancelled':
+            return "SQL执行已取消"
+        return f"SQL执行失败: {str(error)}"
+    
+    def _after_statements(self, connection_id, statements):
+        """语句执行后：DDL 使结构缓存失效，任何非只读语句使该连接的结果缓存失效"""
+        schema_cache.invalidate_for(connection_id, statements)
+        if not is_read_only_sql(statements):
+            self.result_cache.invalidate(connection_id)
+    
+    def execute_sql(self, connection_id, sql, page_size=None, result_format='rows', exec_id=None, cache_ttl=None):
+        """执行SQL语句；查询结果通过服务端游标分页返回，未读完时附带续读令牌
+
+        exec_id 用于在执行期间通过 cancel_query 取消该语句（查询任务使用任务ID）。
+        cache_ttl 大于 0 时启用结果缓存：只读且一页即可返回完的结果按该秒数缓存，结果中 cache_hit 标明是否命中
+        """
         if connection_id not in self.connections:
             return None, False, "连接不存在"
         
+        page_size = self._page_size(page_size)
+        if cache_ttl:
+            db_type = self.connections[connection_id]['type']
+            if is_read_only_sql(split_sql(sql, db_type)):
+                key = (connection_id, normalize_sql(sql), page_size, result_format)
+                result = self.result_cache.get(key)
+                if result is not None:
+                    return result, True, "执行成功（缓存）"
+                result, success, message = self.execute_sql(connection_id, sql, page_size, result_format, exec_id)
+                if success and result and not result.get('has_more'):
+                    # 耗时剖析只属于本次执行，不随结果缓存
+                    cached = {k: v for k, v in result.items() if k != 'profile'}
+                    self.result_cache.put(key, cached, min(cache_ttl, app.config['DB_RESULT_CACHE_MAX_TTL']))
+                    result = dict(result, cache_hit=False)
+                return result, success, message
+
+        profile = {'connect': 0.0, 'execute': 0.0, 'fetch': 0.0, 'rows': 0, 'bytes': 0}
+        started = time.monotonic()
+        result, success, message = self._execute_sql(connection_id, sql, page_size, result_format,
+                                                      exec_id or uuid.uuid4().hex, profile)
+        profile['total'] = time.monotonic() - started
+        profile = query_profiler.record(connection_id, sql, profile, success)
+        logger.info(f"SQL执行耗时: 总计 {profile['total_ms']}ms (连接 {profile['connect_ms']}ms, "
+                    f"执行 {profile['execute_ms']}ms, 读取 {profile['fetch_ms']}ms), "
+                    f"返回 {profile['rows']} 行 / {profile['bytes']} 字节")
+        if success and isinstance(result, dict):
+            result['profile'] = profile
+        return result, success, message
+    
+    def _execute_sql(self, connection_id, sql, page_size, result_format, exec_id, profile):
+        """execute_sql 的执行部分；各阶段耗时、返回行数和字节数累加到 profile"""
         try:
             conn_info = self.connections[connection_id]
             db_type = conn_info['type']
             
             if db_type == 'mysql':
-                # 连接MySQL时不指定数据库（允许跨库查询）
-                conn_params = {
-                    'host': conn_info['host'],
-                    'port': int(conn_info['port']),
-                    'user': conn_info['username'],
-                    'password': conn_info['password'],
-                    'cursorclass': pymysql.cursors.DictCursor,
-                    'connect_timeout': 10
-                }
-                # 不指定database参数，允许跨数据库查询
+                pool = self.pools.get(connection_id)
+                if pool is None:
+                    return None, False, "连接池不存在"
                 
-                logger.info(f"连接MySQL参数: host={conn_info['host']}, port={conn_info['port']}")
+                logger.info(f"MySQL连接: host={conn_info['host']}, port={conn_info['port']}, 连接池: {pool.stats()}")
                 logger.info(f"执行的SQL: {sql}")
-                logger.info(f"SQL语句数量: {len([s.strip() for s in sql.split(';') if s.strip()])}")
+                statements = split_sql(sql, 'mysql')
+                logger.info(f"SQL语句数量: {len(statements)}")
                 
-                conn = pymysql.connect(**conn_params)
+                connect_started = time.monotonic()
+                conn = pool.getconn()
+                profile['connect'] = time.monotonic() - connect_started
+                # 修改了会话状态（如 USE 切换库）或连接出错时，归还时关闭该连接
+                discard = False
+                # 查询结果未读完时，连接随游标一起转交给 self.cursors，不在此归还
+                handed_off = False
+                interrupted = None
                 
                 try:
+                    self._begin_statement(exec_id, connection_id, 'mysql', pool, conn)
                     cursor = conn.cursor()
                     
                     try:
                         # 支持多条SQL语句（用分号分隔）
-                        statements = [s.strip() for s in sql.split(';') if s.strip()]
-                        
                         if not statements:
                             return {'message': '没有有效的SQL语句'}, False, "SQL语句为空"
                         
@@ -1352,92 +3934,109 @@ class DatabaseConnectionManager:
                         for idx, statement in enumerate(statements):
                             logger.info(f"执行SQL语句 {idx + 1}/{len(statements)}: {statement[:100]}...")
                             
-                            affected_rows = cursor.execute(statement)
+                            keyword = sql_keyword(statement)
+                            if mysql_changes_session(statement):
+                                discard = True
                             
                             # 判断是否为查询语句（只对最后一个语句返回结果）
-                            if idx == len(statements) - 1:
-                                sql_upper = statement.upper()
-                                is_query = sql_upper.startswith(('SELECT', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN'))
-                                
-                                if is_query:
-                                    rows = cursor.fetchall()
-                                    
-                                    # 获取列名
-                                    columns = []
-                                    if cursor.description:
-                                        columns = [desc[0] for desc in cursor.description]
-                                    
-                                    logger.info(f"SQL查询结果: columns={columns}, row_count={len(rows)}")
-                                    if rows and len(rows) > 0:
-                                        logger.info(f"第一行数据示例: {rows[0]}, 类型: {type(rows[0])}")
-                                    
-                                    # 由于使用了DictCursor，rows已经是字典列表
-                                    result = {
-                                        'rows': rows,
-                                        'columns': columns,
-                                        'row_count': len(rows)
-                                    }
-                                else:
-                                    conn.commit()
-                                    result = {
+                            is_last = idx == len(statements) - 1
+                            if is_last and keyword in ('SELECT', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN'):
+                                # 流式游标：结果留在服务端，按页读取，不一次性载入内存
+                                cursor.close()
+                                cursor = conn.cursor(pymysql.cursors.SSCursor)
+                                execute_started = time.monotonic()
+                                cursor.execute(statement)
+                                profile['execute'] += time.monotonic() - execute_started
+                                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                                state = {
+                                    'type': 'mysql', 'connection_id': connection_id, 'pool': pool,
+                                    'conn': conn, 'cursor': cursor, 'columns': columns,
+                                    'types': sql_column_types('mysql', cursor) if cursor.description else [],
+                                    'format': result_format, 'pending': [], 'fetched': 0, 'discard': discard,
+                                    'exec_id': exec_id, 'profile': profile
+                                }
+                                handed_off = True
+                                last_result = self._page_result(state, page_size)
+                                logger.info(f"SQL查询结果: columns={columns}, row_count={last_result['row_count']}, has_more={last_result['has_more']}")
+                            else:
+                                execute_started = time.monotonic()
+                                affected_rows = cursor.execute(statement)
+                                profile['execute'] += time.monotonic() - execute_started
+                                if is_last:
+                                    # 池化连接为自动提交模式，无需再发送 COMMIT
+                                    last_result = {
                                         'affected_rows': affected_rows,
                                         'message': f'执行成功，影响了 {affected_rows} 行'
                                     }
-                                last_result = result
-                            else:
-                                # 非最后一个语句（如USE），执行但不返回结果
-                                logger.info(f"中间语句执行成功")
+                                else:
+                                    # 非最后一个语句（如USE），执行但不返回结果
+                                    logger.info(f"中间语句执行成功")
                         
                         return last_result if last_result else {'message': '执行成功'}, True, "执行成功"
                         
                     except Exception as sql_error:
+                        if isinstance(sql_error, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+                            discard = True
+                        if handed_off:
+                            # 流式读取中途出错，连接上可能残留未读结果，直接关闭
+                            handed_off = False
+                            discard = True
+                        interrupted = self._end_statement(exec_id)
                         logger.error(f"SQL执行出错: {sql_error}", exc_info=True)
-                        return None, False, f"SQL执行失败: {str(sql_error)}"
+                        return None, False, self._interrupted_message(interrupted, sql_error)
                     
                 finally:
-                    try:
-                        cursor.close()
-                    except:
-                        pass
-                    try:
-                        conn.close()
-                    except:
-                        pass
+                    self._end_statement(exec_id)
+                    self._after_statements(connection_id, statements)
+                    if not handed_off:
+                        if not discard:
+                            try:
+                                cursor.close()
+                            except:
+                                pass
+                        pool.putconn(conn, close=discard)
                     
             elif db_type == 'postgresql':
                 if connection_id in self.pools:
                     pool = self.pools[connection_id]
+                    connect_started = time.monotonic()
                     conn = pool.getconn()
+                    profile['connect'] = time.monotonic() - connect_started
+                    handed_off = False
+                    cursor = None
+                    statements = split_sql(sql, 'postgresql')
                     try:
-                        cursor = conn.cursor()
-                        
-                        sql_upper = sql.strip().upper()
-                        # 判断是否为查询语句
-                        is_query = sql_upper.startswith(('SELECT', 'SHOW', 'DESCRIBE', 'DESC', 'EXPLAIN'))
+                        self._begin_statement(exec_id, connection_id, 'postgresql', pool, conn)
+                        # 命名游标只能承载单条查询，多条语句仍整体发送
+                        if sql_keyword(sql) in ('SELECT', 'VALUES', 'TABLE') and len(statements) == 1:
+                            # 命名游标即服务端游标（DECLARE CURSOR），按页 FETCH
+                            cursor = conn.cursor(name=f"ops_{uuid.uuid4().hex}")
+                        else:
+                            cursor = conn.cursor()
+                        execute_started = time.monotonic()
+                        cursor.execute(sql)
+                        pending = []
+                        if cursor.name is None:
+                            # 普通游标的结果已在客户端，先提交写操作（含 RETURNING 的语句同样适用）
+                            conn.commit()
+                        else:
+                            # 命名游标在第一次 FETCH 之后才有结果描述（DECLARE 不执行查询，首次 FETCH 计入执行阶段）
+                            pending = list(cursor.fetchmany(page_size + 1))
+                        profile['execute'] = time.monotonic() - execute_started
                         
-                        if is_query:
-                            cursor.execute(sql)
-                            rows = cursor.fetchall()
-                            columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                            
-                            logger.info(f"PostgreSQL查询结果: columns={columns}, row_count={len(rows)}")
-                            if rows and len(rows) > 0:
-                                logger.info(f"第一行数据示例: {rows[0]}, 类型: {type(rows[0])}")
-                            
-                            # 将行数据转换为字典列表
-                            result_rows = []
-                            for row in rows:
-                                row_dict = dict(zip(columns, row))
-                                result_rows.append(row_dict)
-                            
-                            result = {
-                                'rows': result_rows,
-                                'columns': columns,
-                                'row_count': len(rows)
+                        if cursor.description is not None:
+                            columns = [desc[0] for desc in cursor.description]
+                            state = {
+                                'type': 'postgresql', 'connection_id': connection_id, 'pool': pool,
+                                'conn': conn, 'cursor': cursor, 'columns': columns,
+                                'types': sql_column_types('postgresql', cursor),
+                                'format': result_format, 'pending': pending, 'fetched': 0, 'discard': False,
+                                'exec_id': exec_id, 'profile': profile
                             }
+                            handed_off = True
+                            result = self._page_result(state, page_size)
+                            logger.info(f"PostgreSQL查询结果: columns={columns}, row_count={result['row_count']}, has_more={result['has_more']}")
                         else:
-                            cursor.execute(sql)
-                            conn.commit()
                             affected_rows = cursor.rowcount
                             result = {
                                 'affected_rows': affected_rows,
@@ -1446,50 +4045,1223 @@ class DatabaseConnectionManager:
                         
                         return result, True, "执行成功"
                     except Exception as sql_error:
+                        handed_off = False
+                        interrupted = self._end_statement(exec_id)
                         logger.error(f"PostgreSQL SQL执行出错: {sql_error}", exc_info=True)
-                        return None, False, f"SQL执行失败: {str(sql_error)}"
+                        return None, False, self._interrupted_message(interrupted, sql_error)
                     finally:
-                        try:
-                            cursor.close()
-                        except:
-                            pass
-                        try:
-                            pool.putconn(conn)
-                        except:
-                            pass
+                        self._end_statement(exec_id)
+                        self._after_statements(connection_id, statements)
+                        if not handed_off:
+                            try:
+                                if cursor is not None:
+                                    cursor.close()
+                                conn.rollback()
+                            except:
+                                pass
+                            try:
+                                pool.putconn(conn)
+                            except:
+                                pass
                 else:
                     return None, False, "连接池不存在"
+        except PoolTimeoutError as e:
+            logger.warning(f"数据库连接池繁忙: {connection_id} - {e}")
+            return None, False, f"连接池繁忙: {str(e)}"
         except Exception as e:
             import traceback
             logger.error(f"SQL执行失败: {e}", exc_info=True)
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None, False, f"执行失败: {str(e)}"
     
-    def close_connection(self, connection_id):
-        """关闭数据库连接"""
+    def _batch_end(self, statements, pos):
+        """相邻的DML合并为一批，受 DB_SCRIPT_BATCH_SIZE 条数和 DB_SCRIPT_BATCH_BYTES 字节数限制"""
+        end = pos + 1
+        if sql_keyword(statements[pos]) not in SQL_DML_KEYWORDS:
+            return end
+        size = len(statements[pos])
+        while end < len(statements) and end - pos < app.config['DB_SCRIPT_BATCH_SIZE'] \
+                and sql_keyword(statements[end]) in SQL_DML_KEYWORDS \
+                and size + len(statements[end]) <= app.config['DB_SCRIPT_BATCH_BYTES']:
+            size += len(statements[end])
+            end += 1
+        return end
+    
+    def _abandon_stream(self, conn, cursor, connect_kwargs):
+        """放弃 MySQL 流式游标未读完的结果，连接留给脚本的后续语句继续使用
+        
+        直接 close() 会把剩余行全部读完；先通过另一条连接 KILL QUERY 让服务端停止发送，再读到中断错误为止。
+        服务端已发送完毕时 KILL QUERY 落在空闲连接上，下一条命令开始时即被清除。
+        """
         try:
-            with self.lock:
-                if connection_id in self.pools:
-                    pool = self.pools[connection_id]
-                    pool.closeall()
-                    del self.pools[connection_id]
-                
-                if connection_id in self.connections:
-                    del self.connections[connection_id]
-                
-                logger.info(f"数据库连接已关闭: {connection_id}")
-                return True, "连接已关闭"
+            with closing(pymysql.connect(**connect_kwargs)) as killer:
+                with killer.cursor() as kill_cursor:
+                    kill_cursor.execute('KILL QUERY %s', (conn.thread_id(),))
         except Exception as e:
-            logger.error(f"关闭数据库连接失败: {e}")
-            return False, str(e)
-
-db_connection_manager = DatabaseConnectionManager()
-
-# 数据库管理路由
-@app.route('/database-manager')
-@login_required
-def database_manager():
-    """数据库管理页面"""
+            # 无法终止时退回到读完剩余结果
+            logger.warning(f"终止流式查询失败，读取剩余结果: {e}")
+        try:
+            cursor.close()
+        except pymysql.err.OperationalError as e:
+            if e.args[0] != ER.QUERY_INTERRUPTED:
+                raise
+            # PyMySQL 只把超时类错误视为流式结果的结束，这里同样标记结束，否则下一条命令会继续等待剩余数据
+            if conn._result is not None:
+                conn._result.unbuffered_active = False
+            cursor.connection = None
+    
+    def _run_batch(self, db_type, conn, batch, results, page_size, result_format, connect_kwargs=None):
+        """执行一批语句，每完成一条向 results 追加一项；出错时抛出异常，已完成的条目保留
+        
+        connect_kwargs 为 MySQL 的连接参数，查询结果超过 page_size 行时用于终止流式查询。
+        """
+        if len(batch) == 1:
+            cursor = conn.cursor(pymysql.cursors.SSCursor) if db_type == 'mysql' else conn.cursor()
+            truncated = False
+            try:
+                cursor.execute(batch[0])
+                entry = {}
+                if cursor.description:
+                    # 脚本中的查询只返回前 page_size 行
+                    rows = list(cursor.fetchmany(page_size + 1))
+                    truncated = len(rows) > page_size
+                    state = {
+                        'format': result_format,
+                        'columns': [desc[0] for desc in cursor.description],
+                        'types': sql_column_types(db_type, cursor)
+                    }
+                    entry.update(self._encode_rows(state, rows[:page_size]))
+                    entry.update(row_count=min(len(rows), page_size), truncated=truncated)
+                else:
+                    entry['affected_rows'] = cursor.rowcount
+                results.append(entry)
+            finally:
+                if truncated and db_type == 'mysql':
+                    self._abandon_stream(conn, cursor, connect_kwargs)
+                else:
+                    cursor.close()
+            return
+        
+        # 以换行结束每条语句，避免末尾的行注释吞掉分号
+        batch_sql = '\n;\n'.join(batch)
+        if db_type == 'mysql':
+            with conn.cursor(pymysql.cursors.Cursor) as cursor:
+                cursor.execute(batch_sql)
+                results.append({'affected_rows': cursor.rowcount})
+                while cursor.nextset():
+                    results.append({'affected_rows': cursor.rowcount})
+        else:
+            # 一次简单查询协议往返；PostgreSQL 只返回最后一条语句的影响行数
+            with conn.cursor() as cursor:
+                cursor.execute(batch_sql)
+                results.extend({'affected_rows': None} for _ in batch[:-1])
+                results.append({'affected_rows': cursor.rowcount})
+    
+    def execute_script(self, connection_id, sql, transaction=False, stop_on_error=True,
+                       result_format='rows', exec_id=None, should_stop=None):
+        """按语句执行SQL脚本，返回每条语句的耗时和结果
+
+        transaction=True 时整个脚本在一个事务中执行，任一语句失败即全部回滚（MySQL 的 DDL 会隐式提交）。
+        相邻的DML合并为一次往返，同批语句共用一个耗时。should_stop 在每批执行前调用，返回 True 时停止。
+        """
+        if connection_id not in self.connections:
+            return None, False, "连接不存在"
+        db_type = self.connections[connection_id]['type']
+        pool = self.pools.get(connection_id)
+        if pool is None:
+            return None, False, "连接池不存在"
+        statements = split_sql(sql, db_type)
+        if not statements:
+            return {'message': '没有有效的SQL语句'}, False, "SQL语句为空"
+        
+        exec_id = exec_id or uuid.uuid4().hex
+        page_size = self._page_size(None)
+        entries = []
+        batches = 0
+        error = None
+        started = time.monotonic()
+        
+        try:
+            if db_type == 'mysql':
+                # 只有脚本需要把相邻的DML合并为一次往返（多语句），为脚本单独建立连接，用完即关闭；
+                # 连接池中的连接保持单语句模式
+                conn = pymysql.connect(**dict(pool.connect_kwargs, client_flag=CLIENT.MULTI_STATEMENTS))
+            else:
+                conn = pool.getconn()
+        except PoolTimeoutError as e:
+            return None, False, f"连接池繁忙: {str(e)}"
+        except Exception as e:
+            return None, False, f"执行失败: {str(e)}"
+        
+        try:
+            if transaction and db_type == 'mysql':
+                conn.begin()
+            connect_kwargs = pool.connect_kwargs if db_type == 'mysql' else None
+            pos = 0
+            single_until = 0  # PostgreSQL 批次失败后逐条重试以定位出错语句
+            while pos < len(statements):
+                if should_stop and should_stop():
+                    error = "SQL执行已取消"
+                    break
+                end = pos + 1 if pos < single_until else self._batch_end(statements, pos)
+                batch = statements[pos:end]
+                done = len(entries)
+                batch_started = time.monotonic()
+                self._begin_statement(exec_id, connection_id, db_type, pool, conn)
+                try:
+                    self._run_batch(db_type, conn, batch, entries, page_size, result_format, connect_kwargs)
+                    failure = None
+                except Exception as e:
+                    failure = e
+                reason = self._end_statement(exec_id)
+                elapsed = round(time.monotonic() - batch_started, 4)
+                batches += 1
+                
+                for offset, entry in enumerate(entries[done:]):
+                    entry.update(index=pos + offset, sql=statements[pos + offset][:200], elapsed=elapsed)
+                    if len(batch) > 1:
+                        entry['batch_size'] = len(batch)
+                
+                if failure is None:
+                    if db_type == 'postgresql' and not transaction:
+                        conn.commit()
+                    pos = end
+                    continue
+                
+                if db_type == 'mysql':
+                    failed = pos + len(entries) - done
+                else:
+                    # 整批已被回滚，已记录的条目作废；多条语句的批次逐条重试，定位实际出错的语句
+                    del entries[done:]
+                    failed = pos
+                    if len(batch) > 1 and reason is None:
+                        conn.rollback()
+                        replay_failure = None
+                        if transaction and pos:
+                            # 事务模式下回滚撤销了此前的全部语句：一次往返重放已成功的语句，再逐条执行本批
+                            # （不在每批前设保存点，成功路径没有额外往返，也不产生子事务）
+                            self._begin_statement(exec_id, connection_id, db_type, pool, conn)
+                            try:
+                                with conn.cursor() as cursor:
+                                    cursor.execute('\n;\n'.join(statements[:pos]))
+                            except Exception as e:
+                                replay_failure = e
+                            reason = self._end_statement(exec_id)
+                        if replay_failure is None:
+                            single_until = end
+                            continue
+                        failure = replay_failure
+                    elif not transaction:
+                        conn.rollback()
+                
+                error = self._interrupted_message(reason, failure)
+                entries.append({'index': failed, 'sql': statements[failed][:200], 'elapsed': elapsed, 'error': error})
+                logger.error(f"脚本第 {failed + 1} 条语句执行失败: {failure}")
+                if transaction or stop_on_error or reason is not None:
+                    break
+                error = None
+                pos = failed + 1
+            
+            if transaction:
+                if error:
+                    conn.rollback()
+                else:
+                    conn.commit()
+        except Exception as e:
+            logger.error(f"SQL脚本执行失败: {e}", exc_info=True)
+            error = f"执行失败: {str(e)}"
+        finally:
+            self._end_statement(exec_id)
+            self._after_statements(connection_id, statements)
+            if db_type == 'mysql':
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            else:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                try:
+                    pool.putconn(conn)
+                except Exception:
+                    pass
+        
+        failures = sum(1 for entry in entries if 'error' in entry)
+        result = {
+            'statements': entries,
+            'statement_count': len(statements),
+            'executed': len(entries) - failures,
+            'failed': failures,
+            'batches': batches,
+            'transaction': transaction,
+            'committed': bool(transaction and not error),
+            'elapsed': round(time.monotonic() - started, 4)
+        }
+        if error:
+            return result, False, error
+        if failures:
+            return result, False, f"{failures} 条语句执行失败"
+        return result, True, f"执行成功，共 {len(statements)} 条语句"
+    
+    def export_query(self, connection_id, sql, export_format='csv'):
+        """以 CSV 或 NDJSON 流式导出单条查询的完整结果，返回逐块产出字节的生成器
+
+        PostgreSQL 查询语句的 CSV 导出使用 COPY ... TO STDOUT；其余情况（含 SHOW）从游标分批读取。
+        生成器在首次迭代时才借用连接并执行查询，关闭生成器即释放连接。
+        """
+        conn_info = self.connections.get(connection_id)
+        pool = self.pools.get(connection_id)
+        if conn_info is None or pool is None:
+            raise ValueError("连接不存在")
+        statements = split_sql(sql, conn_info['type'])
+        if len(statements) != 1 or sql_keyword(statements[0]) not in SQL_EXPORT_KEYWORDS:
+            raise ValueError("只能导出单条查询语句")
+        if (conn_info['type'] == 'postgresql' and export_format == 'csv'
+                and sql_keyword(statements[0]) in SQL_PG_QUERY_KEYWORDS):
+            return self._export_pg_copy(pool, statements[0])
+        return self._export_cursor(conn_info['type'], pool, statements[0], export_format)
+    
+    def _export_cursor(self, db_type, pool, statement, export_format):
+        conn = pool.getconn()
+        completed = False
+        cursor = None
+        chunk_size = app.config['DB_EXPORT_CHUNK_SIZE']
+        try:
+            if db_type == 'mysql':
+                cursor = conn.cursor(pymysql.cursors.SSCursor)
+            elif sql_keyword(statement) in SQL_PG_QUERY_KEYWORDS:
+                cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            else:
+                # SHOW 等不能用于 DECLARE CURSOR，结果很小，用普通游标
+                cursor = conn.cursor()
+            cursor.execute(statement)
+            rows = cursor.fetchmany(app.config['DB_EXPORT_FETCH_SIZE'])
+            columns = [desc[0] for desc in cursor.description]
+            binary = [tag == 'bytes' for tag in sql_column_types(db_type, cursor)]
+            buffer = io.StringIO()
+            writer = None
+            if export_format == 'csv':
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+            first = True
+            while rows:
+                for row in rows:
+                    if writer is None:
+                        buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=sql_wire_default))
+                        buffer.write('\n')
+                        continue
+                    if any(binary):
+                        row = [sql_wire_default(value) if is_binary and value is not None else value
+                               for value, is_binary in zip(row, binary)]
+                    writer.writerow(row)
+                # 第一批立即发出，尽快给客户端首字节
+                if first or buffer.tell() >= chunk_size:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+                    first = False
+                rows = cursor.fetchmany(app.config['DB_EXPORT_FETCH_SIZE'])
+            if buffer.tell():
+                yield buffer.getvalue().encode('utf-8')
+            completed = True
+        finally:
+            if db_type == 'mysql':
+                # 中途放弃的流式游标不读完剩余结果，直接关闭连接
+                if completed and cursor is not None:
+                    cursor.close()
+                pool.putconn(conn, close=not completed)
+            else:
+                try:
+                    if cursor is not None:
+                        cursor.close()
+                    conn.rollback()
+                except Exception:
+                    pass
+                pool.putconn(conn)
+    
+    def _export_pg_copy(self, pool, statement):
+        conn = pool.getconn()
+        chunk_size = app.config['DB_EXPORT_CHUNK_SIZE']
+        # 有界队列：客户端读得慢时 COPY 线程阻塞，内存占用不超过 队列长度 x 块大小
+        chunks = queue.Queue(maxsize=app.config['DB_EXPORT_QUEUE_CHUNKS'])
+        aborted = threading.Event()
+        
+        def offer(item):
+            while not aborted.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+            raise IOError("导出已中止")
+        
+        class Sink:
+            def __init__(self):
+                self.parts = []
+                self.size = 0
+                self.first = True
+            
+            def write(self, data):
+                self.parts.append(data)
+                self.size += len(data)
+                if self.first or self.size >= chunk_size:
+                    self.flush()
+            
+            def flush(self):
+                if self.parts:
+                    data = b''.join(self.parts)
+                    self.parts, self.size, self.first = [], 0, False
+                    offer(data)
+        
+        def copy():
+            sink = Sink()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER true)", sink)
+                sink.flush()
+                offer(None)
+            except Exception as e:
+                if not aborted.is_set():
+                    offer(e)
+        
+        thread = threading.Thread(target=copy, daemon=True)
+        thread.start()
+        completed = False
+        try:
+            while True:
+                item = chunks.get()
+                if item is None:
+                    completed = True
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if not completed:
+                aborted.set()
+                try:
+                    conn.cancel()
+                except Exception:
+                    pass
+            thread.join()
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            pool.putconn(conn, close=not completed)
+    
+    def _import_reader(self, text, file_format, has_header, known, empty_as_null, failures):
+        """解析导入文件，返回 (列名, 逐行产出 (行号, 值列表) 的迭代器)；格式错误的行记入 failures"""
+        if file_format == 'ndjson':
+            first = None
+            lines = enumerate(text, 1)
+            for line_no, line in lines:
+                if line.strip():
+                    first = (line_no, line)
+                    break
+            if first is None:
+                return [], iter(())
+            try:
+                columns = list(json.loads(first[1]).keys())
+            except (ValueError, AttributeError):
+                raise ValueError(f"第 {first[0]} 行不是JSON对象")
+            
+            def rows():
+                for line_no, line in itertools.chain([first], lines):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        if not isinstance(record, dict):
+                            raise ValueError("不是JSON对象")
+                        unknown = set(record) - set(columns)
+                        if unknown:
+                            raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+                    except ValueError as e:
+                        failures.append({'line': line_no, 'error': str(e), 'data': line[:500]})
+                        continue
+                    yield line_no, [json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+                                    for value in (record.get(column) for column in columns)]
+            return columns, rows()
+        
+        reader = csv.reader(text)
+        columns = next(reader, None) if has_header else list(known)
+        if not columns:
+            return [], iter(())
+        columns = [column.strip() for column in columns]
+        
+        def rows():
+            for values in reader:
+                if not values:
+                    continue
+                if len(values) != len(columns):
+                    failures.append({'line': reader.line_num, 'error': f"字段数为 {len(values)}，应为 {len(columns)}",
+                                     'data': ','.join(values)[:500]})
+                    continue
+                if empty_as_null:
+                    values = [value if value != '' else None for value in values]
+                yield reader.line_num, values
+        return columns, rows()
+    
+    def _quote_identifier(self, db_type, name):
+        if db_type == 'mysql':
+            return '`' + name.replace('`', '``') + '`'
+        return '"' + name.replace('"', '""') + '"'
+    
+    def import_rows(self, connection_id, database, table, path, file_format='csv', batch_size=None,
+                    has_header=True, empty_as_null=True, stop_on_error=False, progress=None, should_stop=None):
+        """把 CSV/NDJSON 文件导入目标表，返回导入统计和失败行报告
+
+        PostgreSQL 每批通过 COPY FROM STDIN 写入，MySQL 每批为一条多行 INSERT，每批一个事务；
+        整批失败时回滚并逐行重试，只把出错的行记入报告。
+        """
+        conn_info = self.connections.get(connection_id)
+        pool = self.pools.get(connection_id)
+        if conn_info is None or pool is None:
+            return None, False, "连接不存在"
+        db_type = conn_info['type']
+        batch_size = max(1, min(int(batch_size or app.config['DB_IMPORT_BATCH_SIZE']), app.config['DB_IMPORT_MAX_BATCH_SIZE']))
+        
+        table_info, _, _ = schema_cache.table(connection_id, database, table, refresh=True)
+        known = [column['name'] for column in table_info['columns']]
+        if not known:
+            return None, False, f"目标表不存在: {database}.{table}"
+        
+        failures = []
+        stats = {'rows_imported': 0, 'rows_failed': 0, 'batches': 0, 'bytes_read': 0,
+                 'total_bytes': os.path.getsize(path)}
+        started = time.monotonic()
+        stopped = None  # 'cancelled' 或 'error'
+        
+        with open(path, 'r', encoding='utf-8-sig', newline='') as text:
+            try:
+                columns, rows = self._import_reader(text, file_format, has_header, known, empty_as_null, failures)
+            except ValueError as e:
+                return None, False, str(e)
+            unknown = [column for column in columns if column not in known]
+            if unknown:
+                return None, False, f"目标表中不存在的列: {', '.join(unknown)}"
+            if not columns:
+                return None, False, "文件中没有数据"
+            
+            quoted = ', '.join(self._quote_identifier(db_type, column) for column in columns)
+            target = f"{self._quote_identifier(db_type, database)}.{self._quote_identifier(db_type, table)}"
+            # 带参数执行时 pymysql 和 psycopg2 都会对语句做 % 格式化，标识符中的 % 需转义；COPY 不带参数，原样使用
+            insert_sql = (f"INSERT INTO {target.replace('%', '%%')} ({quoted.replace('%', '%%')}) "
+                          f"VALUES ({', '.join(['%s'] * len(columns))})")
+            copy_sql = f"COPY {target} ({quoted}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+            db_errors = pymysql.err.MySQLError if db_type == 'mysql' else psycopg2.Error
+            
+            def write_rows_one_by_one(batch):
+                imported = 0
+                for line_no, values in batch:
+                    try:
+                        with conn.cursor() as cursor:
+                            cursor.execute(insert_sql, values)
+                        if db_type == 'postgresql':
+                            conn.commit()
+                        imported += 1
+                    except db_errors as e:
+                        if db_type == 'postgresql':
+                            if conn.closed:
+                                raise
+                            conn.rollback()
+                        elif not conn.open:
+                            raise
+                        failures.append({'line': line_no, 'error': str(e),
+                                         'data': json.dumps(values, ensure_ascii=False, default=str)[:500]})
+                return imported
+            
+            def write_batch(batch):
+                try:
+                    if db_type == 'mysql':
+                        conn.begin()
+                        with conn.cursor() as cursor:
+                            # pymysql 会把 executemany 的 INSERT ... VALUES 改写为多行 INSERT
+                            cursor.executemany(insert_sql, [values for _, values in batch])
+                    else:
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer)
+                        for _, values in batch:
+                            writer.writerow(['\\N' if value is None else value for value in values])
+                        buffer.seek(0)
+                        with conn.cursor() as cursor:
+                            cursor.copy_expert(copy_sql, buffer)
+                    conn.commit()
+                    return len(batch)
+                except db_errors:
+                    conn.rollback()
+                    return write_rows_one_by_one(batch)
+            
+            conn = pool.getconn()
+            completed = False
+            try:
+                batch = []
+                # 末尾追加 None 以写出最后一批
+                for item in itertools.chain(rows, [None]):
+                    if item is not None:
+                        batch.append(item)
+                        if len(batch) < batch_size:
+                            continue
+                    if batch:
+                        stats['rows_imported'] += write_batch(batch)
+                        stats['batches'] += 1
+                        batch = []
+                    stats['rows_failed'] = len(failures)
+                    stats['bytes_read'] = text.buffer.tell()
+                    if progress:
+                        progress(dict(stats))
+                    if item is None:
+                        break
+                    if should_stop and should_stop():
+                        stopped = 'cancelled'
+                        break
+                    if stop_on_error and failures:
+                        stopped = 'error'
+                        break
+                completed = True
+            except (pymysql.err.MySQLError, psycopg2.Error) as e:
+                logger.error(f"数据导入失败: {e}", exc_info=True)
+                return None, False, f"导入失败: {str(e)}"
+            finally:
+                self.result_cache.invalidate(connection_id)
+                if db_type == 'mysql':
+                    pool.putconn(conn, close=not completed)
+                else:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    pool.putconn(conn, close=not completed)
+        
+        report_limit = app.config['DB_IMPORT_MAX_FAILED_REPORT']
+        stats.update(
+            rows_failed=len(failures),
+            failed_rows=failures[:report_limit],
+            failed_rows_truncated=len(failures) > report_limit,
+            columns=columns,
+            stopped=stopped,
+            elapsed=round(time.monotonic() - started, 3)
+        )
+        if stopped == 'cancelled':
+            return stats, False, f"导入已取消：已导入 {stats['rows_imported']} 行"
+        if stopped == 'error':
+            return stats, False, f"第 {failures[0]['line']} 行导入失败，已停止：{failures[0]['error']}"
+        return stats, True, f"导入完成：成功 {stats['rows_imported']} 行，失败 {stats['rows_failed']} 行"
+    
+    def explain(self, connection_id, sql, analyze=False):
+        """获取单条语句的执行计划，返回 {'statement', 'analyze', 'columns', 'rows', 'elapsed'}
+        
+        analyze 时使用 EXPLAIN ANALYZE，会实际执行语句，因此只接受只读查询；PostgreSQL 执行后回滚。
+        MySQL 允许语句前带 USE（数据库管理控制台常见的写法），在同一连接上先执行
+        """
+        conn_info = self.connections.get(connection_id)
+        pool = self.pools.get(connection_id)
+        if conn_info is None or pool is None:
+            return None, False, "连接不存在"
+        db_type = conn_info['type']
+        statements = split_sql(sql, db_type)
+        if not statements:
+            return None, False, "SQL语句为空"
+        setup, statement = statements[:-1], statements[-1]
+        if (db_type != 'mysql' and setup) or any(sql_keyword(s) != 'USE' for s in setup):
+            return None, False, "只能分析单条SQL语句"
+        if sql_keyword(statement) == 'EXPLAIN':
+            return None, False, "语句本身已是 EXPLAIN"
+        if analyze and not is_read_only_sql([statement]):
+            return None, False, "EXPLAIN ANALYZE 会实际执行语句，仅支持只读查询"
+        if db_type == 'mysql':
+            prefix = 'EXPLAIN ANALYZE ' if analyze else 'EXPLAIN '
+        else:
+            prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+        
+        exec_id = uuid.uuid4().hex
+        started = time.monotonic()
+        try:
+            conn = pool.getconn()
+        except PoolTimeoutError as e:
+            return None, False, f"连接池繁忙: {str(e)}"
+        discard = bool(setup)
+        try:
+            self._begin_statement(exec_id, connection_id, db_type, pool, conn)
+            cursor = conn.cursor(pymysql.cursors.Cursor) if db_type == 'mysql' else conn.cursor()
+            try:
+                for use in setup:
+                    cursor.execute(use)
+                cursor.execute(prefix + statement)
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                rows = [list(row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+            self._end_statement(exec_id)
+            plan = {
+                'statement': prefix + statement,
+                'analyze': analyze,
+                'columns': columns,
+                # 计划中可能含 Decimal 等值，转为可序列化的形式后再保存
+                'rows': json.loads(json.dumps(rows, default=sql_wire_default)),
+                'elapsed': round(time.monotonic() - started, 3)
+            }
+            return plan, True, "执行计划获取成功"
+        except Exception as e:
+            discard = True
+            interrupted = self._end_statement(exec_id)
+            logger.error(f"获取执行计划失败: {e}")
+            return None, False, self._interrupted_message(interrupted, e)
+        finally:
+            self._end_statement(exec_id)
+            if db_type == 'mysql':
+                pool.putconn(conn, close=discard)
+            else:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                pool.putconn(conn)
+    
+    def run_metadata_query(self, connection_id, kind, params=()):
+        """执行 SCHEMA_QUERIES 中的元数据查询，返回元组列表"""
+        conn_info = self.connections.get(connection_id)
+        pool = self.pools.get(connection_id)
+        if conn_info is None or pool is None:
+            raise ValueError("连接不存在")
+        sql = SCHEMA_QUERIES[conn_info['type']][kind]
+        conn = pool.getconn()
+        try:
+            if conn_info['type'] == 'mysql':
+                with conn.cursor(pymysql.cursors.Cursor) as cursor:
+                    cursor.execute(sql, params)
+                    return list(cursor.fetchall())
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        finally:
+            if conn_info['type'] == 'mysql':
+                pool.putconn(conn)
+            else:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                pool.putconn(conn)
+    
+    def close_connection(self, connection_id):
+        """关闭数据库连接"""
+        try:
+            self._close_cursors(lambda s: s['connection_id'] == connection_id)
+            schema_cache.invalidate(connection_id)
+            self.result_cache.invalidate(connection_id)
+            with self.lock:
+                if connection_id in self.pools:
+                    pool = self.pools[connection_id]
+                    pool.closeall()
+                    del self.pools[connection_id]
+                
+                if connection_id in self.connections:
+                    del self.connections[connection_id]
+                
+                logger.info(f"数据库连接已关闭: {connection_id}")
+                return True, "连接已关闭"
+        except Exception as e:
+            logger.error(f"关闭数据库连接失败: {e}")
+            return False, str(e)
+
+db_connection_manager = DatabaseConnectionManager()
+
+# 数据库结构元数据查询；MySQL 的行数为 information_schema 估算值，PostgreSQL 取 pg_class.reltuples
+SCHEMA_QUERIES = {
+    'mysql': {
+        'databases': "SELECT SCHEMA_NAME FROM information_schema.SCHEMATA ORDER BY SCHEMA_NAME",
+        'tables': "SELECT TABLE_NAME, TABLE_TYPE, TABLE_ROWS, ENGINE, TABLE_COMMENT "
+                  "FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME",
+        'columns': "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, COLUMN_KEY, EXTRA, COLUMN_COMMENT "
+                   "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+                   "ORDER BY ORDINAL_POSITION",
+        'indexes': "SELECT INDEX_NAME, NON_UNIQUE = 0, COLUMN_NAME FROM information_schema.STATISTICS "
+                   "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+    },
+    'postgresql': {
+        'databases': "SELECT datname FROM pg_database WHERE datistemplate = false ORDER BY datname",
+        'tables': "SELECT c.relname, CASE WHEN c.relkind IN ('r', 'p') THEN 'BASE TABLE' WHEN c.relkind = 'v' THEN 'VIEW' "
+                  "WHEN c.relkind = 'm' THEN 'MATERIALIZED VIEW' ELSE 'FOREIGN TABLE' END, "
+                  "c.reltuples::bigint, NULL, obj_description(c.oid, 'pg_class') "
+                  "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                  "WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm', 'f') ORDER BY c.relname",
+        'columns': "SELECT column_name, data_type, is_nullable, column_default, NULL, NULL, NULL "
+                   "FROM information_schema.columns WHERE table_schema = %s AND table_name = %s "
+                   "ORDER BY ordinal_position",
+        'indexes': "SELECT i.relname, ix.indisunique, a.attname "
+                   "FROM pg_index ix JOIN pg_class t ON t.oid = ix.indrelid "
+                   "JOIN pg_namespace n ON n.oid = t.relnamespace JOIN pg_class i ON i.oid = ix.indexrelid "
+                   "CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord) "
+                   "LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum "
+                   "WHERE n.nspname = %s AND t.relname = %s ORDER BY i.relname, k.ord"
+    }
+}
+SQL_DDL_KEYWORDS = ('CREATE', 'ALTER', 'DROP', 'RENAME', 'TRUNCATE', 'COMMENT')
+
+# 数据库结构缓存：按 connection_id 缓存库、表、列和索引，按需加载，按 TTL 刷新，执行DDL后失效
+class SchemaCache:
+    def __init__(self):
+        self.entries = {}  # {connection_id: {(kind, *names): (loaded_at, data)}}
+        self.generations = {}  # {connection_id: 失效次数}，加载期间发生失效的结果不写入缓存
+        self.lock = threading.Lock()
+    
+    def _get(self, connection_id, key, loader, refresh):
+        now = time.time()
+        with self.lock:
+            cached = self.entries.get(connection_id, {}).get(key)
+            generation = self.generations.get(connection_id, 0)
+        if cached and not refresh and now - cached[0] < app.config['DB_SCHEMA_CACHE_TTL']:
+            return cached[1], cached[0], True
+        data = loader()
+        with self.lock:
+            if self.generations.get(connection_id, 0) == generation:
+                self.entries.setdefault(connection_id, {})[key] = (now, data)
+        return data, now, False
+    
+    def databases(self, connection_id, refresh=False):
+        def load():
+            rows = db_connection_manager.run_metadata_query(connection_id, 'databases')
+            return [row[0] for row in rows]
+        return self._get(connection_id, ('databases',), load, refresh)
+    
+    def tables(self, connection_id, database, refresh=False):
+        def load():
+            rows = db_connection_manager.run_metadata_query(connection_id, 'tables', (database,))
+            return [{
+                'name': name,
+                'type': table_type,
+                # 从未 ANALYZE 的 PostgreSQL 表 reltuples 为 -1
+                'rows': row_estimate if row_estimate is not None and row_estimate >= 0 else None,
+                'engine': engine,
+                'comment': comment or None
+            } for name, table_type, row_estimate, engine, comment in rows]
+        return self._get(connection_id, ('tables', database), load, refresh)
+    
+    def table(self, connection_id, database, table, refresh=False):
+        def load():
+            columns = [{
+                'name': name,
+                'type': column_type,
+                'nullable': nullable == 'YES',
+                'default': default,
+                'key': key or None,
+                'extra': extra or None,
+                'comment': comment or None
+            } for name, column_type, nullable, default, key, extra, comment
+                in db_connection_manager.run_metadata_query(connection_id, 'columns', (database, table))]
+            indexes = {}
+            for name, unique, column in db_connection_manager.run_metadata_query(connection_id, 'indexes', (database, table)):
+                index = indexes.setdefault(name, {'name': name, 'unique': bool(unique), 'columns': []})
+                index['columns'].append(column)
+            return {'columns': columns, 'indexes': list(indexes.values())}
+        return self._get(connection_id, ('table', database, table), load, refresh)
+    
+    def invalidate(self, connection_id):
+        with self.lock:
+            self.entries.pop(connection_id, None)
+            self.generations[connection_id] = self.generations.get(connection_id, 0) + 1
+    
+    def invalidate_for(self, connection_id, statements):
+        """执行的语句中含DDL时使该连接的缓存失效"""
+        if any(sql_keyword(statement) in SQL_DDL_KEYWORDS for statement in statements):
+            self.invalidate(connection_id)
+            logger.info(f"检测到DDL，已清除数据库结构缓存: {connection_id}")
+
+schema_cache = SchemaCache()
+
+# SQL执行剖析：内存中按指纹汇总所有执行（次数、耗时分位数），慢查询另写入 SlowQuery 表持久保存
+class QueryProfiler:
+    def __init__(self):
+        self.fingerprints = OrderedDict()  # {fingerprint: 汇总}，按最近执行排序，超出上限淘汰最久未执行的
+        self.lock = threading.Lock()
+    
+    def record(self, connection_id, sql, profile, success):
+        """登记一次执行，返回以毫秒表示的剖析结果；耗时达到 DB_SLOW_QUERY_MS 的写入慢查询日志"""
+        result = {f'{phase}_ms': round(profile[phase] * 1000, 2)
+                  for phase in ('connect', 'execute', 'fetch', 'total')}
+        result.update(rows=profile['rows'], bytes=profile['bytes'])
+        db_type = db_connection_manager.connections.get(connection_id, {}).get('type')
+        fingerprint, normalized = sql_fingerprint(sql, db_type)
+        result['fingerprint'] = fingerprint
+        with self.lock:
+            entry = self.fingerprints.pop(fingerprint, None)
+            if entry is None:
+                entry = {
+                    'sql': normalized[:2000], 'count': 0, 'errors': 0, 'slow': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'bytes': 0,
+                    'samples': deque(maxlen=app.config['DB_PROFILE_SAMPLES'])
+                }
+            entry['count'] += 1
+            entry['errors'] += 0 if success else 1
+            entry['total_ms'] += result['total_ms']
+            entry['max_ms'] = max(entry['max_ms'], result['total_ms'])
+            entry['rows'] += result['rows']
+            entry['bytes'] += result['bytes']
+            entry['samples'].append(result['total_ms'])
+            entry['last_seen'] = time.time()
+            slow = result['total_ms'] >= app.config['DB_SLOW_QUERY_MS']
+            entry['slow'] += 1 if slow else 0
+            self.fingerprints[fingerprint] = entry
+            while len(self.fingerprints) > app.config['DB_PROFILE_MAX_FINGERPRINTS']:
+                self.fingerprints.popitem(last=False)
+        if slow:
+            # 获取执行计划需要一次数据库往返，在后台线程中进行，不推迟本次请求的响应
+            threading.Thread(target=self._log_slow, args=(connection_id, sql, fingerprint, result, success),
+                             name='slow-query-log', daemon=True).start()
+        return result
+    
+    def _explain_slow(self, connection_id, sql, db_type):
+        """用原始SQL获取执行计划（不带 ANALYZE，不实际执行）；计划文本中的字符串字面量同样脱敏后再保存"""
+        statements = split_sql(sql, db_type)
+        if not statements or sql_keyword(statements[-1]) not in SQL_EXPLAIN_KEYWORDS:
+            return None
+        plan, success, message = db_connection_manager.explain(connection_id, sql)
+        if not success:
+            logger.info(f"慢查询执行计划获取失败: {message}")
+            return None
+        plan['statement'] = redact_sql_literals(plan['statement'], db_type)
+        plan['rows'] = [[redact_sql_literals(value, db_type) if isinstance(value, str) else value for value in row]
+                        for row in plan['rows']]
+        return plan
+    
+    def _log_slow(self, connection_id, sql, fingerprint, result, success):
+        """写入慢查询日志：原始SQL只在此时可用，先用它获取执行计划，日志中只保存计划和脱敏后的文本"""
+        try:
+            conn_info = db_connection_manager.connections.get(connection_id, {})
+            plan = None
+            if success and app.config['DB_SLOW_QUERY_EXPLAIN']:
+                plan = self._explain_slow(connection_id, sql, conn_info.get('type'))
+            self._write_slow(conn_info, connection_id, sql, fingerprint, result, success, plan)
+        except Exception as e:
+            logger.error(f"写入慢查询日志失败: {e}")
+    
+    def _write_slow(self, conn_info, connection_id, sql, fingerprint, result, success, plan):
+        redacted = redact_sql_literals(sql, conn_info.get('type'))
+        max_sql = app.config['DB_SLOW_QUERY_MAX_SQL']
+        # 查询任务在后台线程执行，独立推入应用上下文（也避免与请求中的会话混用）
+        with app.app_context():
+            db.session.add(SlowQuery(
+                fingerprint=fingerprint,
+                connection_id=connection_id,
+                connection_name=f"{conn_info.get('username')}@{conn_info.get('host')}:{conn_info.get('port')}"
+                                f"/{conn_info.get('database') or ''}",
+                db_type=conn_info.get('type', ''),
+                sql=redacted[:max_sql],
+                sql_truncated=len(redacted) > max_sql,
+                success=success,
+                total_ms=result['total_ms'],
+                connect_ms=result['connect_ms'],
+                execute_ms=result['execute_ms'],
+                fetch_ms=result['fetch_ms'],
+                rows=result['rows'],
+                bytes=result['bytes'],
+                plan=json.dumps(plan, ensure_ascii=False) if plan else None,
+                plan_analyzed=False if plan else None,
+                plan_captured_at=datetime.now(timezone.utc) if plan else None
+            ))
+            db.session.commit()
+        logger.warning(f"慢查询: {result['total_ms']}ms [{fingerprint}] {redacted[:200]}")
+    
+    def stats(self, limit=50, sort='total_ms'):
+        """内存中的指纹汇总（进程启动以来的全部执行）"""
+        with self.lock:
+            entries = [(fingerprint, dict(entry, samples=sorted(entry['samples'])))
+                       for fingerprint, entry in self.fingerprints.items()]
+        result = []
+        for fingerprint, entry in entries:
+            samples = entry.pop('samples')
+            entry.update(
+                fingerprint=fingerprint,
+                total_ms=round(entry['total_ms'], 2),
+                avg_ms=round(entry['total_ms'] / entry['count'], 2),
+                p50_ms=percentile(samples, 0.5),
+                p95_ms=percentile(samples, 0.95),
+                p99_ms=percentile(samples, 0.99)
+            )
+            result.append(entry)
+        result.sort(key=lambda entry: entry.get(sort) or 0, reverse=True)
+        return result[:limit]
+    
+    def slow_queries(self, since, connection_id=None, limit=50):
+        """慢查询日志按指纹汇总：次数、耗时分位数、最近一次执行"""
+        query = db.session.query(SlowQuery.id, SlowQuery.fingerprint, SlowQuery.total_ms, SlowQuery.created_at)\
+            .filter(SlowQuery.created_at >= since)
+        if connection_id:
+            query = query.filter(SlowQuery.connection_id == connection_id)
+        groups = {}
+        for log_id, fingerprint, total_ms, created_at in query.order_by(SlowQuery.id):
+            group = groups.setdefault(fingerprint, {'durations': [], 'latest_id': log_id, 'first_seen': created_at})
+            group['durations'].append(total_ms)
+            group['latest_id'] = log_id
+            group['last_seen'] = created_at
+        latest = {row.id: row for row in SlowQuery.query.filter(
+            SlowQuery.id.in_([group['latest_id'] for group in groups.values()]))} if groups else {}
+        result = []
+        for fingerprint, group in groups.items():
+            durations = sorted(group['durations'])
+            row = latest[group['latest_id']]
+            result.append({
+                'fingerprint': fingerprint,
+                'sql': sql_fingerprint(row.sql, row.db_type)[1][:2000],
+                'sample_sql': row.sql,
+                'db_type': row.db_type,
+                'connection_name': row.connection_name,
+                'count': len(durations),
+                'total_ms': round(sum(durations), 2),
+                'avg_ms': round(sum(durations) / len(durations), 2),
+                'p50_ms': percentile(durations, 0.5),
+                'p95_ms': percentile(durations, 0.95),
+                'p99_ms': percentile(durations, 0.99),
+                'max_ms': durations[-1],
+                'first_seen': group['first_seen'].isoformat(),
+                'last_seen': group['last_seen'].isoformat(),
+                'latest_id': row.id
+            })
+        result.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return result[:limit]
+    
+    def entries(self, fingerprint, limit=50):
+        """某个指纹最近的慢查询记录"""
+        rows = SlowQuery.query.filter_by(fingerprint=fingerprint)\
+            .order_by(SlowQuery.id.desc()).limit(limit).all()
+        return [self.serialize(row) for row in rows]
+    
+    @staticmethod
+    def serialize(row):
+        return {
+            'id': row.id,
+            'fingerprint': row.fingerprint,
+            'connection_id': row.connection_id,
+            'connection_name': row.connection_name,
+            'db_type': row.db_type,
+            'sql': row.sql,
+            'sql_truncated': bool(row.sql_truncated),
+            'success': row.success,
+            'total_ms': row.total_ms,
+            'connect_ms': row.connect_ms,
+            'execute_ms': row.execute_ms,
+            'fetch_ms': row.fetch_ms,
+            'rows': row.rows,
+            'bytes': row.bytes,
+            'plan': json.loads(row.plan) if row.plan else None,
+            'plan_analyzed': row.plan_analyzed,
+            'plan_captured_at': row.plan_captured_at.isoformat() if row.plan_captured_at else None,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }
+    
+    def logged_plan(self, log_id):
+        """返回慢查询记录写入时捕获的执行计划
+        
+        记录中只有字面量脱敏后的SQL，'?' 会改变计划甚至无法执行，不据此重新分析。
+        """
+        row = db.session.get(SlowQuery, log_id)
+        if row is None:
+            return None, False, "慢查询记录不存在"
+        if not row.plan:
+            return None, False, "该记录写入时未能获取执行计划（语句不支持 EXPLAIN 或执行失败），请用原始SQL分析"
+        return self.serialize(row), True, "执行计划获取成功"
+    
+    def purge(self):
+        """删除超过 DB_SLOW_QUERY_RETENTION 的慢查询记录"""
+        deadline = datetime.now(timezone.utc) - timedelta(seconds=app.config['DB_SLOW_QUERY_RETENTION'])
+        deleted = SlowQuery.query.filter(SlowQuery.created_at < deadline).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+query_profiler = QueryProfiler()
+
+# 异步SQL查询任务管理器
+class QueryJobManager:
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+    
+    def __init__(self):
+        self.jobs = {}  # {job_id: job}
+        self.cond = threading.Condition()
+        self.executor = None  # 首次提交时按 DB_JOB_WORKERS 创建
+    
+    def submit(self, connection_id, sql, page_size=None, result_format='rows', user_id=None,
+               script=False, transaction=False, stop_on_error=True, cache_ttl=None):
+        """提交查询任务；script=True 时按脚本逐条执行。排队和执行中的任务总数超过上限时拒绝"""
+        return self._enqueue(connection_id, user_id, {
+            'kind': 'script' if script else 'query',
+            'sql': sql,
+            'page_size': page_size,
+            'format': result_format,
+            'transaction': transaction,
+            'stop_on_error': stop_on_error,
+            'cache_ttl': cache_ttl
+        })
+    
+    def submit_import(self, connection_id, user_id, path, **options):
+        """提交数据导入任务；path 为已保存的上传文件，任务结束后删除"""
+        return self._enqueue(connection_id, user_id, {'kind': 'import', 'path': path, 'options': options})
+    
+    def _enqueue(self, connection_id, user_id, fields):
+        if connection_id not in db_connection_manager.connections:
+            return None, False, "连接不存在"
+        limit = app.config['DB_JOB_WORKERS'] + app.config['DB_JOB_MAX_QUEUED']
+        with self.cond:
+            if sum(1 for job in self.jobs.values() if job['status'] not in self.FINISHED) >= limit:
+                return None, False, "查询任务过多，请稍后再试"
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=app.config['DB_JOB_WORKERS'],
+                                                   thread_name_prefix='sql-job')
+            job_id = uuid.uuid4().hex
+            job = {
+                'id': job_id,
+                'connection_id': connection_id,
+                'user_id': user_id,
+                'status': 'queued',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'progress': None,
+                'version': 0,  # 每次状态或进度变化时递增，供长轮询判断是否有更新
+                'result': None,
+                'message': None
+            }
+            job.update(fields)
+            self.jobs[job_id] = job
+        self.executor.submit(self._run, job_id)
+        return job_id, True, "任务已提交"
+    
+    def _cleanup(self, job):
+        if job['kind'] == 'import':
+            try:
+                os.remove(job['path'])
+            except OSError:
+                pass
+    
+    def _finish(self, job, status, result, message):
+        self._cleanup(job)
+        with self.cond:
+            job.update(status=status, result=result, message=message, finished_at=time.time())
+            job['version'] += 1
+            self.cond.notify_all()
+    
+    def _progress(self, job, progress):
+        with self.cond:
+            job['progress'] = progress
+            job['version'] += 1
+            self.cond.notify_all()
+    
+    def _run(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'queued':
+                return
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            job['version'] += 1
+            self.cond.notify_all()
+        should_stop = lambda: job['status'] == 'cancelling'
+        try:
+            if job['kind'] == 'import':
+                result, success, message = db_connection_manager.import_rows(
+                    job['connection_id'], path=job['path'], should_stop=should_stop,
+                    progress=lambda progress: self._progress(job, progress), **job['options']
+                )
+            elif job['kind'] == 'script':
+                result, success, message = db_connection_manager.execute_script(
+                    job['connection_id'], job['sql'], job['transaction'], job['stop_on_error'],
+                    job['format'], exec_id=job_id, should_stop=should_stop
+                )
+            else:
+                result, success, message = db_connection_manager.execute_sql(
+                    job['connection_id'], job['sql'], job['page_size'], job['format'],
+                    exec_id=job_id, cache_ttl=job['cache_ttl']
+                )
+        except Exception as e:
+            logger.error(f"查询任务执行异常: {job_id} - {e}", exc_info=True)
+            result, success, message = None, False, f"执行失败: {str(e)}"
+        with self.cond:
+            cancelled = job['status'] == 'cancelling'
+        if success:
+            self._finish(job, 'succeeded', result, message)
+        else:
+            # 脚本失败时保留已执行语句的结果
+            self._finish(job, 'cancelled' if cancelled else 'failed', result, message)
+    
+    def cancel(self, job_id):
+        """取消任务：排队中的直接取消，执行中的终止正在运行的语句"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False, "任务不存在"
+            if job['status'] in self.FINISHED:
+                return False, "任务已结束"
+            queued = job['status'] == 'queued'
+            if queued:
+                job.update(status='cancelled', message="任务已取消", finished_at=time.time())
+            else:
+                job['status'] = 'cancelling'
+            job['version'] += 1
+            self.cond.notify_all()
+        if queued:
+            self._cleanup(job)
+            return True, "任务已取消"
+        if db_connection_manager.cancel_query(job_id):
+            return True, "已发送取消请求"
+        # 语句已执行完毕，由执行线程写入最终结果
+        return True, "任务即将结束"
+    
+    def get(self, job_id, wait=0, since_version=None):
+        """返回任务快照；wait>0 时最多等待该秒数，直到版本号不同于 since_version（未指定时直到任务结束）"""
+        deadline = time.monotonic() + wait
+        with self.cond:
+            job = self.jobs.get(job_id)
+            while job is not None and job['status'] not in self.FINISHED \
+                    and (since_version is None or job['version'] == since_version):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return self.snapshot(job) if job else None
+    
+    def snapshot(self, job):
+        finished_at = job['finished_at'] or time.time()
+        snapshot = {
+            'job_id': job['id'],
+            'kind': job['kind'],
+            'connection_id': job['connection_id'],
+            'status': job['status'],
+            'version': job['version'],
+            'elapsed': round(finished_at - (job['started_at'] or job['created_at']), 3),
+            'queued_for': round((job['started_at'] or finished_at) - job['created_at'], 3),
+            'message': job['message']
+        }
+        if job['progress'] is not None:
+            snapshot['progress'] = job['progress']
+        if job['result'] is not None:
+            snapshot['result'] = job['result']
+        return snapshot
+    
+    def owner(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            return job['user_id'] if job else None
+    
+    def expire(self):
+        """删除结束超过 DB_JOB_TTL 的任务"""
+        deadline = time.time() - app.config['DB_JOB_TTL']
+        with self.cond:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['finished_at'] and job['finished_at'] < deadline]
+            for job_id in expired:
+                del self.jobs[job_id]
+        return len(expired)
+
+query_job_manager = QueryJobManager()
+
+# 数据库管理路由
+@app.route('/database-manager')
+@login_required
+def database_manager():
+    """数据库管理页面"""
     return render_template('database_manager.html')
 
 @app.route('/api/database/connect', methods=['POST'])
@@ -1505,18 +5277,19 @@ def api_database_connect():
         username = data.get('username')
         password = data.get('password')
         name = data.get('name', f'{host}:{port}')  # 连接名称
+        statement_timeout = data.get('statement_timeout')  # 语句默认超时（秒），可选
         
         if not all([db_type, host, username]):
             return jsonify({'success': False, 'message': '缺少必需参数'}), 400
         
         connection_id, success, message = db_connection_manager.create_connection(
-            db_type, host, port, username, password, database
+            db_type, host, port, username, password, database, statement_timeout
         )
         
         if success:
             # 保存连接信息（不含密码）
             db_connection_manager.add_saved_connection(
-                connection_id, name, db_type, host, port, username, database
+                connection_id, name, db_type, host, port, username, database, statement_timeout
             )
             
             return jsonify({
@@ -1569,7 +5342,8 @@ def api_database_reconnect():
             int(saved_conn['port']),
             saved_conn['username'],
             password,
-            saved_conn.get('database')
+            saved_conn.get('database'),
+            saved_conn.get('statement_timeout')
         )
         
         if success:
@@ -1578,7 +5352,8 @@ def api_database_reconnect():
             db_connection_manager.add_saved_connection(
                 new_connection_id, saved_conn['name'],
                 saved_conn['type'], saved_conn['host'], int(saved_conn['port']),
-                saved_conn['username'], saved_conn.get('database')
+                saved_conn['username'], saved_conn.get('database'),
+                saved_conn.get('statement_timeout')
             )
             
             return jsonify({
@@ -1593,30 +5368,72 @@ def api_database_reconnect():
         logger.error(f"重新连接失败: {e}")
         return jsonify({'success': False, 'message': f'连接失败: {str(e)}'}), 500
 
+SQL_MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+def sql_result_response(payload, compact):
+    """按 Accept 协商 MessagePack 或 JSON 编码，较大的响应按 Accept-Encoding 进行 gzip 压缩"""
+    mimetype = request.accept_mimetypes.best_match(['application/json', *SQL_MSGPACK_MIMETYPES])
+    if mimetype in SQL_MSGPACK_MIMETYPES and msgpack is None:
+        # 客户端只接受 MessagePack 时不能悄悄改回 JSON，否则客户端会按 MessagePack 解码失败
+        if request.accept_mimetypes.best_match(['application/json']) is None:
+            return jsonify({'success': False, 'message': '服务器未安装 msgpack，无法返回 MessagePack 格式'}), 406
+        mimetype = 'application/json'
+    if mimetype in SQL_MSGPACK_MIMETYPES:
+        body = msgpack.packb(payload, use_bin_type=True, default=sql_wire_default)
+    elif compact:
+        mimetype = 'application/json'
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=sql_wire_default).encode('utf-8')
+    else:
+        mimetype = 'application/json'
+        body = app.json.dumps(payload).encode('utf-8')
+    
+    response = Response(body, mimetype=mimetype)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if len(body) >= app.config['DB_RESULT_GZIP_MIN'] and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=app.config['DB_RESULT_GZIP_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def sql_cache_ttl(value):
+    """请求中的 cache 参数：true 使用默认TTL，数字为TTL秒数，缺省或 false 不使用缓存"""
+    if value is True:
+        return app.config['DB_RESULT_CACHE_DEFAULT_TTL']
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return value
+    return None
+
 @app.route('/api/database/execute', methods=['POST'])
 @login_required
 def api_database_execute():
-    """执行SQL语句"""
+    """执行SQL语句；多条语句在同一连接上依次执行，只返回最后一条的结果（查询可按续读令牌分页）
+
+    需要逐条结果、事务或合并往返时提交 mode=script 的查询任务（/api/database/jobs）。
+    """
     try:
         data = request.get_json()
         connection_id = data.get('connection_id')
         sql = data.get('sql')
+        page_size = data.get('page_size')
+        result_format = data.get('format', 'rows')
         
         if not connection_id or not sql:
             return jsonify({'success': False, 'message': '缺少必需参数'}), 400
+        if result_format not in SQL_RESULT_FORMATS:
+            return jsonify({'success': False, 'message': f"不支持的结果格式: {result_format}"}), 400
         
         # 执行SQL（暂时允许所有操作，后续可根据需要添加安全检查）
         # 记录执行的SQL
         logger.info(f"执行SQL: connection_id={connection_id}, sql={sql}")
         
-        result, success, message = db_connection_manager.execute_sql(connection_id, sql)
+        result, success, message = db_connection_manager.execute_sql(
+            connection_id, sql, page_size, result_format, cache_ttl=sql_cache_ttl(data.get('cache'))
+        )
         
         if success:
             logger.info(f"SQL执行成功: {message}")
             # 详细记录返回给前端的数据
             if result:
                 logger.info(f"返回结果类型: {type(result)}")
-                logger.info(f"结果内容: {result}")
                 if isinstance(result, dict) and 'rows' in result:
                     logger.info(f"返回行数: {len(result.get('rows', []))}")
                     if result.get('rows') and len(result.get('rows', [])) > 0:
@@ -1624,11 +5441,11 @@ def api_database_execute():
                     else:
                         logger.warning("返回的rows为空或长度为0")
             
-            return jsonify({
+            return sql_result_response({
                 'success': True,
                 'result': result,
                 'message': message
-            })
+            }, result_format != 'rows')
         else:
             logger.error(f"SQL执行失败: {message}")
             return jsonify({'success': False, 'message': message}), 400
@@ -1639,6 +5456,331 @@ def api_database_execute():
         logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({'success': False, 'message': f'执行失败: {str(e)}'}), 500
 
+@app.route('/api/database/export', methods=['GET', 'POST'])
+@login_required
+def api_database_export():
+    """流式导出查询结果（format=csv 或 ndjson），参数可来自 JSON、表单或查询字符串"""
+    data = request.get_json(silent=True) or request.values
+    connection_id = data.get('connection_id')
+    sql = data.get('sql')
+    export_format = data.get('format', 'csv')
+    
+    if not connection_id or not sql:
+        return jsonify({'success': False, 'message': '缺少必需参数'}), 400
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': f"不支持的导出格式: {export_format}"}), 400
+    
+    try:
+        stream = db_connection_manager.export_query(connection_id, sql, export_format)
+        # 先取第一块：查询出错时还能返回错误响应，而不是一个被截断的文件
+        first = next(stream, b'')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except PoolTimeoutError as e:
+        return jsonify({'success': False, 'message': f'连接池繁忙: {str(e)}'}), 503
+    except Exception as e:
+        logger.error(f"导出查询结果失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'导出失败: {str(e)}'}), 400
+    
+    def body():
+        if first:
+            yield first
+        for chunk in stream:
+            yield chunk
+    
+    filename = data.get('filename') or f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    response = Response(
+        body(),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        direct_passthrough=True
+    )
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    # 客户端中途断开时也要释放数据库连接
+    response.call_on_close(stream.close)
+    logger.info(f"开始流式导出: connection_id={connection_id}, format={export_format}")
+    return response
+
+@app.route('/api/database/fetch', methods=['POST'])
+@login_required
+def api_database_fetch():
+    """按续读令牌读取查询结果的下一页"""
+    try:
+        data = request.get_json()
+        token = data.get('token')
+        
+        if not token:
+            return jsonify({'success': False, 'message': '缺少token'}), 400
+        
+        result, success, message = db_connection_manager.fetch_more(token, data.get('page_size'))
+        if success:
+            return sql_result_response({'success': True, 'result': result, 'message': message}, 'format' in result)
+        return jsonify({'success': False, 'message': message}), 400
+    except Exception as e:
+        logger.error(f"读取查询结果失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'读取失败: {str(e)}'}), 500
+
+@app.route('/api/database/cursor/close', methods=['POST'])
+@login_required
+def api_database_cursor_close():
+    """放弃未读完的查询结果，释放其占用的连接"""
+    try:
+        data = request.get_json()
+        token = data.get('token')
+        
+        if not token:
+            return jsonify({'success': False, 'message': '缺少token'}), 400
+        
+        success, message = db_connection_manager.close_cursor(token)
+        return jsonify({'success': success, 'message': message})
+    except Exception as e:
+        logger.error(f"关闭游标失败: {e}")
+        return jsonify({'success': False, 'message': f'操作失败: {str(e)}'}), 500
+
+@app.route('/api/database/jobs', methods=['POST'])
+@login_required
+def api_database_job_submit():
+    """提交异步查询任务，返回任务ID；mode=script 时按脚本逐条执行，可选 transaction、stop_on_error"""
+    try:
+        data = request.get_json()
+        connection_id = data.get('connection_id')
+        sql = data.get('sql')
+        result_format = data.get('format', 'rows')
+        
+        if not connection_id or not sql:
+            return jsonify({'success': False, 'message': '缺少必需参数'}), 400
+        if result_format not in SQL_RESULT_FORMATS:
+            return jsonify({'success': False, 'message': f"不支持的结果格式: {result_format}"}), 400
+        if connection_id not in db_connection_manager.connections:
+            return jsonify({'success': False, 'message': '连接不存在'}), 400
+        
+        job_id, success, message = query_job_manager.submit(
+            connection_id, sql, data.get('page_size'), result_format, current_user.id,
+            script=data.get('mode') == 'script',
+            transaction=bool(data.get('transaction', False)),
+            stop_on_error=bool(data.get('stop_on_error', True)),
+            cache_ttl=sql_cache_ttl(data.get('cache'))
+        )
+        if success:
+            return jsonify({'success': True, 'job_id': job_id, 'message': message}), 202
+        return jsonify({'success': False, 'message': message}), 429
+    except Exception as e:
+        logger.error(f"提交查询任务失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'提交失败: {str(e)}'}), 500
+
+@app.route('/api/database/import', methods=['POST'])
+@login_required
+def api_database_import():
+    """上传 CSV/NDJSON 文件并导入目标表；以后台任务执行，通过任务接口查看进度和失败行报告"""
+    path = None
+    try:
+        upload = request.files.get('file')
+        connection_id = request.form.get('connection_id')
+        database = request.form.get('database')
+        table = request.form.get('table')
+        
+        if not upload or not connection_id or not database or not table:
+            return jsonify({'success': False, 'message': '缺少必需参数'}), 400
+        if connection_id not in db_connection_manager.connections:
+            return jsonify({'success': False, 'message': '连接不存在'}), 400
+        
+        file_format = request.form.get('format') or ('ndjson' if upload.filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv')
+        if file_format not in ('csv', 'ndjson'):
+            return jsonify({'success': False, 'message': f"不支持的导入格式: {file_format}"}), 400
+        
+        def flag(name, default):
+            return request.form.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+        
+        fd, path = tempfile.mkstemp(prefix='dbimport_', suffix=f'.{file_format}')
+        os.close(fd)
+        upload.save(path)
+        
+        job_id, success, message = query_job_manager.submit_import(
+            connection_id, current_user.id, path,
+            database=database,
+            table=table,
+            file_format=file_format,
+            batch_size=request.form.get('batch_size', type=int),
+            has_header=flag('header', True),
+            empty_as_null=flag('empty_as_null', True),
+            stop_on_error=flag('stop_on_error', False)
+        )
+        if not success:
+            os.remove(path)
+            return jsonify({'success': False, 'message': message}), 429
+        logger.info(f"提交数据导入任务: {job_id}, 目标: {database}.{table}, 文件: {upload.filename}")
+        return jsonify({'success': True, 'job_id': job_id, 'message': message}), 202
+    except Exception as e:
+        if path and os.path.exists(path):
+            os.remove(path)
+        logger.error(f"提交数据导入失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'导入失败: {str(e)}'}), 500
+
+@app.route('/api/database/jobs/<job_id>', methods=['GET'])
+@login_required
+def api_database_job_status(job_id):
+    """查询任务状态；wait 参数（秒）可长轮询直到任务结束，或与 since_version 一起等待下一次状态/进度变化"""
+    try:
+        if query_job_manager.owner(job_id) != current_user.id:
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        wait = min(request.args.get('wait', 0, type=float), app.config['DB_JOB_MAX_WAIT'])
+        job = query_job_manager.get(job_id, wait=wait, since_version=request.args.get('since_version', type=int))
+        if job is None:
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        result = job.get('result')
+        return sql_result_response({'success': True, 'job': job}, isinstance(result, dict) and 'format' in result)
+    except Exception as e:
+        logger.error(f"查询任务状态失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
+
+@app.route('/api/database/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def api_database_job_events(job_id):
+    """以 Server-Sent Events 推送任务状态变化，任务结束后推送最终结果并关闭"""
+    if query_job_manager.owner(job_id) != current_user.id:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    
+    def generate():
+        version = None
+        while True:
+            # 首次立即返回当前状态，之后等待状态或进度变化
+            job = query_job_manager.get(job_id, wait=0 if version is None else app.config['DB_JOB_MAX_WAIT'],
+                                        since_version=version)
+            if job is None:
+                return
+            status = job['status']
+            if job['version'] != version:
+                version = job['version']
+                body = json.dumps(job, ensure_ascii=False, separators=(',', ':'), default=sql_wire_default)
+                yield f"event: {status}\ndata: {body}\n\n"
+            else:
+                # 保持连接，防止代理因空闲断开
+                yield ": keepalive\n\n"
+            if status in QueryJobManager.FINISHED:
+                return
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/database/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def api_database_job_cancel(job_id):
+    """取消查询任务"""
+    try:
+        if query_job_manager.owner(job_id) != current_user.id:
+            return jsonify({'success': False, 'message': '任务不存在'}), 404
+        success, message = query_job_manager.cancel(job_id)
+        return jsonify({'success': success, 'message': message}), 200 if success else 409
+    except Exception as e:
+        logger.error(f"取消查询任务失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'取消失败: {str(e)}'}), 500
+
+@app.route('/api/database/schema', methods=['GET'])
+@login_required
+def api_database_schema():
+    """从缓存返回数据库结构：不带 database 时返回库列表，带 database 返回表列表，再带 table 返回列和索引"""
+    try:
+        connection_id = request.args.get('connection_id')
+        database = request.args.get('database')
+        table = request.args.get('table')
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+        
+        if not connection_id:
+            return jsonify({'success': False, 'message': '缺少connection_id'}), 400
+        if connection_id not in db_connection_manager.connections:
+            return jsonify({'success': False, 'message': '连接不存在'}), 400
+        
+        if table and database:
+            data, loaded_at, cached = schema_cache.table(connection_id, database, table, refresh)
+            payload = dict(data)
+        elif database:
+            data, loaded_at, cached = schema_cache.tables(connection_id, database, refresh)
+            payload = {'tables': data}
+        else:
+            data, loaded_at, cached = schema_cache.databases(connection_id, refresh)
+            payload = {'databases': data}
+        
+        payload.update(success=True, cached=cached, loaded_at=loaded_at)
+        return jsonify(payload)
+    except PoolTimeoutError as e:
+        return jsonify({'success': False, 'message': f'连接池繁忙: {str(e)}'}), 503
+    except Exception as e:
+        logger.error(f"获取数据库结构失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'获取失败: {str(e)}'}), 500
+
+@app.route('/api/database/profile', methods=['GET'])
+@login_required
+def api_database_profile():
+    """进程启动以来按SQL指纹汇总的执行统计（次数、错误数、耗时分位数、返回行数和字节数）"""
+    try:
+        sort = request.args.get('sort', 'total_ms')
+        if sort not in ('total_ms', 'avg_ms', 'p95_ms', 'p99_ms', 'max_ms', 'count', 'errors', 'rows', 'bytes'):
+            return jsonify({'success': False, 'message': f'不支持的排序字段: {sort}'}), 400
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        return jsonify({
+            'success': True,
+            'slow_query_ms': app.config['DB_SLOW_QUERY_MS'],
+            'fingerprints': query_profiler.stats(limit, sort)
+        })
+    except Exception as e:
+        logger.error(f"获取SQL执行统计失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'获取失败: {str(e)}'}), 500
+
+@app.route('/api/database/slow-queries', methods=['GET'])
+@login_required
+def api_database_slow_queries():
+    """慢查询日志按指纹汇总，默认最近 24 小时"""
+    try:
+        hours = max(0.0, request.args.get('hours', 24, type=float))
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        fingerprints = query_profiler.slow_queries(since, request.args.get('connection_id'), limit)
+        return jsonify({'success': True, 'fingerprints': fingerprints})
+    except Exception as e:
+        logger.error(f"获取慢查询日志失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'获取失败: {str(e)}'}), 500
+
+@app.route('/api/database/slow-queries/<fingerprint>', methods=['GET'])
+@login_required
+def api_database_slow_query_entries(fingerprint):
+    """某个指纹最近的慢查询记录（含各阶段耗时和已捕获的执行计划）"""
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        return jsonify({'success': True, 'entries': query_profiler.entries(fingerprint, limit)})
+    except Exception as e:
+        logger.error(f"获取慢查询记录失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'获取失败: {str(e)}'}), 500
+
+@app.route('/api/database/explain', methods=['POST'])
+@login_required
+def api_database_explain():
+    """获取执行计划：传 log_id 时返回慢查询记录写入时捕获的计划，否则分析 connection_id + sql；
+    analyze=true 时使用 EXPLAIN ANALYZE（实际执行，仅限只读查询，需提交原始SQL）"""
+    try:
+        data = request.get_json() or {}
+        analyze = bool(data.get('analyze'))
+        connection_id = data.get('connection_id')
+
+        if data.get('log_id') is not None:
+            if analyze:
+                return jsonify({'success': False, 'message': '慢查询记录只保存脱敏后的SQL，EXPLAIN ANALYZE 请提交原始SQL'}), 400
+            entry, success, message = query_profiler.logged_plan(int(data['log_id']))
+            if not success:
+                return jsonify({'success': False, 'message': message}), 400
+            return jsonify({'success': True, 'message': message, 'entry': entry})
+
+        sql = data.get('sql', '').strip()
+        if not connection_id or not sql:
+            return jsonify({'success': False, 'message': '缺少log_id，或connection_id和sql'}), 400
+        plan, success, message = db_connection_manager.explain(connection_id, sql, analyze)
+        if not success:
+            return jsonify({'success': False, 'message': message}), 400
+        return jsonify({'success': True, 'message': message, 'plan': plan})
+    except Exception as e:
+        logger.error(f"获取执行计划失败: {e}", exc_info=True)
+        return jsonify({'success': False, 'message': f'获取失败: {str(e)}'}), 500
+
 @app.route('/api/database/disconnect', methods=['POST'])
 @login_required
 def api_database_disconnect():
@@ -15,6 +15,102 @@ class Config:
     CONNECTION_TEST_INTERVAL = int(os.environ.get('CONNECTION_TEST_INTERVAL', 30))  # 秒
     CONNECTION_TIMEOUT = int(os.environ.get('CONNECTION_TIMEOUT', 5))  # 秒
     SSH_TIMEOUT = int(os.environ.get('SSH_TIMEOUT', 10))  # 秒
+    SSH_POOL_IDLE_TTL = int(os.environ.get('SSH_POOL_IDLE_TTL', 300))  # 池化SSH连接最大空闲时间（秒）
+    SSH_POOL_KEEPALIVE = int(os.environ.get('SSH_POOL_KEEPALIVE', 30))  # 池化SSH连接keepalive间隔（秒）
+    SSH_POOL_MAX_CHANNELS = int(os.environ.get('SSH_POOL_MAX_CHANNELS', 8))  # 每台主机同时打开的通道上限
+    SSH_POOL_ACQUIRE_TIMEOUT = int(os.environ.get('SSH_POOL_ACQUIRE_TIMEOUT', 30))  # 等待空闲通道的超时（秒）
+    SFTP_STREAM_CHUNK_SIZE = int(os.environ.get('SFTP_STREAM_CHUNK_SIZE', 32768))  # 单个SFTP读请求大小（字节）
+    SFTP_STREAM_WINDOW = int(os.environ.get('SFTP_STREAM_WINDOW', 32))  # 流式下载同时在途的读请求数
+    SFTP_INLINE_DOWNLOAD_MAX = int(os.environ.get('SFTP_INLINE_DOWNLOAD_MAX', 10 * 1024 * 1024))  # base64 JSON下载的文件大小上限
+    SFTP_UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get('SFTP_UPLOAD_MAX_CHUNK_SIZE', 8 * 1024 * 1024))  # 分块上传单块上限（字节）
+    SFTP_UPLOAD_TTL = int(os.environ.get('SFTP_UPLOAD_TTL', 24 * 3600))  # 未完成的分块上传保留时间（秒）
+    SSH_FULL_CHECK_INTERVAL = int(os.environ.get('SSH_FULL_CHECK_INTERVAL', 600))  # 完整SSH认证检查的最长间隔（秒）
+    PROBE_CONCURRENCY = int(os.environ.get('PROBE_CONCURRENCY', 256))  # 并发探测线程上限
+    METRICS_INTERVAL = int(os.environ.get('METRICS_INTERVAL', 60))  # 资源使用率采集间隔（秒）
+    METRICS_CONCURRENCY = int(os.environ.get('METRICS_CONCURRENCY', 32))  # 资源采集并发线程上限
+    METRICS_RAW_RETENTION = int(os.environ.get('METRICS_RAW_RETENTION', 2 * 86400))  # 原始采样保留时间（秒）
+    METRICS_ROLLUP_RETENTION = {  # 各级聚合桶保留时间（秒）
+        '1m': int(os.environ.get('METRICS_1M_RETENTION', 7 * 86400)),
+        '1h': int(os.environ.get('METRICS_1H_RETENTION', 90 * 86400)),
+        '1d': int(os.environ.get('METRICS_1D_RETENTION', 730 * 86400)),
+    }
+    METRICS_MAX_POINTS = int(os.environ.get('METRICS_MAX_POINTS', 1500))  # auto 粒度下单条序列的最大点数
+    METRICS_MAX_ASSETS_PER_QUERY = int(os.environ.get('METRICS_MAX_ASSETS_PER_QUERY', 500))
+    PROBE_MIN_INTERVAL = int(os.environ.get('PROBE_MIN_INTERVAL', 10))  # 状态刚变化的资产探测间隔（秒）
+    PROBE_STABLE_MAX_INTERVAL = int(os.environ.get('PROBE_STABLE_MAX_INTERVAL', 300))  # 长期稳定在线资产的最大探测间隔（秒）
+    PROBE_OFFLINE_MAX_INTERVAL = int(os.environ.get('PROBE_OFFLINE_MAX_INTERVAL', 900))  # 长期离线资产退避上限（秒）
+    ASSET_PAGE_DEFAULT_LIMIT = int(os.environ.get('ASSET_PAGE_DEFAULT_LIMIT', 100))  # 资产列表分页请求的默认每页条数
+    ASSET_PAGE_MAX_LIMIT = int(os.environ.get('ASSET_PAGE_MAX_LIMIT', 1000))
+    ASSET_EVENT_WINDOW = float(os.environ.get('ASSET_EVENT_WINDOW', 0.5))  # 资产状态变更推送的合并窗口（秒）
+    ASSET_IMPORT_MAX_ROWS = int(os.environ.get('ASSET_IMPORT_MAX_ROWS', 10000))  # 单次批量导入的最大行数
+    ASSET_IMPORT_BATCH_SIZE = int(os.environ.get('ASSET_IMPORT_BATCH_SIZE', 500))  # 批量导入每批写入行数（每批一个事务）
+    
+    # 数据库管理连接池配置（MySQL）
+    MYSQL_POOL_MIN = int(os.environ.get('MYSQL_POOL_MIN', 1))
+    MYSQL_POOL_MAX = int(os.environ.get('MYSQL_POOL_MAX', 5))
+    MYSQL_POOL_RECYCLE = int(os.environ.get('MYSQL_POOL_RECYCLE', 3600))  # 连接最长使用时间（秒）
+    MYSQL_POOL_WAIT_TIMEOUT = int(os.environ.get('MYSQL_POOL_WAIT_TIMEOUT', 10))  # 等待空闲连接的超时（秒）
+    MYSQL_POOL_VALIDATE_IDLE = int(os.environ.get('MYSQL_POOL_VALIDATE_IDLE', 30))  # 空闲超过该时间的连接借出前先 ping（秒）
+    
+    # 数据库管理连接池配置（PostgreSQL）
+    PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', 1))
+    PG_POOL_MAX = int(os.environ.get('PG_POOL_MAX', 5))
+    PG_POOL_WAIT_TIMEOUT = int(os.environ.get('PG_POOL_WAIT_TIMEOUT', 10))  # 等待空闲连接的超时（秒）
+    
+    # SQL查询结果分页（服务端游标）
+    DB_DEFAULT_PAGE_SIZE = int(os.environ.get('DB_DEFAULT_PAGE_SIZE', 1000))  # 未指定 page_size 时单次返回的最大行数
+    DB_MAX_PAGE_SIZE = int(os.environ.get('DB_MAX_PAGE_SIZE', 10000))
+    DB_CURSOR_TTL = int(os.environ.get('DB_CURSOR_TTL', 300))  # 未读完的游标超过该时间未续读则关闭（秒）
+    DB_MAX_OPEN_CURSORS = int(os.environ.get('DB_MAX_OPEN_CURSORS', 2))  # 每个连接同时保留的未读完游标数（各占一个池连接，应小于 MYSQL_POOL_MAX）
+    DB_RESULT_GZIP_MIN = int(os.environ.get('DB_RESULT_GZIP_MIN', 8192))  # 查询结果响应超过该字节数且客户端支持时 gzip 压缩
+    DB_RESULT_GZIP_LEVEL = int(os.environ.get('DB_RESULT_GZIP_LEVEL', 5))
+    DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 300))  # 新建连接的语句默认超时（秒），超时后 KILL QUERY / 取消，0 表示不限制
+    
+    # 异步SQL查询任务
+    DB_JOB_WORKERS = int(os.environ.get('DB_JOB_WORKERS', 4))  # 执行查询任务的线程数
+    DB_JOB_MAX_QUEUED = int(os.environ.get('DB_JOB_MAX_QUEUED', 32))  # 排队任务上限，超出时拒绝提交
+    DB_JOB_TTL = int(os.environ.get('DB_JOB_TTL', 600))  # 已结束任务的结果保留时间（秒）
+    DB_JOB_MAX_WAIT = int(os.environ.get('DB_JOB_MAX_WAIT', 25))  # 长轮询单次最长等待（秒）
+    
+    # SQL脚本执行：相邻的 INSERT/UPDATE/DELETE/REPLACE 合并为一次往返
+    DB_SCRIPT_BATCH_SIZE = int(os.environ.get('DB_SCRIPT_BATCH_SIZE', 100))  # 每批最多语句数
+    DB_SCRIPT_BATCH_BYTES = int(os.environ.get('DB_SCRIPT_BATCH_BYTES', 1048576))  # 每批SQL文本上限（字节），需小于服务端 max_allowed_packet
+    
+    # 数据库结构缓存（库、表、列、索引），执行DDL时自动失效
+    DB_SCHEMA_CACHE_TTL = int(os.environ.get('DB_SCHEMA_CACHE_TTL', 300))  # 缓存有效期（秒）
+    
+    # 只读查询结果缓存（请求中传 cache 参数时启用）
+    DB_RESULT_CACHE_BYTES = int(os.environ.get('DB_RESULT_CACHE_BYTES', 64 * 1024 * 1024))  # 所有缓存结果的总大小上限（按JSON编码估算）
+    DB_RESULT_CACHE_DEFAULT_TTL = int(os.environ.get('DB_RESULT_CACHE_DEFAULT_TTL', 30))  # cache=true 时的缓存时间（秒）
+    DB_RESULT_CACHE_MAX_TTL = int(os.environ.get('DB_RESULT_CACHE_MAX_TTL', 600))
+    
+    # 查询结果流式导出（CSV/NDJSON）
+    DB_EXPORT_FETCH_SIZE = int(os.environ.get('DB_EXPORT_FETCH_SIZE', 5000))  # 每次从服务端游标读取的行数
+    DB_EXPORT_CHUNK_SIZE = int(os.environ.get('DB_EXPORT_CHUNK_SIZE', 65536))  # 响应分块大小（字节）
+    DB_EXPORT_QUEUE_CHUNKS = int(os.environ.get('DB_EXPORT_QUEUE_CHUNKS', 16))  # PostgreSQL COPY 线程最多预读的块数
+    
+    # 数据批量导入（CSV/NDJSON）
+    DB_IMPORT_BATCH_SIZE = int(os.environ.get('DB_IMPORT_BATCH_SIZE', 1000))  # 每批写入行数（每批一个事务）
+    DB_IMPORT_MAX_BATCH_SIZE = int(os.environ.get('DB_IMPORT_MAX_BATCH_SIZE', 50000))
+    DB_IMPORT_MAX_FAILED_REPORT = int(os.environ.get('DB_IMPORT_MAX_FAILED_REPORT', 1000))  # 报告中最多列出的失败行
+    
+    # SQL执行剖析与慢查询日志
+    DB_SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 1000))  # 总耗时达到该值（毫秒）的执行写入慢查询日志
+    DB_SLOW_QUERY_RETENTION = int(os.environ.get('DB_SLOW_QUERY_RETENTION', 7 * 86400))  # 慢查询日志保留时间（秒）
+    DB_SLOW_QUERY_MAX_SQL = int(os.environ.get('DB_SLOW_QUERY_MAX_SQL', 65536))  # 慢查询日志中SQL文本的最大长度
+    DB_SLOW_QUERY_EXPLAIN = os.environ.get('DB_SLOW_QUERY_EXPLAIN', 'True').lower() == 'true'  # 写入慢查询日志时用原始SQL获取执行计划
+    DB_PROFILE_SAMPLES = int(os.environ.get('DB_PROFILE_SAMPLES', 256))  # 每个指纹保留的最近耗时样本数（计算分位数）
+    DB_PROFILE_MAX_FINGERPRINTS = int(os.environ.get('DB_PROFILE_MAX_FINGERPRINTS', 1000))  # 内存中汇总的指纹数上限
+    
+    # WebSocket终端配置
+    # 终端读取线程会阻塞在SSH通道上，默认使用真实线程模式（eventlet 需配合 monkey_patch 使用）
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+    TERMINAL_IDLE_TIMEOUT = int(os.environ.get('TERMINAL_IDLE_TIMEOUT', 1800))  # 交互式会话空闲超时（秒）
+    TERMINAL_MAX_SESSIONS = int(os.environ.get('TERMINAL_MAX_SESSIONS', 200))  # 全局交互式会话上限
+    TERMINAL_MAX_SESSIONS_PER_USER = int(os.environ.get('TERMINAL_MAX_SESSIONS_PER_USER', 10))  # 单用户交互式会话上限
+    TERMINAL_COMMAND_TIMEOUT = int(os.environ.get('TERMINAL_COMMAND_TIMEOUT', 30))  # HTTP终端单条命令最长等待时间（秒），期间占用一个工作线程；长时间运行的命令请使用 WebSocket 终端
+    TERMINAL_MAX_INFLIGHT = int(os.environ.get('TERMINAL_MAX_INFLIGHT', 256 * 1024))  # 客户端未确认的终端输出上限（字节）
+    TERMINAL_ACK_TIMEOUT = int(os.environ.get('TERMINAL_ACK_TIMEOUT', 60))  # 输出积压到上限后等待客户端确认的最长时间（秒），超时关闭终端
     
     # 安全配置
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
@@ -45,6 +141,7 @@ class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # 内存SQLite使用单连接的 StaticPool，不接受连接池参数
     WTF_CSRF_ENABLED = False
 
 # 配置字典
@@ -17,6 +17,7 @@ PACKAGE_NAME="ops-management-almalinux9.2"
 PACKAGE_VERSION="1.0.0"
 BUILD_DIR="build"
 PACKAGE_DIR="$BUILD_DIR/$PACKAGE_NAME"
+SOCKETIO_CLIENT_VERSION="4.7.2"  # 与 Flask-SocketIO 服务端协议版本匹配
 
 # 日志函数
 log_info() {
@@ -47,6 +48,22 @@ clean_build() {
     log_info "构建目录已清理"
 }
 
+# 下载前端依赖到 static/，离线部署时页面不依赖CDN
+fetch_vendor_assets() {
+    log_step "准备前端静态资源..."
+    
+    local socketio_js="static/js/socket.io.min.js"
+    if [[ ! -f "$socketio_js" ]]; then
+        mkdir -p static/js
+        if curl -fsSL -o "$socketio_js" "https://cdn.jsdelivr.net/npm/socket.io-client@${SOCKETIO_CLIENT_VERSION}/dist/socket.io.min.js"; then
+            log_info "已下载 socket.io-client ${SOCKETIO_CLIENT_VERSION}"
+        else
+            rm -f "$socketio_js"
+            log_warn "socket.io-client 下载失败，页面将回退到CDN加载"
+        fi
+    fi
+}
+
 # 复制应用文件
 copy_app_files() {
     log_step "复制应用文件..."
@@ -254,6 +271,7 @@ main() {
     echo
     
     clean_build
+    fetch_vendor_assets
     copy_app_files
     copy_deploy_scripts
     create_readme
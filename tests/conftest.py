@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试环境：以 testing 配置（内存SQLite）导入应用，日志写到临时目录
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ['FLASK_ENV'] = 'testing'
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'ops_management_test.log'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def app_context():
+    """建表并推入应用上下文，结束后删表"""
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        yield app_module.app
+        app_module.db.session.remove()
+        app_module.db.drop_all()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic，返回单元素列表 [当前时间]"""
+    now = [1000.0]
+    monkeypatch.setattr(app_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def client(app_context):
+    """已登录的测试客户端"""
+    user = app_module.User(username='tester', name='测试用户',
+                           password_hash=app_module.generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+    app_module.db.session.add(user)
+    app_module.db.session.commit()
+    test_client = app_context.test_client()
+    response = test_client.post('/login', data={'username': 'tester', 'password': 'secret'})
+    assert response.status_code == 302
+    return test_client
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+资产批量导入：逐行校验，以及 CSV / JSON 文件上传
+"""
+
+import io
+import json
+
+from app import Asset, validate_asset_import
+
+
+# validate_asset_import
+
+def test_validate_asset_import_normalizes_valid_rows():
+    valid, failed = validate_asset_import([
+        {'name': ' web-01 ', 'type': '虚拟资产', 'ip': '10.0.0.1', 'username': 'root', 'password': 'x'},
+        {'name': 'db-01', 'type': '物理资产', 'ip': '10.0.0.2', 'port': '2222', 'description': None}
+    ])
+    assert failed == []
+    assert [number for number, _ in valid] == [1, 2]
+    assert valid[0][1]['name'] == 'web-01'
+    assert valid[0][1]['port'] == 22
+    assert valid[1][1]['port'] == 2222
+    assert valid[1][1]['description'] == ''
+
+
+def test_validate_asset_import_reports_each_bad_row():
+    valid, failed = validate_asset_import([
+        {'name': 'a', 'type': 't', 'ip': '10.0.0.1'},
+        {'name': 'b', 'type': 't', 'ip': '10.0.0.1'},
+        {'name': 'c', 'type': 't', 'ip': '10.0.0.300'},
+        {'name': 'd', 'type': 't', 'ip': '10.0.0.4', 'port': 70000},
+        {'type': 't', 'ip': '10.0.0.5'},
+        {'name': 'x' * 101, 'type': 't', 'ip': '10.0.0.6'},
+        ['not', 'a', 'dict']
+    ])
+    assert [number for number, _ in valid] == [1]
+    assert [row['row'] for row in failed] == [2, 3, 4, 5, 6, 7]
+    assert '第 1 行' in failed[0]['error']
+    assert '无效的IP地址' in failed[1]['error']
+    assert '无效的端口' in failed[2]['error']
+    assert '缺少name' in failed[3]['error']
+    assert 'name超过100个字符' in failed[4]['error']
+    assert all(row['status'] == 'failed' for row in failed)
+
+
+# /api/assets/import
+
+CSV = (
+    'name,type,ip,port,username,password\n'
+    'web-01,虚拟资产,10.0.0.1,22,root,pw\n'
+    'db-01,物理资产,10.0.0.2,2222,,\n'
+    'bad,虚拟资产,10.0.0.300,22,,\n'
+).encode('utf-8')
+
+
+def upload(client, content, filename, **form):
+    return client.post('/api/assets/import', data=dict(form, file=(io.BytesIO(content), filename)),
+                       content_type='multipart/form-data')
+
+
+def test_import_csv_file(client):
+    response = upload(client, CSV, 'assets.CSV')
+    body = response.get_json()
+    assert response.status_code == 200 and body['summary'] == {'created': 2, 'updated': 0, 'skipped': 0, 'failed': 1}
+    assert {asset.name: asset.category for asset in Asset.query.all()} == {'web-01': 'training', 'db-01': 'physical'}
+
+
+def test_import_json_file_dry_run(client):
+    content = json.dumps([{'name': 'web-01', 'type': '虚拟资产', 'ip': '10.0.0.1'}]).encode('utf-8')
+    response = upload(client, content, 'assets.json', dry_run='true')
+    assert response.get_json()['summary']['created'] == 1
+    assert Asset.query.count() == 0
+
+
+def test_import_file_without_name_is_rejected(client):
+    response = upload(client, CSV, '')
+    assert response.status_code == 400
+    assert '文件名' in response.get_json()['message']
+
+
+def test_import_unparsable_file_is_rejected(client):
+    assert upload(client, b'{not json', 'assets.json').status_code == 400
+    assert upload(client, b'\xff\xfe\x00', 'assets.csv').status_code == 400
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+资产列表缓存：按类别的版本号与 ETag/304，只有列表字段真正变化时才失效
+"""
+
+import pytest
+
+import app as app_module
+from app import ASSET_CATEGORIES, Asset, AssetListCache, apply_probe_result
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = AssetListCache(ASSET_CATEGORIES)
+    monkeypatch.setattr(app_module, 'asset_list_cache', cache)
+    return cache
+
+
+def test_unknown_categories_are_not_registered(cache):
+    for n in range(100):
+        assert cache.version(f'client-{n}') == 0
+    cache.put_body('client-1', 0, '[]')
+    assert set(cache.versions) == set(ASSET_CATEGORIES)
+    assert cache.bodies == {}
+
+
+def test_bump_invalidates_only_given_category(cache):
+    cache.put_body('training', 0, '[1]')
+    cache.put_body('physical', 0, '[2]')
+    cache.bump('training')
+    assert cache.version('training') == 1 and cache.version('physical') == 0
+    assert cache.get_body('training', 1) is None
+    assert cache.get_body('physical', 0) == '[2]'
+
+
+def test_body_computed_before_a_write_is_not_cached(cache):
+    version = cache.version('training')
+    cache.bump('training')
+    cache.put_body('training', version, '[]')
+    assert cache.get_body('training', cache.version('training')) is None
+
+
+def test_etag_depends_on_version_and_query(cache):
+    assert cache.etag('training', 0, b'category=training') != cache.etag('training', 1, b'category=training')
+    assert cache.etag('training', 0, b'category=training') != cache.etag('training', 0, b'category=training&limit=5')
+
+
+def test_probe_result_reports_only_listed_changes():
+    asset = Asset(name='a', status='online', check_level='banner')
+    assert apply_probe_result(asset, True, 'SSH服务正常', 'banner') == ('online', 'online', False)
+    assert apply_probe_result(asset, True, 'SSH连接正常', 'ssh') == ('online', 'online', True)
+    assert apply_probe_result(asset, False, '网络连接失败', 'tcp') == ('online', 'offline', True)
+
+
+def test_list_revalidates_with_304_until_a_write(client, cache):
+    app_module.db.session.add(Asset(name='web-01', asset_type='虚拟资产', ip_address='10.0.0.1',
+                                    category='training', status='online'))
+    app_module.db.session.commit()
+
+    first = client.get('/api/assets?category=training')
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'private, no-cache'
+    assert [asset['name'] for asset in first.get_json()] == ['web-01']
+    etag = first.headers['ETag']
+
+    again = client.get('/api/assets?category=training', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.headers['ETag'] == etag
+    # 其他类别的写入不影响本类别
+    cache.bump('physical')
+    assert client.get('/api/assets?category=training', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.post('/api/assets', json={'name': 'web-02', 'type': '虚拟资产', 'ip': '10.0.0.2', 'port': 22})
+    assert response.get_json()['success']
+    changed = client.get('/api/assets?category=training', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert [asset['name'] for asset in changed.get_json()] == ['web-01', 'web-02']
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+资产列表查询：时间过滤参数、键集分页游标，以及参数错误返回 400
+"""
+
+import base64
+import math
+from datetime import datetime
+
+import pytest
+
+from app import Asset, db, decode_asset_cursor, encode_asset_cursor, parse_asset_time
+
+
+# parse_asset_time
+
+def test_parse_asset_time_accepts_epoch_and_iso():
+    assert parse_asset_time('1700000000') == datetime(2023, 11, 14, 22, 13, 20)
+    assert parse_asset_time('2024-05-01T12:00:00Z') == datetime(2024, 5, 1, 12)
+    assert parse_asset_time('2024-05-01T20:00:00+08:00') == datetime(2024, 5, 1, 12)
+    # 不带时区的 ISO 时间按 UTC 处理
+    assert parse_asset_time('2024-05-01T12:00:00') == datetime(2024, 5, 1, 12)
+
+
+@pytest.mark.parametrize('value', ['inf', '-inf', 'nan', '1e20', '-1e20', '1e12', 'yesterday',
+                                   '0001-01-01T00:00:00+01:00', str(math.pi * 1e300)])
+def test_parse_asset_time_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        parse_asset_time(value)
+
+
+# 资产列表 keyset 游标
+
+def test_asset_cursor_round_trip():
+    cursor = encode_asset_cursor('-id', 120, 120)
+    assert '=' not in cursor
+    assert decode_asset_cursor(cursor, '-id') == (120, 120)
+    assert decode_asset_cursor(encode_asset_cursor('name', 'web-01', 5), 'name') == ('web-01', 5)
+
+
+def test_asset_cursor_datetime():
+    moment = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    for sort in ('last_update', '-last_update'):
+        assert decode_asset_cursor(encode_asset_cursor(sort, moment, 9), sort) == (moment, 9)
+
+
+def test_asset_cursor_rejects_other_sort_and_garbage():
+    with pytest.raises(ValueError):
+        decode_asset_cursor(encode_asset_cursor('id', 1, 1), '-id')
+    for cursor in ('', 'not-base64!', base64.urlsafe_b64encode(b'{"a": 1}').decode()):
+        with pytest.raises(ValueError):
+            decode_asset_cursor(cursor, 'id')
+
+
+# /api/assets 参数
+
+def add_assets(count):
+    for n in range(1, count + 1):
+        db.session.add(Asset(name=f'web-{n:02d}', asset_type='虚拟资产', ip_address=f'10.0.0.{n}',
+                             category='training', status='online'))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('param', ['updated_after=inf', 'updated_before=nan', 'updated_after=1e20',
+                                   'cursor=garbage&limit=2', 'sort=password', 'fields=secret'])
+def test_invalid_list_parameters_return_400(client, param):
+    response = client.get(f'/api/assets?category=training&{param}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_keyset_pagination_walks_all_assets(client):
+    add_assets(5)
+    names, cursor = [], None
+    while True:
+        query = '/api/assets?category=training&limit=2&sort=-id&fields=name'
+        body = client.get(query + (f'&cursor={cursor}' if cursor else '')).get_json()
+        names += [asset['name'] for asset in body['assets']]
+        if not body['has_more']:
+            break
+        cursor = body['next_cursor']
+    assert names == [f'web-{n:02d}' for n in range(5, 0, -1)]
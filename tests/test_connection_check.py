@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+分级连接检查：只读SSH标识的快速路径、何时做完整认证、认证被拒绝后的退避
+"""
+
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+import paramiko
+import pytest
+
+import app as app_module
+from app import Asset, ProbeTarget, apply_probe_result, needs_full_check
+
+# 以 test_ 开头的函数直接导入会被 pytest 当作测试收集
+probe = app_module.test_asset_connection
+
+
+@pytest.fixture
+def banner_server():
+    """本地监听端口，每个连接发送一行SSH协议标识后关闭，返回端口号"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.sendall(b'SSH-2.0-OpenSSH_8.7\r\n')
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def ssh_checks(monkeypatch):
+    """记录完整认证次数；列表中放入异常时该次认证抛出"""
+    calls = []
+    failures = []
+
+    def check(hostname, port, username, password, timeout=None):
+        calls.append((hostname, port, username))
+        if failures:
+            raise failures.pop(0)
+        return True
+
+    monkeypatch.setattr(app_module.ssh_pool, 'check', check)
+    return calls, failures
+
+
+def target(port, status='online', auth_failed=False, username='root', password='pw'):
+    return ProbeTarget(1, 'host', '127.0.0.1', port, username, password, status, auth_failed)
+
+
+def test_unreachable_port_is_offline_at_tcp_level(ssh_checks):
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    assert probe(target(port)) == (False, '网络连接失败', 'tcp')
+    assert ssh_checks[0] == []
+
+
+def test_online_asset_with_banner_skips_authentication(banner_server, ssh_checks):
+    assert probe(target(banner_server)) == (True, 'SSH服务正常', 'banner')
+    assert ssh_checks[0] == []
+
+
+def test_full_check_and_recovery_authenticate(banner_server, ssh_checks):
+    assert probe(target(banner_server), full_check=True)[2] == 'ssh'
+    assert probe(target(banner_server, status='offline')) == (True, 'SSH连接正常', 'ssh')
+    assert len(ssh_checks[0]) == 2
+
+
+def test_asset_without_credentials_needs_only_tcp(banner_server, ssh_checks):
+    assert probe(target(banner_server, username='', password=''), full_check=True) == \
+        (True, '网络连接正常', 'banner')
+    assert ssh_checks[0] == []
+
+
+def test_rejected_credentials_are_not_retried_until_full_check(banner_server, ssh_checks):
+    calls, failures = ssh_checks
+    failures.append(paramiko.AuthenticationException('Authentication failed.'))
+    is_online, message, check_level = probe(target(banner_server, status='offline'))
+    assert (is_online, check_level) == (False, 'auth')
+
+    asset = Asset(name='host', status='offline', check_level=None, auth_failed=False)
+    apply_probe_result(asset, is_online, message, check_level)
+    assert asset.auth_failed and asset.last_full_check is not None
+
+    # 完整检查间隔内：只读标识，不再尝试密码
+    result = probe(target(banner_server, status='offline', auth_failed=True))
+    assert result == (False, 'SSH认证失败，等待下次完整检查', 'banner')
+    apply_probe_result(asset, *result)
+    assert asset.auth_failed and asset.status == 'offline'
+    assert len(calls) == 1
+
+    # 到期的完整检查（或修改凭据后的显式检查）重新认证，成功后清除标记
+    result = probe(target(banner_server, status='offline', auth_failed=True), full_check=True)
+    assert result == (True, 'SSH连接正常', 'ssh')
+    apply_probe_result(asset, *result)
+    assert not asset.auth_failed and asset.status == 'online'
+    assert len(calls) == 2
+
+
+def test_other_ssh_errors_do_not_mark_auth_failure(banner_server, ssh_checks):
+    ssh_checks[1].append(paramiko.SSHException('Error reading SSH protocol banner'))
+    result = probe(target(banner_server, status='offline'))
+    assert result[0] is False and result[2] == 'ssh'
+    asset = Asset(name='host', status='offline', auth_failed=False)
+    apply_probe_result(asset, *result)
+    assert not asset.auth_failed
+
+
+def test_needs_full_check_uses_interval(monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'SSH_FULL_CHECK_INTERVAL', 600)
+    now = datetime.now(timezone.utc)
+    assert needs_full_check(Asset(last_full_check=None))
+    assert not needs_full_check(Asset(last_full_check=now - timedelta(seconds=60)))
+    # SQLite 读回的时间不带时区
+    assert needs_full_check(Asset(last_full_check=(now - timedelta(seconds=601)).replace(tzinfo=None)))
+
+
+def test_maintenance_asset_stays_in_maintenance_when_unreachable():
+    asset = Asset(name='host', status='maintenance', check_level='tcp')
+    assert apply_probe_result(asset, False, '网络连接失败', 'tcp') == ('maintenance', 'maintenance', False)
+    assert apply_probe_result(asset, True, 'SSH连接正常', 'ssh') == ('maintenance', 'online', True)
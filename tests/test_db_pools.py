@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+数据库管理连接池：池满时有界等待、超时抛出 PoolTimeoutError、归还与回收；建立连接时不持有管理器的锁
+"""
+
+import threading
+import time
+
+import psycopg2
+import pymysql
+import pytest
+from pymysql.constants import SERVER_STATUS
+
+from app import DatabaseConnectionManager, MySQLConnectionPool, PoolTimeoutError, PostgreSQLConnectionPool
+
+
+class FakeMySQLConnection:
+    def __init__(self):
+        self.open = True
+        self.server_status = 0
+        self.pings = 0
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.open:
+            raise pymysql.err.OperationalError(2006, 'MySQL server has gone away')
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status = 0
+
+    def close(self):
+        self.open = False
+
+
+class FakePGInfo:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakePGConnection:
+    info = FakePGInfo()
+
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def mysql_connects(monkeypatch):
+    connects = []
+
+    def connect(**kwargs):
+        conn = FakeMySQLConnection()
+        connects.append(conn)
+        return conn
+
+    monkeypatch.setattr(pymysql, 'connect', connect)
+    return connects
+
+
+@pytest.fixture
+def pg_connects(monkeypatch):
+    connects = []
+
+    def connect(*args, **kwargs):
+        conn = FakePGConnection()
+        connects.append(conn)
+        return conn
+
+    monkeypatch.setattr(psycopg2, 'connect', connect)
+    return connects
+
+
+def mysql_pool(maxconn=2, wait_timeout=0.2, recycle=3600, validate_idle=30):
+    return MySQLConnectionPool(1, maxconn, recycle=recycle, wait_timeout=wait_timeout, validate_idle=validate_idle)
+
+
+def return_later(pool, conn, delay=0.05):
+    timer = threading.Timer(delay, pool.putconn, (conn,))
+    timer.start()
+    return timer
+
+
+def test_mysql_pool_reuses_idle_connections(mysql_connects):
+    pool = mysql_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(mysql_connects) == 1
+    assert pool.stats() == {'size': 1, 'idle': 0, 'in_use': 1}
+
+
+def test_mysql_pool_times_out_when_exhausted(mysql_connects):
+    pool = mysql_pool(maxconn=2, wait_timeout=0.2)
+    pool.getconn(), pool.getconn()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert 0.15 <= time.monotonic() - started < 2
+    assert len(mysql_connects) == 2
+
+
+def test_mysql_pool_waiter_gets_returned_connection(mysql_connects):
+    pool = mysql_pool(maxconn=1, wait_timeout=2)
+    conn = pool.getconn()
+    timer = return_later(pool, conn)
+    assert pool.getconn() is conn
+    timer.join()
+
+
+def test_mysql_pool_closed_connection_frees_slot_for_waiter(mysql_connects):
+    pool = mysql_pool(maxconn=1, wait_timeout=2)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, (conn,), {'close': True}).start()
+    replacement = pool.getconn()
+    assert replacement is not conn and not conn.open
+    assert pool.stats()['size'] == 1
+
+
+def test_mysql_pool_rolls_back_open_transaction(mysql_connects):
+    pool = mysql_pool()
+    conn = pool.getconn()
+    conn.server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1 and conn.open
+    assert pool.getconn() is conn
+
+
+def test_mysql_pool_recycles_old_and_validates_idle(mysql_connects, clock):
+    pool = mysql_pool(recycle=3600, validate_idle=30)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    clock[0] += 31
+    assert pool.getconn() is conn and conn.pings == 1
+    pool.putconn(conn)
+    # 空闲期间断开的连接在借出前被替换
+    conn.open = False
+    clock[0] += 31
+    fresh = pool.getconn()
+    assert fresh is not conn
+    pool.putconn(fresh)
+    clock[0] += 3601
+    assert pool.getconn() is not fresh and not fresh.open
+
+
+def test_mysql_pool_closeall_wakes_waiters(mysql_connects):
+    pool = mysql_pool(maxconn=1, wait_timeout=5)
+    pool.getconn()
+    threading.Timer(0.05, pool.closeall).start()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+
+def test_postgresql_pool_waits_instead_of_raising_pool_error(pg_connects):
+    pool = PostgreSQLConnectionPool(1, 1, wait_timeout=2)
+    conn = pool.getconn()
+    timer = return_later(pool, conn)
+    assert pool.getconn() is conn
+    timer.join()
+
+
+def test_postgresql_pool_times_out_when_exhausted(pg_connects):
+    pool = PostgreSQLConnectionPool(1, 2, wait_timeout=0.2)
+    pool.getconn(), pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert len(pg_connects) == 2
+
+
+def test_postgresql_pool_ignores_duplicate_return(pg_connects):
+    pool = PostgreSQLConnectionPool(1, 1, wait_timeout=0.2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    with pytest.raises(psycopg2.pool.PoolError):
+        pool.putconn(conn)
+    # 重复归还不会多释放名额
+    pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+
+def test_postgresql_pool_close_frees_slot(pg_connects):
+    pool = PostgreSQLConnectionPool(1, 1, wait_timeout=0.2)
+    conn = pool.getconn()
+    pool.putconn(conn, close=True)
+    assert conn.closed
+    assert pool.getconn() is not conn
+
+
+def test_create_connection_connects_outside_manager_lock(pg_connects, mysql_connects, monkeypatch):
+    manager = DatabaseConnectionManager()
+    locked_during_connect = []
+    for module in (psycopg2, pymysql):
+        connect = module.connect
+
+        def checked(*args, _connect=connect, **kwargs):
+            locked_during_connect.append(manager.lock.locked())
+            return _connect(*args, **kwargs)
+
+        monkeypatch.setattr(module, 'connect', checked)
+
+    pg_id, ok, _ = manager.create_connection('postgresql', 'db', 5432, 'u', 'p')
+    assert ok and isinstance(manager.pools[pg_id], PostgreSQLConnectionPool)
+    assert manager.connections[pg_id]['database'] == 'postgres'
+    mysql_id, ok, _ = manager.create_connection('mysql', 'db', 3306, 'u', 'p', statement_timeout=5)
+    assert ok and manager.connections[mysql_id]['statement_timeout'] == 5
+    assert locked_during_connect and not any(locked_during_connect)
+
+
+def test_create_connection_reports_failure(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise psycopg2.OperationalError('connection refused')
+
+    monkeypatch.setattr(psycopg2, 'connect', refuse)
+    manager = DatabaseConnectionManager()
+    assert manager.create_connection('postgresql', 'db', 5432, 'u', 'p') == (None, False, 'connection refused')
+    assert manager.pools == {}
+    assert manager.create_connection('oracle', 'db', 1521, 'u', 'p')[1] is False
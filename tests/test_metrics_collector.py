@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+"""
+资源采集输出解析：两次采样之间的CPU使用率、缺失字段
+"""
+
+from app import MetricsCollector
+
+
+def metrics_output(cpu_fields):
+    return (
+        f"cpu  {cpu_fields}\n"
+        "MemTotal:        8000000 kB\n"
+        "MemAvailable:    2000000 kB\n"
+        "/dev/sda1  100000000 42000000 58000000  42% /\n"
+    )
+
+
+def test_metrics_parse_uses_cpu_delta_between_samples():
+    collector = MetricsCollector()
+    # user nice system idle iowait ...：开机以来 25% 忙
+    assert collector.parse(1, metrics_output('200 0 50 700 50 0 0 0')) == (25, 75, 42)
+    # 两次采集之间 total +1000，idle+iowait +100，即 90% 忙
+    assert collector.parse(1, metrics_output('900 0 250 750 100 0 0 0')) == (90, 75, 42)
+
+
+def test_metrics_parse_partial_and_forget():
+    collector = MetricsCollector()
+    assert collector.parse(2, 'MemTotal: 1000 kB\n') == (None, 100, None)
+    collector.parse(3, metrics_output('1 0 1 2 0'))
+    collector.forget([])
+    assert collector.cpu_samples == {}
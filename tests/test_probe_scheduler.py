@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+探测调度器：按到期时间取出、按结果调整间隔、探测期间的插队请求、逐个完成不等待同批
+"""
+
+import queue
+import threading
+
+import pytest
+
+import app as app_module
+from app import ProbeScheduler, ProbeTarget, submit_probe
+
+
+@pytest.fixture
+def scheduler(clock, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'CONNECTION_TEST_INTERVAL', 30)
+    monkeypatch.setitem(app_module.app.config, 'PROBE_MIN_INTERVAL', 10)
+    monkeypatch.setitem(app_module.app.config, 'PROBE_STABLE_MAX_INTERVAL', 300)
+    monkeypatch.setitem(app_module.app.config, 'PROBE_OFFLINE_MAX_INTERVAL', 900)
+    # 去掉抖动，便于断言到期时间
+    monkeypatch.setattr(app_module.random, 'uniform', lambda low, high: 1.0)
+    return ProbeScheduler()
+
+
+def test_sync_makes_new_assets_due_and_drops_deleted(scheduler):
+    scheduler.sync([1, 2, 3])
+    assert sorted(scheduler.pop_due()) == [1, 2, 3]
+    for asset_id in (1, 2, 3):
+        scheduler.reschedule(asset_id, 'online', 'online', True)
+    scheduler.sync([1, 2])
+    assert scheduler.stats() == {'scheduled': 2, 'running': 0}
+
+
+def test_sync_does_not_requeue_running_probes(scheduler):
+    scheduler.sync([1])
+    assert scheduler.pop_due() == [1]
+    scheduler.sync([1])
+    assert scheduler.pop_due() == []
+    assert scheduler.stats() == {'scheduled': 0, 'running': 1}
+
+
+def test_pop_due_follows_deadlines(scheduler, clock):
+    scheduler.sync([1, 2, 3])
+    scheduler.pop_due()
+    scheduler.reschedule(1, 'online', 'online', True)    # 稳定在线：30 * 1.5 = 45s
+    scheduler.reschedule(2, 'offline', 'online', True)   # 状态变化：10s
+    scheduler.reschedule(3, 'offline', 'offline', False)  # 持续离线：30 * 2 = 60s
+    clock[0] += 9
+    assert scheduler.pop_due() == []
+    assert scheduler.next_due_in() == pytest.approx(1)
+    clock[0] += 1
+    assert scheduler.pop_due() == [2]
+    clock[0] += 35
+    assert scheduler.pop_due() == [1]
+    clock[0] += 15
+    assert scheduler.pop_due() == [3]
+
+
+def test_reschedule_backs_off(scheduler, clock):
+    def interval(asset_id, old_status, new_status, is_online):
+        # 重新调度发生在上一次到期取出之后
+        clock[0] += 1000
+        scheduler.pop_due()
+        scheduler.reschedule(asset_id, old_status, new_status, is_online)
+        return scheduler.due[asset_id] - clock[0]
+
+    assert [interval(1, 'online', 'online', True) for _ in range(8)] == \
+        [45, 67.5, 101.25, 151.875, 227.8125, 300, 300, 300]
+    assert [interval(2, 'offline', 'offline', False) for _ in range(6)] == [60, 120, 240, 480, 900, 900]
+    # 维护中（重启中）从最短间隔开始退避
+    assert interval(3, 'maintenance', 'maintenance', False) == 20
+    # 状态变化后回到最短间隔
+    assert interval(2, 'offline', 'online', True) == 10
+
+
+def test_request_probe_is_not_postponed_by_reschedule(scheduler, clock):
+    scheduler.sync([1])
+    scheduler.pop_due()
+    scheduler.reschedule(1, 'online', 'online', True)
+    clock[0] += 5
+    scheduler.request_probe(1, full_check=True)
+    assert scheduler.pop_due() == [1]
+    assert scheduler.take_full_requests([1]) == {1}
+    assert scheduler.take_full_requests([1]) == set()
+
+
+def test_request_probe_during_probe_reruns_after_completion(scheduler, clock):
+    scheduler.sync([1])
+    assert scheduler.pop_due() == [1]
+    # 探测进行中被要求再探测：不并发探测同一资产，完成后立即到期
+    scheduler.request_probe(1)
+    assert scheduler.pop_due() == []
+    scheduler.reschedule(1, 'online', 'online', True)
+    assert scheduler.pop_due() == [1]
+
+
+def test_request_probe_keeps_earlier_deadline_until_reschedule(scheduler, clock):
+    scheduler.sync([1])
+    scheduler.pop_due()
+    # 尚未取出的插队请求与随后的重新调度：保留较早的到期时间
+    scheduler.request_probe(1)
+    scheduler.running.add(1)
+    scheduler.reschedule(1, 'online', 'online', True)
+    assert scheduler.pop_due() == [1]
+
+
+def test_cancel_lets_sync_pick_the_asset_up_again(scheduler):
+    scheduler.sync([1])
+    scheduler.pop_due()
+    scheduler.cancel(1)
+    scheduler.sync([1])
+    assert scheduler.pop_due() == [1]
+
+
+def test_probes_complete_independently(monkeypatch):
+    """慢主机不会推迟同时提交的其他资产的结果"""
+    release = threading.Event()
+
+    def fake_test(target, full_check):
+        if target.id == 1:
+            release.wait(5)
+        return True, 'ok', 'banner'
+
+    monkeypatch.setattr(app_module, 'test_asset_connection', fake_test)
+    results = queue.Queue()
+    executor = app_module.ThreadPoolExecutor(max_workers=4)
+    try:
+        for asset_id in (1, 2):
+            submit_probe(executor, ProbeTarget(asset_id, f'a{asset_id}', '10.0.0.1', 22, '', '', 'online', False),
+                         False, results)
+        assert results.get(timeout=2) == (2, (True, 'ok', 'banner'))
+        assert results.empty()
+        release.set()
+        assert results.get(timeout=2) == (1, (True, 'ok', 'banner'))
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_probe_exception_is_reported_as_offline(monkeypatch):
+    def broken(target, full_check):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(app_module, 'test_asset_connection', broken)
+    results = queue.Queue()
+    executor = app_module.ThreadPoolExecutor(max_workers=1)
+    try:
+        submit_probe(executor, ProbeTarget(7, 'a7', '10.0.0.7', 22, '', '', 'online', False), False, results)
+        asset_id, (is_online, message, check_level) = results.get(timeout=2)
+    finally:
+        executor.shutdown()
+    assert (asset_id, is_online, check_level) == (7, False, 'tcp')
+    assert 'boom' in message
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQL执行剖析：指纹与字面量脱敏、分位数，以及慢查询日志写入时用原始SQL捕获执行计划
+"""
+
+import json
+
+import pytest
+
+import app as app_module
+from app import SlowQuery, percentile, query_profiler, redact_sql_literals, sql_fingerprint
+
+
+# sql_fingerprint / redact_sql_literals
+
+def test_fingerprint_ignores_literals_case_and_spacing():
+    first = sql_fingerprint("SELECT * FROM t WHERE id = 5 AND name='x'")
+    second = sql_fingerprint("select *  from t\nwhere id=42 and name = 'yy' ;")
+    assert first == second
+    assert first[1] == 'select * from t where id=? and name=?'
+    assert len(first[0]) == 16
+
+
+def test_fingerprint_collapses_lists_and_comments():
+    assert sql_fingerprint('select * from t where id in (1, 2, 3) -- c')[1] == \
+        sql_fingerprint('select * from t /* x */ where id in (7)')[1]
+    assert sql_fingerprint('insert into t values (1, 2), (3, 4), (5, 6)')[1] == \
+        sql_fingerprint('insert into t values (1,2),(3,4)')[1]
+
+
+def test_fingerprint_double_quotes_depend_on_dialect():
+    assert sql_fingerprint('select "a" from t', 'mysql')[1] == 'select ? from t'
+    assert sql_fingerprint('select "a" from t', 'postgresql')[1] == 'select "a" from t'
+
+
+def test_redact_sql_literals():
+    assert redact_sql_literals("update users set password='s3cr''et' where id=7") == \
+        "update users set password='?' where id=7"
+    assert redact_sql_literals('select "pw" from t', 'mysql') == "select '?' from t"
+    assert redact_sql_literals('select "pw" from t', 'postgresql') == 'select "pw" from t'
+
+
+# percentile
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile([], 0.5) is None
+    assert percentile([7], 0.99) == 7
+    assert percentile(values, 0) == 1
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1) == 100
+
+
+# 慢查询日志与执行计划
+
+RESULT = {'total_ms': 1500.0, 'connect_ms': 1.0, 'execute_ms': 1400.0, 'fetch_ms': 99.0, 'rows': 3, 'bytes': 120}
+SECRET_SQL = "select * from users where password = 's3cret' and id = 7"
+
+
+@pytest.fixture
+def explains(app_context, monkeypatch):
+    monkeypatch.setitem(app_module.db_connection_manager.connections, 'pg', {
+        'type': 'postgresql', 'username': 'u', 'host': 'db', 'port': 5432, 'database': 'app'
+    })
+    calls = []
+
+    def explain(connection_id, sql, analyze=False):
+        calls.append((connection_id, sql, analyze))
+        return {
+            'statement': 'EXPLAIN ' + sql, 'analyze': analyze, 'columns': ['QUERY PLAN'],
+            'rows': [["Seq Scan on users  (cost=0.00..1.01 rows=1 width=64)"],
+                     ["  Filter: ((password = 's3cret'::text) AND (id = 7))"]],
+            'elapsed': 0.001
+        }, True, '执行计划获取成功'
+
+    monkeypatch.setattr(app_module.db_connection_manager, 'explain', explain)
+    return calls
+
+
+def log_slow(sql, success=True):
+    query_profiler._log_slow('pg', sql, sql_fingerprint(sql, 'postgresql')[0], RESULT, success)
+    return SlowQuery.query.order_by(SlowQuery.id.desc()).first()
+
+
+def test_slow_query_plan_uses_original_sql_and_stores_only_redacted_text(explains):
+    row = log_slow(SECRET_SQL)
+    assert explains == [('pg', SECRET_SQL, False)]
+    assert row.sql == "select * from users where password = '?' and id = 7"
+    assert 's3cret' not in row.plan
+    plan = json.loads(row.plan)
+    assert plan['statement'] == "EXPLAIN select * from users where password = '?' and id = 7"
+    assert plan['rows'][1] == ["  Filter: ((password = '?'::text) AND (id = 7))"]
+    assert row.plan_analyzed is False and row.plan_captured_at is not None
+
+
+def test_slow_query_plan_skipped_for_failures_and_unexplainable_statements(explains, monkeypatch):
+    assert log_slow(SECRET_SQL, success=False).plan is None
+    assert log_slow('vacuum analyze users').plan is None
+    monkeypatch.setitem(app_module.app.config, 'DB_SLOW_QUERY_EXPLAIN', False)
+    assert log_slow(SECRET_SQL).plan is None
+    assert explains == []
+
+
+def test_logged_plan_returns_the_captured_plan(explains):
+    row = log_slow(SECRET_SQL)
+    entry, success, _ = query_profiler.logged_plan(row.id)
+    assert success and entry['plan']['rows'][0][0].startswith('Seq Scan')
+    missing = log_slow('vacuum users')
+    assert query_profiler.logged_plan(missing.id)[1] is False
+    assert query_profiler.logged_plan(10 ** 6)[2] == '慢查询记录不存在'
+    assert len(explains) == 1
+
+
+def test_explain_endpoint_refuses_analyze_on_logged_sql(client, explains):
+    row = log_slow(SECRET_SQL)
+    response = client.post('/api/database/explain', json={'log_id': row.id, 'analyze': True})
+    assert response.status_code == 400
+    response = client.post('/api/database/explain', json={'log_id': row.id})
+    assert response.get_json()['entry']['plan']['statement'].startswith('EXPLAIN select')
+    assert len(explains) == 1
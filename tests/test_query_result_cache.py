@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+只读查询结果缓存：按字节预算做 LRU 淘汰、过大结果不缓存、过期与按连接失效；只读语句判定与缓存键规范化
+"""
+
+import pytest
+
+import app as app_module
+from app import QueryResultCache, is_read_only_sql, normalize_sql
+
+
+def result(n):
+    """序列化后恰好 n 字节的结果"""
+    return {'v': 'x' * (n - len('{"v":""}'))}
+
+
+@pytest.fixture
+def cache(clock, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'DB_RESULT_CACHE_BYTES', 1000)
+    return QueryResultCache()
+
+
+def test_hit_returns_copy_with_age(cache, clock):
+    assert cache.put(('c1', 'SELECT 1'), result(100), ttl=30)
+    clock[0] += 2
+    hit = cache.get(('c1', 'SELECT 1'))
+    assert hit['cache_hit'] and hit['cache_age'] == 2
+    assert 'cache_hit' not in cache.entries[('c1', 'SELECT 1')][3]
+    assert cache.stats() == {'entries': 1, 'bytes': 100, 'hits': 1, 'misses': 0}
+
+
+def test_entries_expire(cache, clock):
+    cache.put(('c1', 'SELECT 1'), result(100), ttl=30)
+    clock[0] += 30
+    assert cache.get(('c1', 'SELECT 1')) is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_byte_budget_evicts_least_recently_used(cache):
+    for key in ('a', 'b', 'c', 'd'):
+        cache.put(('c1', key), result(250), ttl=30)
+    # 访问 a 使其成为最近使用，再写入时先淘汰 b
+    cache.get(('c1', 'a'))
+    cache.put(('c1', 'e'), result(250), ttl=30)
+    assert [key[1] for key in cache.entries] == ['c', 'd', 'a', 'e']
+    assert cache.stats()['bytes'] == 1000
+
+
+def test_oversized_result_is_not_cached(cache):
+    assert not cache.put(('c1', 'big'), result(251), ttl=30)
+    assert cache.stats()['entries'] == 0
+
+
+def test_replacing_a_key_keeps_size_accurate(cache):
+    cache.put(('c1', 'a'), result(200), ttl=30)
+    cache.put(('c1', 'a'), result(100), ttl=30)
+    assert cache.stats()['bytes'] == 100
+
+
+def test_invalidate_drops_only_that_connection(cache):
+    cache.put(('c1', 'a'), result(100), ttl=30)
+    cache.put(('c2', 'a'), result(100), ttl=30)
+    cache.invalidate('c1')
+    assert list(cache.entries) == [('c2', 'a')]
+    assert cache.stats()['bytes'] == 100
+
+
+# is_read_only_sql
+
+@pytest.mark.parametrize('statements', [
+    ['SELECT * FROM t'],
+    ['/* 注释 */ select 1', 'SHOW TABLES'],
+    ['DESCRIBE t'],
+    ["SELECT 'for update; into x' FROM t"],
+])
+def test_read_only_statements(statements):
+    assert is_read_only_sql(statements)
+
+
+@pytest.mark.parametrize('statements', [
+    [],
+    ['UPDATE t SET a = 1'],
+    ['SELECT 1', 'DELETE FROM t'],
+    ['SELECT * FROM t FOR UPDATE'],
+    ['SELECT * FROM t LOCK IN SHARE MODE'],
+    ['SELECT a INTO @x FROM t'],
+    ["SELECT nextval('seq')"],
+    ['SELECT GET_LOCK("k", 10)'],
+    ['SELECT pg_sleep(5)'],
+    ['EXPLAIN ANALYZE DELETE FROM t'],
+])
+def test_statements_with_side_effects_are_not_read_only(statements):
+    assert not is_read_only_sql(statements)
+
+
+def test_normalize_sql_folds_whitespace_outside_literals():
+    assert normalize_sql("SELECT  *\n FROM t WHERE a = 'x  y' ;") == "SELECT * FROM t WHERE a = 'x  y'"
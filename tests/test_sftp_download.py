@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+SFTP流式下载：单段 Range 返回 206，不可满足的范围返回 416，多段 Range 与过期的 If-Range 返回完整文件
+"""
+
+import stat
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import app as app_module
+from app import Asset
+
+CONTENT = bytes(range(256)) * 4
+MTIME = 1700000000
+ETAG = f'{MTIME:x}-{len(CONTENT):x}'
+
+
+class FakeFile:
+    def __init__(self, data):
+        self.data = data
+
+    def readv(self, chunks):
+        return [self.data[offset:offset + length] for offset, length in chunks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSFTP:
+    def stat(self, path):
+        if path != '/data/file.bin':
+            raise FileNotFoundError(path)
+        return SimpleNamespace(st_mode=stat.S_IFREG | 0o644, st_size=len(CONTENT), st_mtime=MTIME)
+
+    def open(self, path, mode):
+        return FakeFile(CONTENT)
+
+
+@pytest.fixture
+def download(client, monkeypatch):
+    @contextmanager
+    def fake_pooled_sftp(asset, timeout=None):
+        yield FakeSFTP()
+
+    monkeypatch.setattr(app_module, 'pooled_sftp', fake_pooled_sftp)
+    monkeypatch.setitem(app_module.app.config, 'SFTP_STREAM_CHUNK_SIZE', 100)
+    asset = Asset(name='host', asset_type='server', ip_address='10.0.0.1', username='root', password='pw',
+                  category='physical')
+    app_module.db.session.add(asset)
+    app_module.db.session.commit()
+
+    def get(path='/data/file.bin', **headers):
+        return client.get(f'/api/assets/{asset.id}/sftp/download', query_string={'path': path}, headers=headers)
+
+    return get
+
+
+def test_full_download_advertises_ranges(download):
+    response = download()
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == f'"{ETAG}"'
+
+
+def test_single_range_returns_partial_content(download):
+    response = download(Range='bytes=100-349')
+    assert response.status_code == 206
+    assert response.data == CONTENT[100:350]
+    assert response.headers['Content-Range'] == f'bytes 100-349/{len(CONTENT)}'
+    assert response.headers['Content-Length'] == '250'
+
+
+def test_suffix_and_open_ended_ranges(download):
+    assert download(Range='bytes=-10').data == CONTENT[-10:]
+    response = download(Range='bytes=1000-')
+    assert response.status_code == 206 and response.data == CONTENT[1000:]
+
+
+def test_unsatisfiable_range_returns_416(download):
+    response = download(Range=f'bytes={len(CONTENT)}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+
+def test_multiple_ranges_return_full_body(download):
+    response = download(Range='bytes=0-1,5-6')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert 'Content-Range' not in response.headers
+
+
+def test_if_range_mismatch_returns_full_body(download):
+    assert download(Range='bytes=0-9', **{'If-Range': f'"{ETAG}"'}).status_code == 206
+    response = download(Range='bytes=0-9', **{'If-Range': '"stale"'})
+    assert response.status_code == 200 and response.data == CONTENT
+
+
+def test_missing_file_returns_404(download):
+    assert download(path='/data/missing.bin').status_code == 404
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+分块上传：任务只属于发起的用户和资产、断点续传状态、过期清理，以及重命名失败时保留原目标文件
+"""
+
+import pytest
+
+import app as app_module
+from app import SFTPUploadManager, replace_remote_file
+
+
+@pytest.fixture
+def manager(clock, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'SFTP_UPLOAD_TTL', 600)
+    return SFTPUploadManager()
+
+
+def test_upload_is_scoped_to_owner_and_asset(manager):
+    upload = manager.create(1, '/data/file.bin', 10, 4, user_id=7)
+    assert manager.get(upload['id'], 1, 7) is upload
+    assert manager.get(upload['id'], 1, 8) is None
+    assert manager.get(upload['id'], 2, 7) is None
+    assert manager.get('unknown', 1, 7) is None
+
+
+def test_temp_file_is_next_to_target(manager):
+    upload = manager.create(1, '/data/file.bin', 10, 4, user_id=7)
+    assert upload['temp_path'] == f"/data/file.bin.part-{upload['id'][:12]}"
+
+
+def test_status_reports_written_ranges_for_resume(manager):
+    upload = manager.create(1, '/data/file.bin', 10, 4, user_id=7)
+    assert upload['total_chunks'] == 3
+    assert [manager.chunk_length(upload, i) for i in range(3)] == [4, 4, 2]
+    for index in (0, 2):
+        manager.mark_received(upload, index)
+    status = manager.status(upload)
+    assert status['received_chunks'] == [0, 2]
+    assert status['missing_chunks'] == [1]
+    assert status['written_ranges'] == [[0, 4], [8, 10]]
+    manager.mark_received(upload, 1)
+    status = manager.status(upload)
+    assert status['missing_chunks'] == [] and status['written_ranges'] == [[0, 10]]
+
+
+def test_empty_file_has_one_empty_chunk(manager):
+    upload = manager.create(1, '/data/empty', 0, 4, user_id=7)
+    assert upload['total_chunks'] == 1 and manager.chunk_length(upload, 0) == 0
+
+
+def test_expire_stale_keeps_active_uploads(manager, clock):
+    idle = manager.create(1, '/data/a', 10, 4, user_id=7)
+    active = manager.create(1, '/data/b', 10, 4, user_id=7)
+    clock[0] += 400
+    manager.get(active['id'], 1, 7)
+    clock[0] += 201
+    assert manager.expire_stale() == [idle]
+    assert manager.get(active['id'], 1, 7) is active
+
+
+# replace_remote_file
+
+class FakeSFTP:
+    def __init__(self, files, locked=()):
+        self.files = dict(files)
+        self.locked = set(locked)  # 不能被重命名的文件
+
+    def rename(self, source, target):
+        if source not in self.files or source in self.locked or target in self.files:
+            raise IOError(f'rename {source} -> {target}')
+        self.files[target] = self.files.pop(source)
+
+    def remove(self, path):
+        if path not in self.files:
+            raise IOError(path)
+        del self.files[path]
+
+
+def test_replace_swaps_in_new_file_and_removes_old():
+    sftp = FakeSFTP({'/d/f': b'old', '/d/f.part': b'new'})
+    replace_remote_file(sftp, '/d/f.part', '/d/f', 'x')
+    assert sftp.files == {'/d/f': b'new'}
+
+
+def test_replace_without_existing_target():
+    sftp = FakeSFTP({'/d/f.part': b'new'})
+    replace_remote_file(sftp, '/d/f.part', '/d/f', 'x')
+    assert sftp.files == {'/d/f': b'new'}
+
+
+def test_failed_rename_restores_original_target():
+    sftp = FakeSFTP({'/d/f': b'old', '/d/f.part': b'new'}, locked=['/d/f.part'])
+    with pytest.raises(IOError):
+        replace_remote_file(sftp, '/d/f.part', '/d/f', 'x')
+    assert sftp.files == {'/d/f': b'old', '/d/f.part': b'new'}
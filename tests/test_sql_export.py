@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+查询结果导出：PostgreSQL 查询语句走 COPY，SHOW 等不能放进 COPY 的语句走普通游标
+"""
+
+import pytest
+
+from app import DatabaseConnectionManager
+
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.rows = []
+        self.description = None
+
+    def execute(self, statement):
+        self.conn.executed.append((self.name, statement))
+        self.description = [('max_connections', 25)]
+        self.rows = [('100',)]
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def copy_expert(self, sql, sink):
+        self.conn.copies.append(sql)
+        sink.write(b'id\r\n1\r\n')
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.copies = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+        self.returned = []
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        self.returned.append(close)
+
+
+@pytest.fixture
+def manager(app_context):
+    manager = DatabaseConnectionManager()
+    manager.connections['pg'] = {'type': 'postgresql'}
+    manager.pools['pg'] = FakePool()
+    return manager
+
+
+def export(manager, sql, export_format='csv'):
+    return b''.join(manager.export_query('pg', sql, export_format))
+
+
+def test_select_csv_uses_copy(manager):
+    assert export(manager, 'SELECT id FROM t') == b'id\r\n1\r\n'
+    conn = manager.pools['pg'].conn
+    assert conn.copies == ['COPY (SELECT id FROM t) TO STDOUT WITH (FORMAT csv, HEADER true)']
+    assert conn.executed == []
+
+
+def test_show_csv_uses_plain_cursor(manager):
+    assert export(manager, 'SHOW max_connections;') == b'max_connections\r\n100\r\n'
+    conn = manager.pools['pg'].conn
+    assert conn.copies == []
+    # SHOW 不能用于 DECLARE CURSOR，不使用服务端命名游标
+    assert conn.executed == [(None, 'SHOW max_connections')]
+    assert manager.pools['pg'].returned == [False]
+
+
+def test_select_ndjson_uses_server_side_cursor(manager):
+    assert export(manager, 'SELECT 1', 'ndjson') == b'{"max_connections": "100"}\n'
+    name, statement = manager.pools['pg'].conn.executed[0]
+    assert name.startswith('export_') and statement == 'SELECT 1'
+
+
+def test_non_query_is_rejected(manager):
+    with pytest.raises(ValueError):
+        manager.export_query('pg', 'DELETE FROM t')
+    with pytest.raises(ValueError):
+        manager.export_query('pg', 'SELECT 1; SELECT 2')
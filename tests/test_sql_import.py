@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+数据导入：标识符中的 % 在带参数的 INSERT 中转义，在不带参数的 COPY 中保持原样
+"""
+
+import psycopg2
+import pytest
+
+import app as app_module
+from app import DatabaseConnectionManager
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, statement, params):
+        # 与驱动一致：带参数时对语句做 % 格式化
+        self.conn.inserts.append(statement % tuple(f"'{value}'" for value in params))
+
+    def copy_expert(self, statement, buffer):
+        self.conn.copies.append(statement)
+        if self.conn.copy_fails:
+            raise psycopg2.DataError('bad row')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, copy_fails):
+        self.copy_fails = copy_fails
+        self.inserts = []
+        self.copies = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, copy_fails):
+        self.conn = FakeConnection(copy_fails)
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+@pytest.fixture
+def run_import(app_context, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module.schema_cache, 'table',
+                        lambda *args, **kwargs: ({'columns': [{'name': 'rate%'}, {'name': 'id'}]}, True, ''))
+    path = tmp_path / 'rows.csv'
+    path.write_text('rate%,id\n5,1\n', encoding='utf-8')
+
+    def run(copy_fails):
+        manager = DatabaseConnectionManager()
+        manager.connections['pg'] = {'type': 'postgresql'}
+        manager.pools['pg'] = FakePool(copy_fails)
+        stats, success, message = manager.import_rows('pg', 'public', 'fee%s', str(path))
+        return manager.pools['pg'].conn, stats, success
+
+    return run
+
+
+def test_copy_uses_identifiers_unescaped(run_import):
+    conn, stats, success = run_import(copy_fails=False)
+    assert success and stats['rows_imported'] == 1
+    assert conn.copies == ['COPY "public"."fee%s" ("rate%", "id") FROM STDIN WITH (FORMAT csv, NULL \'\\N\')']
+
+
+def test_row_by_row_insert_escapes_percent(run_import):
+    conn, stats, success = run_import(copy_fails=True)
+    assert success and stats['rows_imported'] == 1
+    assert conn.inserts == ['INSERT INTO "public"."fee%s" ("rate%", "id") VALUES (\'5\', \'1\')']
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQL结果响应的内容协商：MessagePack / JSON、缺少 msgpack 时的 406、gzip 压缩
+"""
+
+import gzip
+import json
+
+import msgpack
+import pytest
+
+import app as app_module
+from app import sql_result_response
+
+PAYLOAD = {'success': True, 'result': {'columns': ['id', 'data'], 'rows': [[1, b'\x00\x01']]}}
+
+
+def respond(headers, compact=True, payload=PAYLOAD):
+    with app_module.app.test_request_context('/api/database/execute', headers=headers):
+        response = sql_result_response(payload, compact)
+        if isinstance(response, tuple):
+            response, status = response
+            response.status_code = status
+        return response
+
+
+def test_msgpack_when_accepted():
+    response = respond({'Accept': 'application/msgpack'})
+    assert response.status_code == 200 and response.mimetype == 'application/msgpack'
+    assert msgpack.unpackb(response.get_data())['result']['rows'] == [[1, b'\x00\x01']]
+    assert 'Accept' in response.headers['Vary']
+
+
+@pytest.mark.parametrize('accept', [None, '*/*', 'application/json', 'text/html'])
+def test_json_by_default(accept):
+    response = respond({'Accept': accept} if accept else {})
+    assert response.status_code == 200 and response.mimetype == 'application/json'
+    assert json.loads(response.get_data())['success']
+
+
+def test_msgpack_only_client_gets_406_without_library(monkeypatch):
+    monkeypatch.setattr(app_module, 'msgpack', None)
+    response = respond({'Accept': 'application/x-msgpack'})
+    assert response.status_code == 406
+
+
+def test_missing_library_falls_back_to_json_when_acceptable(monkeypatch):
+    monkeypatch.setattr(app_module, 'msgpack', None)
+    response = respond({'Accept': 'application/msgpack, application/json;q=0.5'})
+    assert response.status_code == 200 and response.mimetype == 'application/json'
+
+
+def test_large_responses_are_gzipped(monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'DB_RESULT_GZIP_MIN', 100)
+    payload = {'success': True, 'result': {'rows': [[n, 'x' * 10] for n in range(100)]}}
+    response = respond({'Accept-Encoding': 'gzip'}, payload=payload)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data()))['result']['rows'][99] == [99, 'x' * 10]
+    assert 'Content-Encoding' not in respond({}, payload=payload).headers
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQL脚本：语句拆分、会话状态判断，以及 execute_script 的批次失败定位和流式结果的截断
+"""
+
+import psycopg2
+import pymysql
+import pytest
+from pymysql.constants import ER
+
+from app import DatabaseConnectionManager, mysql_changes_session, split_sql
+
+
+# split_sql
+
+def test_split_sql_basic():
+    assert split_sql('select 1; select 2;') == ['select 1', 'select 2']
+
+
+def test_split_sql_ignores_delimiters_in_strings_and_comments():
+    sql = "insert into t values ('a;b', \"c;d\"); /* x;y */ select `e;f` -- g;h\n from t"
+    assert split_sql(sql) == [
+        "insert into t values ('a;b', \"c;d\")",
+        "/* x;y */ select `e;f` -- g;h\n from t"
+    ]
+
+
+def test_split_sql_drops_comment_only_fragments():
+    assert split_sql('select 1; -- 结尾注释\n/* 块注释 */;') == ['select 1']
+    assert split_sql('# mysql注释;\nselect 1', 'mysql') == ['# mysql注释;\nselect 1']
+
+
+def test_split_sql_doubled_quotes():
+    assert split_sql("select 'a'';b'; select 2") == ["select 'a'';b'", 'select 2']
+
+
+def test_split_sql_backslash_escapes_depend_on_dialect():
+    sql = "select 'a\\'; select 2"
+    # MySQL 中 \' 是转义，字符串延续到末尾
+    assert split_sql(sql, 'mysql') == [sql]
+    assert split_sql(sql, 'postgresql') == ["select 'a\\'", 'select 2']
+    assert split_sql("select E'a\\'; b'; select 2", 'postgresql') == ["select E'a\\'; b'", 'select 2']
+
+
+def test_split_sql_postgresql_dollar_quotes():
+    sql = ("create function f() returns int as $body$ begin return 1; end $body$ language plpgsql;"
+           "select $$a;b$$")
+    assert split_sql(sql, 'postgresql') == [
+        'create function f() returns int as $body$ begin return 1; end $body$ language plpgsql',
+        'select $$a;b$$'
+    ]
+
+
+def test_split_sql_mysql_delimiter():
+    sql = 'DELIMITER //\ncreate procedure p() begin select 1; end //\nDELIMITER ;\nselect 2;'
+    assert split_sql(sql, 'mysql') == ['create procedure p() begin select 1; end', 'select 2']
+
+
+# mysql_changes_session
+
+@pytest.mark.parametrize('statement', [
+    'USE db', 'set names utf8mb4', '/* 注释 */ BEGIN', 'start  transaction', 'LOCK TABLES t WRITE',
+    'create temporary table t (id int)', 'select @a := 1', "select 'x' into @v"
+])
+def test_mysql_changes_session(statement):
+    assert mysql_changes_session(statement)
+
+
+@pytest.mark.parametrize('statement', [
+    'select 1', "select ':=' from t", "select '@a := 1'", 'update t set a = 1', 'create table t (id int)'
+])
+def test_mysql_keeps_session(statement):
+    assert not mysql_changes_session(statement)
+
+
+# execute_script
+
+class FakePGCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql):
+        self.conn.round_trips += 1
+        if self.conn.aborted:
+            raise psycopg2.errors.InFailedSqlTransaction('current transaction is aborted')
+        for statement in sql.split('\n;\n'):
+            if 'fail' in statement:
+                self.conn.aborted = True
+                raise psycopg2.IntegrityError(f'failed: {statement}')
+            self.conn.pending.append(statement)
+            self.rowcount = 1
+
+    def close(self):
+        pass
+
+
+class FakePGConnection:
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+        self.aborted = False
+        self.round_trips = 0
+
+    def cursor(self, name=None):
+        return FakePGCursor(self)
+
+    def commit(self):
+        self.committed += self.pending
+        self.pending = []
+        self.aborted = False
+
+    def rollback(self):
+        self.pending = []
+        self.aborted = False
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+@pytest.fixture
+def pg_script(monkeypatch):
+    manager = DatabaseConnectionManager()
+    conn = FakePGConnection()
+    manager.connections['pg'] = {'type': 'postgresql', 'statement_timeout': 0}
+    manager.pools['pg'] = FakePool(conn)
+    return manager, conn
+
+
+SCRIPT = ("create table t (id int); insert into t values (1); insert into t values (2); "
+          "insert into t values ('fail'); insert into t values (4)")
+
+
+def test_transaction_batch_failure_reports_the_failing_statement(pg_script):
+    manager, conn = pg_script
+    result, success, message = manager.execute_script('pg', SCRIPT, transaction=True)
+    assert not success
+    failed = [entry for entry in result['statements'] if 'error' in entry]
+    assert [entry['index'] for entry in failed] == [3]
+    assert "'fail'" in failed[0]['sql']
+    assert [entry['index'] for entry in result['statements'] if 'error' not in entry] == [0, 1, 2]
+    assert not result['committed'] and conn.committed == []
+
+
+def test_transaction_without_failure_needs_no_extra_round_trips(pg_script):
+    manager, conn = pg_script
+    result, success, _ = manager.execute_script('pg', SCRIPT.replace("'fail'", '3'), transaction=True)
+    assert success and result['batches'] == 2 and result['committed']
+    # 两批语句 + BEGIN 由驱动隐式发送，没有保存点
+    assert conn.round_trips == 2
+    assert len(conn.committed) == 5
+
+
+def test_autocommit_batch_failure_keeps_earlier_statements(pg_script):
+    manager, conn = pg_script
+    result, success, _ = manager.execute_script('pg', SCRIPT, stop_on_error=False)
+    assert [entry['index'] for entry in result['statements'] if 'error' in entry] == [3]
+    assert result['executed'] == 4
+    assert conn.committed == ['create table t (id int)', 'insert into t values (1)', 'insert into t values (2)',
+                              'insert into t values (4)']
+
+
+class FakeSSCursor:
+    description = (('n', 3, None, 11, 11, 0, True),)
+
+    def __init__(self, conn, total):
+        self.conn = conn
+        self.rows = iter([(n,) for n in range(total)])
+        self.connection = conn
+
+    def execute(self, sql):
+        self.conn._result = type('Result', (), {'unbuffered_active': True})()
+
+    def fetchmany(self, size):
+        return [row for _, row in zip(range(size), self.rows)]
+
+    def close(self):
+        if any(True for _ in self.rows) and not self.conn.killed:
+            raise AssertionError('读完了剩余结果')
+        if self.conn.killed:
+            raise pymysql.err.OperationalError(ER.QUERY_INTERRUPTED, 'Query execution was interrupted')
+
+
+class FakeMySQLConnection:
+    def __init__(self, total):
+        self.total = total
+        self.killed = False
+        self._result = None
+
+    def cursor(self, cursorclass=None):
+        return FakeSSCursor(self, self.total)
+
+    def thread_id(self):
+        return 42
+
+
+def test_truncated_mysql_result_is_killed_instead_of_drained(monkeypatch):
+    conn = FakeMySQLConnection(total=50)
+    kills = []
+
+    class Killer:
+        def cursor(self):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+        def execute(self, sql, args):
+            kills.append(args)
+            conn.killed = True
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(pymysql, 'connect', lambda **kwargs: Killer())
+    results = []
+    DatabaseConnectionManager()._run_batch('mysql', conn, ['select n from big'], results, 10, 'rows', {})
+    assert kills == [(42,)]
+    assert results[0]['row_count'] == 10 and results[0]['truncated']
+    # 连接上的流式结果已标记结束，后续语句不会等待剩余数据
+    assert not conn._result.unbuffered_active
+
+
+def test_short_mysql_result_is_not_killed(monkeypatch):
+    conn = FakeMySQLConnection(total=5)
+    monkeypatch.setattr(pymysql, 'connect', lambda **kwargs: pytest.fail('不应终止查询'))
+    results = []
+    DatabaseConnectionManager()._run_batch('mysql', conn, ['select n from small'], results, 10, 'rows', {})
+    assert results[0]['row_count'] == 5 and not results[0]['truncated']
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+SSH连接池：复用、凭据变化重连、空闲回收，以及后台采集借用不刷新空闲时间
+"""
+
+import pytest
+
+import app as app_module
+from app import SSHConnectionPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def is_authenticated(self):
+        return True
+
+    def send_ignore(self):
+        if not self.active:
+            raise EOFError()
+
+
+class FakeClient:
+    def __init__(self, password):
+        self.password = password
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+@pytest.fixture
+def pool(clock, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'SSH_POOL_IDLE_TTL', 300)
+    pool = SSHConnectionPool()
+    pool.connects = []
+
+    def connect(hostname, port, username, password, timeout):
+        client = FakeClient(password)
+        pool.connects.append(client)
+        return client
+
+    monkeypatch.setattr(pool, '_connect', connect)
+    return pool
+
+
+def borrow(pool, password='pw', touch=True):
+    with pool.client('10.0.0.1', 22, 'root', password, touch=touch) as client:
+        return client
+
+
+def test_client_is_reused_and_reconnected_on_password_change(pool):
+    first = borrow(pool)
+    assert borrow(pool) is first
+    second = borrow(pool, password='new')
+    assert second is not first and first.closed
+    assert len(pool.connects) == 2
+
+
+def test_dead_transport_is_replaced(pool):
+    first = borrow(pool)
+    first.transport.active = False
+    assert borrow(pool) is not first
+
+
+def test_reaper_closes_idle_connections_after_ttl(pool, clock):
+    client = borrow(pool)
+    clock[0] += 200
+    borrow(pool)
+    clock[0] += 200
+    assert pool.reap_idle() == 0
+    clock[0] += 101
+    assert pool.reap_idle() == 1
+    assert client.closed and pool.entries == {}
+
+
+def test_reaper_skips_borrowed_and_drops_dead_connections(pool, clock):
+    with pool.client('10.0.0.1', 22, 'root', 'pw') as client:
+        clock[0] += 1000
+        assert pool.reap_idle() == 0
+    client.transport.active = False
+    assert pool.reap_idle() == 1
+
+
+def test_background_borrows_do_not_refresh_idle_time(pool, clock):
+    client = borrow(pool)
+    # 每60秒一次的采集复用同一连接，但不延长其寿命
+    for _ in range(5):
+        clock[0] += 60
+        assert borrow(pool, touch=False) is client
+    clock[0] += 1
+    assert pool.reap_idle() == 1
+    assert len(pool.connects) == 1
+
+
+def test_background_borrow_starts_idle_time_at_connect(pool, clock):
+    client = borrow(pool, touch=False)
+    clock[0] += 300
+    assert pool.reap_idle() == 0
+    clock[0] += 1
+    assert pool.reap_idle() == 1 and client.closed
+
+
+def test_check_reuses_only_recently_used_connection(pool, clock):
+    borrow(pool)
+    assert pool.check('10.0.0.1', 22, 'root', 'pw')
+    assert len(pool.connects) == 1
+    # 只被后台采集借用、已超过空闲时间的连接不能代替完整认证
+    clock[0] += 200
+    borrow(pool, touch=False)
+    clock[0] += 200
+    assert pool.check('10.0.0.1', 22, 'root', 'pw')
+    assert len(pool.connects) == 2
+    # 一次性认证不放入池中
+    assert pool.connects[1].closed
+
+
+def test_check_with_other_password_authenticates(pool):
+    borrow(pool)
+    pool.check('10.0.0.1', 22, 'root', 'other')
+    assert [client.password for client in pool.connects] == ['pw', 'other']